@@ -2,6 +2,7 @@
 import os
 import re
 import json
+import time
 import datetime
 import smtplib
 import traceback
@@ -9,77 +10,64 @@ from typing import Optional
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
-import google.generativeai as genai
 from dotenv import load_dotenv
 import asyncio
 import logging
 
+import llm_backends
+import llm_profile
+from export_store import export_store
+
 # Setup
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger("ai_analysis")
 
 load_dotenv()  # load .env at import
 
-# Configure Gemini/generative model
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-
-generation_config = {
-    "temperature": 0.5,
-    "max_output_tokens": 1000,
-}
-
-safety_settings = [
-    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
-    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
-    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
-]
-
-MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
-
-try:
-    model = genai.GenerativeModel(
-        model_name=MODEL_NAME,
-        generation_config=generation_config,
-        safety_settings=safety_settings,
-    )
-except Exception:
-    model = None
-    logger.warning("Could not initialize generative model at import time. Calls will fallback.")
-
 # -------------------------
 # Helpers
 # -------------------------
-def calculate_risk_score(data: dict) -> int:
+def disaster_event_count(nde) -> int:
+    """natural_disaster_events is either a count or a list of events."""
+    if not nde:
+        return 0
+    try:
+        return len(nde) if hasattr(nde, "__len__") else int(nde)
+    except Exception:
+        return 0
+
+def risk_score_from_signals(nasdaq_volatility=None, sp500_change="", disaster_count=0,
+                            post_count=0, sentiment=None, hotspot_count=0) -> int:
+    """Deterministic heuristic score from already-extracted signals; O(1)."""
     score = 50
-    fm = data.get("financial_markets") or {}
-    if fm.get("nasdaq_volatility") == "high":
+    if nasdaq_volatility == "high":
         score += 20
-    if "+" in str(fm.get("sp500_change", "")):
+    if "+" in str(sp500_change or ""):
         score -= 5
-
-    nde = data.get("natural_disaster_events")
-    if nde:
-        try:
-            count = len(nde) if hasattr(nde, "__len__") else int(nde)
-        except Exception:
-            count = 0
-        if count > 5:
-            score += 15
-
-    sm = data.get("social_media_posts")
-    if sm and len(sm) > 50:
+    if disaster_count > 5:
+        score += 15
+    # Regional clusters of hazard events (hazard_grid hotspots), capped
+    score += min(10, 5 * hotspot_count)
+    if post_count > 50:
         score += 10
-
-    ns = data.get("news_sentiment") or {}
-    sentiment = ns.get("overall_sentiment")
     if sentiment == "negative":
         score += 10
     elif sentiment == "positive":
         score -= 5
-
     return max(0, min(100, score))
 
+def calculate_risk_score(data: dict) -> int:
+    fm = data.get("financial_markets") or {}
+    ns = data.get("news_sentiment") or {}
+    return risk_score_from_signals(
+        nasdaq_volatility=fm.get("nasdaq_volatility"),
+        sp500_change=fm.get("sp500_change", ""),
+        disaster_count=disaster_event_count(data.get("natural_disaster_events")),
+        post_count=len(data.get("social_media_posts") or []),
+        sentiment=ns.get("overall_sentiment"),
+        hotspot_count=len(data.get("hazard_hotspots") or []),
+    )
+
 def _extract_json_by_matching_braces(text: str) -> str:
     if not text:
         return "{}"
@@ -99,13 +87,8 @@ def _extract_json_by_matching_braces(text: str) -> str:
     return m.group(0) if m else "{}"
 
 def save_debug_output(name: str, text: str):
-    try:
-        os.makedirs("exports", exist_ok=True)
-        with open(os.path.join("exports", name), "w", encoding="utf-8") as f:
-            f.write(text or "")
-        logger.info(f"Saved debug output to exports/{name}")
-    except Exception:
-        logger.exception("Failed to save debug output")
+    """Queue a versioned copy of the debug text under exports/ (written off the event loop)."""
+    export_store.write_background(name, text or "")
 
 def deterministic_top_drivers(data: dict) -> list:
     drivers = []
@@ -113,6 +96,7 @@ def deterministic_top_drivers(data: dict) -> list:
     ns = data.get("news_sentiment") or {}
     sm = data.get("social_media_posts") or []
     nde = data.get("natural_disaster_events") or []
+    hs = data.get("hazard_hotspots") or []
 
     if fm.get("nasdaq_volatility") == "high":
         drivers.append(f"High market volatility (nasdaq_volatility: {fm.get('nasdaq_volatility')})")
@@ -122,6 +106,8 @@ def deterministic_top_drivers(data: dict) -> list:
         drivers.append(f"High social media activity ({len(sm)} posts mentioning collapse/risks)")
     if nde:
         drivers.append(f"Natural disaster events reported ({len(nde) if hasattr(nde,'__len__') else nde})")
+    if hs:
+        drivers.append(f"Regional hazard hotspots ({len(hs)} grid cells with clustered or severe events)")
 
     while len(drivers) < 5:
         drivers.append("Other systemic indicators (see raw data for details)")
@@ -160,9 +146,16 @@ def create_html_email_content(report: dict) -> MIMEText:
     """
     for driver in top_drivers:
         html_content += f"<li>{driver}</li>\n"
+    html_content += "</ul>\n"
+
+    missing = report.get("missing_sources") or {}
+    if missing:
+        html_content += "<h3>Missing Sources:</h3>\n<ul>\n"
+        for name, reason in missing.items():
+            html_content += f"<li>{name}: {reason}</li>\n"
+        html_content += "</ul>\n"
 
     html_content += """
-        </ul>
         <hr>
         <p style="font-size:12px; color:#666;">
             This report is automatically generated by the Collapse Monitor System.
@@ -207,97 +200,224 @@ def send_report_via_email(report: dict, recipient_override: Optional[str] = None
 # -------------------------
 # Main: generate_report_with_ai
 # -------------------------
-async def generate_report_with_ai(data: dict, recipient_override: Optional[str] = None) -> dict:
-    timestamp = datetime.datetime.now().isoformat()
-    risk_score = calculate_risk_score(data)
-
+def build_prompt(data: dict) -> str:
     data_string = json.dumps(data, ensure_ascii=False)
-    prompt = (
+    return (
         "You are an AI assistant specialized in analyzing global instability signals.\n"
         "Analyze the following raw data and produce JSON ONLY, with keys: risk_score (int), "
         "top_drivers (array of strings), narrative_summary (string).\n\n"
         f"Raw Data:\n{data_string}\n\n"
         "Instructions:\n1) Provide the final risk_score (0-100).\n"
         "2) Write a concise narrative (2-4 sentences) referencing specific data points.\n"
-        "3) Provide exactly 5 top_drivers ordered by impact. Output JSON only."
+        "3) Provide exactly 5 top_drivers ordered by impact. Output JSON only.\n"
+        "4) missing_sources lists sources unavailable for this run; do not guess their values."
     )
 
+MAX_ATTEMPTS = 2
+
+async def generate_json(prompt: str, required_key: str, debug_name: str = "latest_ai",
+                        purpose: str = "report", sources: Optional[dict] = None,
+                        sources_max_chars: Optional[int] = None) -> tuple:
+    """
+    Call the configured LLM backend and parse a JSON object containing `required_key`.
+    Returns (parsed dict or None, error or None). Raw output and failures go to exports/;
+    each attempt is profiled into llm_calls, with prompt bytes split by the keys of `sources`
+    (of which the prompt carried at most `sources_max_chars` serialized characters).
+    """
     ai_error = None
-    raw_ai_output = None
-    report_data = None
-    max_attempts = 2
+    # LLM_BACKEND picks the model; slow calls are bounded by its timeout (and hedged with LLM_HEDGE)
+    backend = llm_backends.get_backend()
+    composition = llm_profile.prompt_composition(prompt, sources, sources_max_chars)
 
-    for attempt in range(1, max_attempts + 1):
-        if model is None:
-            ai_error = "Generative model not initialized"
-            logger.warning(ai_error)
-            break
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        raw_ai_output, outcome = None, "ok"
+        started = time.perf_counter()
         try:
-            logger.info(f"Calling generative model (attempt {attempt}/{max_attempts})...")
-            response = await model.generate_content_async(prompt)
-            raw_ai_output = getattr(response, "text", None) or getattr(response, "output_text", None) or str(response)
-            save_debug_output("latest_ai_output.txt", raw_ai_output)
+            logger.info(f"Calling {backend.name} backend (attempt {attempt}/{MAX_ATTEMPTS})...")
+            raw_ai_output = await backend.generate(prompt)
+            save_debug_output(f"{debug_name}_output.txt", raw_ai_output)
             json_part = _extract_json_by_matching_braces(raw_ai_output)
             try:
                 parsed = json.loads(json_part)
-                if not isinstance(parsed, dict) or "risk_score" not in parsed:
+                if not isinstance(parsed, dict) or required_key not in parsed:
                     raise ValueError("Parsed JSON missing required fields")
-                report_data = parsed
                 logger.info("AI output parsed successfully.")
-                break
+                return parsed, None
             except Exception as parse_exc:
-                ai_error = f"JSON parse error: {parse_exc}"
+                ai_error, outcome = f"JSON parse error: {parse_exc}", "parse_error"
                 logger.warning(ai_error)
-                save_debug_output("latest_ai_parse_error.txt", f"{ai_error}\n\nRaw output:\n{raw_ai_output}")
-                if attempt < max_attempts:
-                    await asyncio.sleep(1 * attempt)
-                    continue
-                else:
-                    break
+                save_debug_output(f"{debug_name}_parse_error.txt", f"{ai_error}\n\nRaw output:\n{raw_ai_output}")
+                continue
+        except llm_backends.BackendUnavailable as exc:
+            ai_error, outcome = str(exc), "unavailable"
+            logger.warning(ai_error)
+            break
+        except asyncio.TimeoutError:
+            ai_error, outcome = f"Model call timed out after {backend.timeout:.0f}s", "timeout"
+            logger.warning(ai_error)
+            continue
         except Exception as exc:
-            ai_error = f"Model call failed: {exc}"
+            ai_error, outcome = f"Model call failed: {exc}", "error"
             logger.warning(ai_error)
-            save_debug_output("latest_ai_exception.txt", f"{ai_error}\n\n{traceback.format_exc()}")
-            if attempt < max_attempts:
-                await asyncio.sleep(1 * attempt)
-                continue
-            else:
-                break
-
+            save_debug_output(f"{debug_name}_exception.txt", f"{ai_error}\n\n{traceback.format_exc()}")
+            continue
+        finally:
+            llm_profile.record(llm_profile.build_call(
+                purpose, backend.name, attempt, prompt, composition, raw_ai_output,
+                time.perf_counter() - started, outcome, error=ai_error if outcome != "ok" else None,
+            ))
+    return None, ai_error
+
+def build_report(report_data: Optional[dict], data: dict, risk_score: int, ai_error: Optional[str],
+                 analysis: str = "ai") -> dict:
+    """Final report from parsed model output, or the deterministic fallback when there is none."""
+    timestamp = datetime.datetime.now().isoformat()
     if report_data:
         risk = int(report_data.get("risk_score", risk_score))
         top = report_data.get("top_drivers") or []
         narrative = str(report_data.get("narrative_summary", "")).strip()
-        final = {
+        return {
             "risk_score": risk,
             "top_drivers": top[:5] if isinstance(top, list) else deterministic_top_drivers(data),
             "narrative_summary": narrative or deterministic_narrative(risk, data),
             "timestamp": timestamp,
             "ai_error": ai_error,
+            "missing_sources": data.get("missing_sources") or {},
+            "analysis": analysis,
         }
-        final["sent_to"] = send_report_via_email(final, recipient_override)
-        try:
-            os.makedirs("exports", exist_ok=True)
-            with open(os.path.join("exports", "latest_report.json"), "w", encoding="utf-8") as f:
-                json.dump(final, f, ensure_ascii=False, indent=2)
-        except Exception:
-            logger.exception("Failed to write latest_report.json")
-        return final
 
     # Fallback
-    fallback_report = {
+    return {
         "risk_score": int(risk_score),
         "top_drivers": deterministic_top_drivers(data),
         "narrative_summary": deterministic_narrative(risk_score, data),
         "timestamp": timestamp,
         "ai_error": ai_error or "AI generation failed",
+        "missing_sources": data.get("missing_sources") or {},
+        "analysis": "fallback",
     }
-    fallback_report["sent_to"] = send_report_via_email(fallback_report, recipient_override)
+
+async def analyze_report(data: dict, risk_score: Optional[int] = None) -> dict:
+    """
+    Run the AI analysis (with deterministic fallback) and return the report.
+    No email and no export files; "analysis" says whether it is "ai" or "fallback".
+    """
+    if risk_score is None:
+        risk_score = calculate_risk_score(data)
+    report_data, ai_error = await generate_json(build_prompt(data), "risk_score", sources=data)
+    return build_report(report_data, data, risk_score, ai_error)
+
+# -------------------------
+# Map-reduce analysis
+# -------------------------
+# Source names are matched to a group by substring; anything else is "other"
+SOURCE_GROUPS = {
+    "finance": ("financ", "economic"),
+    "news": ("news",),
+    "social": ("social", "reddit"),
+    "environment": ("environment", "disaster", "eonet", "usgs", "noaa"),
+}
+MAP_PAYLOAD_MAX_CHARS = 12000
+
+def source_group(name: str) -> str:
+    name = name.lower()
+    for group, keys in SOURCE_GROUPS.items():
+        if any(key in name for key in keys):
+            return group
+    return "other"
+
+def build_group_prompt(group: str, payload: dict) -> str:
+    data_string = json.dumps(payload, ensure_ascii=False, default=str)[:MAP_PAYLOAD_MAX_CHARS]
+    return (
+        f"You are summarizing the {group} signals for a global instability monitor.\n"
+        "Produce JSON ONLY, with keys: summary (string, 1-2 sentences), "
+        "signals (array of at most 3 short strings), concern (int 0-10).\n\n"
+        f"Data:\n{data_string}"
+    )
+
+async def summarize_group(group: str, payload: dict) -> dict:
+    """Map step: a short summary of one source group. Falls back to a record count."""
+    parsed, ai_error = await generate_json(build_group_prompt(group, payload), "summary", f"latest_ai_{group}",
+                                           purpose=f"map:{group}", sources=payload,
+                                           sources_max_chars=MAP_PAYLOAD_MAX_CHARS)
+    if parsed:
+        return {"group": group, "summary": str(parsed["summary"]), "signals": parsed.get("signals") or [],
+                "concern": parsed.get("concern")}
+    return {"group": group, "summary": f"{len(payload)} source(s) fetched, no AI summary.",
+            "signals": [], "concern": None, "error": ai_error}
+
+def build_reduce_prompt(summaries: list, risk_score: int, missing_sources: dict) -> str:
+    return (
+        "You are an AI assistant specialized in analyzing global instability signals.\n"
+        "Combine these per-group summaries into JSON ONLY, with keys: risk_score (int), "
+        "top_drivers (array of strings), narrative_summary (string).\n\n"
+        f"Group summaries:\n{json.dumps(summaries, ensure_ascii=False)}\n\n"
+        f"Heuristic baseline risk_score: {risk_score}\n"
+        f"Missing sources (do not guess their values): {json.dumps(missing_sources, ensure_ascii=False)}\n\n"
+        "Instructions:\n1) Provide the final risk_score (0-100).\n"
+        "2) Write a concise narrative (2-4 sentences) referencing the summaries.\n"
+        "3) Provide exactly 5 top_drivers ordered by impact. Output JSON only."
+    )
+
+async def reduce_report(summaries: list, data: dict, risk_score: Optional[int] = None) -> dict:
+    """Reduce step: the final report from the group summaries (same shape as analyze_report)."""
+    if risk_score is None:
+        risk_score = calculate_risk_score(data)
+    prompt = build_reduce_prompt(summaries, risk_score, data.get("missing_sources") or {})
+    report_data, ai_error = await generate_json(
+        prompt, "risk_score", "latest_ai_reduce", purpose="reduce",
+        sources={"group_summaries": summaries, "missing_sources": data.get("missing_sources") or {}},
+    )
+    report = build_report(report_data, data, risk_score, ai_error, analysis="map_reduce")
+    report["group_summaries"] = summaries
+    return report
+
+async def analyze_map_reduce(fetches: dict, normalize, risk_score: Optional[int] = None,
+                             summarize=summarize_group, reduce=reduce_report) -> dict:
+    """
+    Map-reduce analysis over in-flight fetches ({source name: awaitable}).
+    Each group is summarized as soon as its last fetch completes (asyncio.as_completed),
+    so model calls overlap slow fetches; `normalize` turns {name: result} into report data.
+    `summarize` and `reduce` default to summarize_group/reduce_report (the pipeline passes cached ones).
+    """
+    async def named(name, awaitable):
+        # Shielded: giving up on a wrapper below must not cancel the fetch stage itself
+        return name, await asyncio.shield(awaitable)
+
+    pending = {}
+    for name in fetches:
+        pending.setdefault(source_group(name), set()).add(name)
+    results, summaries = {}, []
+    waiters = [asyncio.ensure_future(named(name, aw)) for name, aw in fetches.items()]
     try:
-        os.makedirs("exports", exist_ok=True)
-        with open(os.path.join("exports", "latest_report_fallback.json"), "w", encoding="utf-8") as f:
-            json.dump(fallback_report, f, ensure_ascii=False, indent=2)
+        for next_done in asyncio.as_completed(waiters):
+            name, result = await next_done
+            results[name] = result
+            group = source_group(name)
+            pending[group].discard(name)
+            if not pending[group]:
+                group_payload = {n: results[n] for n in fetches if source_group(n) == group}
+                summaries.append(asyncio.create_task(summarize(group, group_payload)))
+    except BaseException:
+        # A fetch failed (or we were cancelled): don't leave summary calls running unowned
+        for task in waiters + summaries:
+            task.cancel()
+        await asyncio.gather(*waiters, *summaries, return_exceptions=True)
+        raise
+
+    data = normalize(results)
+    return await reduce(list(await asyncio.gather(*summaries)), data, risk_score)
+
+def write_report_export(report: dict):
+    """Write the report to exports/latest_report.json (or latest_report_fallback.json), keeping history."""
+    name = "latest_report_fallback.json" if report.get("analysis") == "fallback" else "latest_report.json"
+    try:
+        export_store.write(name, report)
     except Exception:
-        logger.exception("Failed to write latest_report_fallback.json")
+        logger.exception(f"Failed to write {name}")
 
-    return fallback_report
+async def generate_report_with_ai(data: dict, recipient_override: Optional[str] = None) -> dict:
+    report = await analyze_report(data)
+    report["sent_to"] = send_report_via_email(report, recipient_override)
+    await asyncio.to_thread(write_report_export, report)
+    return report
@@ -0,0 +1,279 @@
+# alerts.py
+"""
+Real-time threshold alerting.
+
+Rules live under "alert_rules" in config.json and are evaluated against every
+new value of their metric (the live risk score, the EONET event count, ...):
+
+  threshold  value > rule["value"] (risk_score defaults to ALERT_THRESHOLD)
+  delta      value rose more than rule["value"] above the window minimum
+  spike      value >= min_value and more than `factor` x the window mean
+
+A rule must hold for debounce_seconds before it fires and then stays quiet for
+cooldown_seconds. That state is kept in Postgres (alert_state), so restarts do
+not re-fire and several workers or instances share it (an alert fires in one
+process only). Each value is first stepped on the local copy of the state; only
+when a rule would start pending, stop pending or fire is the state re-read and
+written under an advisory lock. Values equal to the previous one are skipped
+unless a rule is waiting out its debounce.
+
+Per-metric windows are incremental (running sum plus a monotonic min-deque), so
+each evaluation is O(1) amortized. Values of metrics with windowed rules are also
+kept in alert_samples, and a process' windows start from there.
+"""
+import os
+import json
+import asyncio
+import logging
+import smtplib
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from db_config import get_alert_samples, save_alert_event, save_alert_sample, update_alert_states
+
+load_dotenv()
+
+logger = logging.getLogger("alerts")
+
+CONFIG_FILE = "config.json"
+
+
+def load_rules(config_file: str = CONFIG_FILE) -> list:
+    try:
+        with open(config_file, "r", encoding="utf-8") as f:
+            return json.load(f).get("alert_rules", [])
+    except Exception as e:
+        logger.warning(f"Could not load alert rules from {config_file}: {e}")
+        return []
+
+
+class MetricWindow:
+    """Sliding window of (timestamp, value) with O(1) amortized mean and min."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.values = deque()
+        self.minimums = deque()  # increasing values; front is the window minimum
+        self.total = 0.0
+
+    def add(self, ts: float, value: float):
+        self.values.append((ts, value))
+        self.total += value
+        while self.minimums and self.minimums[-1][1] > value:
+            self.minimums.pop()
+        self.minimums.append((ts, value))
+        while self.values and ts - self.values[0][0] > self.seconds:
+            old_ts, old_value = self.values.popleft()
+            self.total -= old_value
+            if self.minimums and self.minimums[0][0] <= old_ts:
+                self.minimums.popleft()
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / len(self.values) if self.values else None
+
+    @property
+    def minimum(self) -> Optional[float]:
+        return self.minimums[0][1] if self.minimums else None
+
+
+class AlertEngine:
+    def __init__(self, rules: list):
+        self.rules_by_metric = defaultdict(list)
+        self.windows = {}
+        for rule in rules:
+            self.rules_by_metric[rule["metric"]].append(rule)
+            seconds = float(rule.get("window_seconds", 0))
+            window = self.windows.get(rule["metric"])
+            if window is None or seconds > window.seconds:
+                self.windows[rule["metric"]] = MetricWindow(seconds)
+        self.state: dict = {}  # last known state per rule
+        self.last_values: dict = {}  # metric -> last value evaluated
+        self._restored = False
+        self._lock = asyncio.Lock()
+
+    def wants(self, metric: str, value: float) -> bool:
+        """Whether evaluating `value` can change anything: it is new, or a rule is waiting out its debounce."""
+        rules = self.rules_by_metric.get(metric)
+        if not rules:
+            return False
+        if self.last_values.get(metric) != value:
+            return True
+        return any((self.state.get(rule["name"]) or {}).get("pending_since") for rule in rules)
+
+    def _restore_windows(self):
+        """Seed the windows of windowed metrics from alert_samples (blocking)."""
+        now = datetime.utcnow()
+        for metric, window in self.windows.items():
+            if window.seconds <= 0:
+                continue
+            try:
+                samples = get_alert_samples(metric, now - timedelta(seconds=window.seconds))
+            except Exception as e:
+                logger.warning(f"⚠️ Could not restore the {metric} alert window: {e}")
+                continue
+            for ts, value in samples:
+                window.add(ts.timestamp(), float(value))
+
+    def _matches(self, rule: dict, value: float, window: MetricWindow) -> bool:
+        kind = rule.get("type", "threshold")
+        if kind == "threshold":
+            limit = rule.get("value", float(os.getenv("ALERT_THRESHOLD", "70")))
+            return value > limit
+        if kind == "delta":
+            return window.minimum is not None and value - window.minimum > rule["value"]
+        if kind == "spike":
+            mean = window.mean
+            return mean is not None and value >= rule.get("min_value", 0) and value > rule.get("factor", 2.0) * mean
+        logger.warning(f"Unknown alert rule type {kind} in {rule.get('name')}")
+        return False
+
+    def _step(self, rules: list, states: dict, value: float, window: MetricWindow, now: datetime):
+        """Advance debounce/cooldown state for one value; returns (changed rule names, alerts fired)."""
+        changed, fired = set(), []
+        # Compare against the window as it was before this value arrived
+        for rule in rules:
+            state = states.setdefault(rule["name"], {"pending_since": None, "last_fired_at": None})
+            if not self._matches(rule, value, window):
+                if state["pending_since"] is not None:
+                    state["pending_since"] = None
+                    changed.add(rule["name"])
+                continue
+
+            if state["pending_since"] is None:
+                state["pending_since"] = now
+                changed.add(rule["name"])
+            debounced = now - state["pending_since"] >= timedelta(seconds=rule.get("debounce_seconds", 0))
+            last = state["last_fired_at"]
+            cooled = last is None or now - last >= timedelta(seconds=rule.get("cooldown_seconds", 3600))
+            if debounced and cooled:
+                state["last_fired_at"] = now
+                changed.add(rule["name"])
+                fired.append({"rule": rule["name"], "metric": rule["metric"], "value": value,
+                              "fired_at": now.isoformat()})
+        return changed, fired
+
+    async def evaluate(self, metric: str, value: float) -> list:
+        """Evaluate every rule on `metric` against a new value; returns the alerts fired."""
+        rules = self.rules_by_metric.get(metric)
+        if not rules:
+            return []
+
+        async with self._lock:
+            if not self._restored:
+                self._restored = True
+                await asyncio.to_thread(self._restore_windows)
+            now = datetime.utcnow()
+            window = self.windows[metric]
+
+            # Cheap pass on local state: most values change nothing and never touch Postgres
+            local = {rule["name"]: dict(self.state.get(rule["name"]) or {"pending_since": None, "last_fired_at": None})
+                     for rule in rules}
+            changed, fired = self._step(rules, local, value, window, now)
+            if changed:
+                def step(states: dict):
+                    changed, fired = self._step(rules, states, value, window, now)
+                    return changed, (states, fired)
+
+                try:
+                    # State is re-read from Postgres under an advisory lock, so every worker
+                    # shares one debounce/cooldown per rule and an alert fires in one place
+                    local, fired = await asyncio.to_thread(
+                        update_alert_states, [rule["name"] for rule in rules], step, value
+                    )
+                except Exception as e:
+                    logger.warning(f"⚠️ Alert state unavailable, evaluating {metric} on local state: {e}")
+                self.state.update(local)
+
+            # Debounce re-evaluations repeat the last value; the window already has it
+            repeated = bool(window.values) and window.values[-1][1] == value
+            if window.seconds > 0 and not repeated:
+                window.add(now.timestamp(), float(value))
+                try:
+                    await asyncio.to_thread(save_alert_sample, metric, now, float(value), window.seconds)
+                except Exception as e:
+                    logger.warning(f"Could not record {metric} alert sample: {e}")
+
+        for alert in fired:
+            message = f"Alert {alert['rule']}: {metric} = {value}"
+            logger.warning(message)
+            try:
+                await asyncio.to_thread(save_alert_event, alert["rule"], now, value, message)
+            except Exception as e:
+                logger.warning(f"Could not record alert event: {e}")
+            _track(asyncio.create_task(send_alert_email_async(alert)))
+        return fired
+
+
+# -------------------------
+# Async mail path
+# -------------------------
+def send_alert_email(alert: dict) -> Optional[str]:
+    load_dotenv(override=True)
+    sender = os.getenv("EMAIL_SENDER_ADDRESS")
+    password = os.getenv("EMAIL_APP_PASSWORD")
+    recipient = os.getenv("ALERT_RECIPIENT_ADDRESS") or os.getenv("EMAIL_RECIPIENT_ADDRESS")
+    if not sender or not password or not recipient:
+        logger.error("Email credentials or alert recipient missing.")
+        return None
+
+    try:
+        msg = MIMEText(
+            f"Rule: {alert['rule']}\nMetric: {alert['metric']}\nValue: {alert['value']}\nFired at: {alert['fired_at']} UTC\n",
+            "plain",
+        )
+        msg["From"] = sender
+        msg["To"] = recipient
+        msg["Subject"] = f"[Collapse Monitor] ALERT {alert['rule']} ({alert['metric']} = {alert['value']})"
+        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
+            server.login(sender, password)
+            server.sendmail(sender, [recipient], msg.as_string())
+        logger.info(f"Alert {alert['rule']} emailed to {recipient}")
+        return recipient
+    except Exception:
+        logger.exception("Failed to send alert email")
+        return None
+
+
+async def send_alert_email_async(alert: dict) -> Optional[str]:
+    """SMTP runs in a worker thread so alerting never blocks the event loop."""
+    return await asyncio.to_thread(send_alert_email, alert)
+
+
+_engine: Optional[AlertEngine] = None
+_pending: set = set()  # keeps fire-and-forget tasks referenced until done
+
+
+def _done(task: asyncio.Task):
+    _pending.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Alert task {task.get_name()} failed: {task.exception()!r}")
+
+
+def _track(task: asyncio.Task) -> asyncio.Task:
+    _pending.add(task)
+    task.add_done_callback(_done)
+    return task
+
+
+def get_engine() -> AlertEngine:
+    global _engine
+    if _engine is None:
+        _engine = AlertEngine(load_rules())
+    return _engine
+
+
+def submit(metric: str, value):
+    """Schedule rule evaluation for a new value without blocking the caller; repeats are dropped."""
+    if value is None or not get_engine().wants(metric, float(value)):
+        return
+    get_engine().last_values[metric] = float(value)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    _track(loop.create_task(get_engine().evaluate(metric, float(value))))
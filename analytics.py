@@ -0,0 +1,93 @@
+# analytics.py
+"""
+Server-side trend analytics over daily_reports.
+
+One vectorized pandas pass produces rolling mean, EWMA, rolling volatility,
+percentile bands and day-over-day deltas. Windows are calendar days (a day
+without a report does not stretch them). Results are cached per parameter set
+until the next report is saved (db_config.report_saved_hooks, also broadcast
+between processes by coordination.py) and for at most TREND_CACHE_TTL_SECONDS,
+for reports saved by processes that do not broadcast.
+"""
+import os
+import math
+import time
+import threading
+
+from db_config import get_historical_reports, report_saved_hooks
+from providers import pandas
+
+TREND_CACHE_TTL_SECONDS = float(os.getenv("TREND_CACHE_TTL_SECONDS", "300"))
+
+_cache: dict = {}  # (window, span, band_window) -> (stored_at, result)
+_cache_lock = threading.Lock()
+_generation = 0  # bumped on invalidation so an in-flight compute is not cached stale
+
+
+def invalidate_trend_cache():
+    global _generation
+    with _cache_lock:
+        _cache.clear()
+        _generation += 1
+
+
+report_saved_hooks.append(invalidate_trend_cache)
+
+
+def compute_trend(rows, window: int = 7, span: int = 7, band_window: int = 30) -> dict:
+    """
+    rows: (report_date, score) tuples in report order. Several reports on one day
+    collapse to the last. delta is None for a day whose previous day has no report.
+    window, span and band_window are calendar days: rolling windows cover the
+    reports dated within the last `window` days, and the EWMA decays by date
+    (the half-life of a `span`-day EWMA) rather than per report.
+    Returns column-oriented, ready-to-plot series; gaps are None.
+    """
+    pd = pandas()
+    if not rows:
+        return {"window": window, "span": span, "band_window": band_window, "points": 0, "series": {}}
+
+    score = (
+        pd.DataFrame(rows, columns=["date", "score"])
+        .assign(date=lambda df: pd.to_datetime(df["date"]))
+        .groupby("date", sort=True)["score"].last()
+        .astype("float64")
+    )
+    bands = score.rolling(f"{band_window}D", min_periods=1)
+    if span > 1:
+        # Same per-day decay as ewm(span=span) on daily data, applied across real date gaps
+        halflife = math.log(0.5) / math.log(1 - 2 / (span + 1))
+        ewma = score.ewm(halflife=pd.Timedelta(days=halflife), times=score.index).mean()
+    else:
+        ewma = score
+    frame = pd.DataFrame({
+        "score": score,
+        "rolling_mean": score.rolling(f"{window}D", min_periods=1).mean(),
+        "ewma": ewma,
+        "volatility": score.rolling(f"{window}D", min_periods=2).std(),
+        "p10": bands.quantile(0.10),
+        "p50": bands.quantile(0.50),
+        "p90": bands.quantile(0.90),
+        # Day-over-day only: a report after a gap has no previous day to compare with
+        "delta": score.asfreq("D").diff().reindex(score.index),
+    }).round(3)
+
+    frame = frame.astype(object).where(frame.notna(), None)
+    series = {"date": [d.date().isoformat() for d in frame.index]}
+    series.update({column: frame[column].tolist() for column in frame.columns})
+    return {"window": window, "span": span, "band_window": band_window, "points": len(frame), "series": series}
+
+
+def get_trend(window: int = 7, span: int = 7, band_window: int = 30) -> dict:
+    """Cached compute_trend over the full report history."""
+    key = (window, span, band_window)
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None and time.time() - entry[0] < TREND_CACHE_TTL_SECONDS:
+            return entry[1]
+        generation = _generation
+    result = compute_trend(get_historical_reports(), window, span, band_window)
+    with _cache_lock:
+        if generation == _generation:
+            _cache[key] = (time.time(), result)
+    return result
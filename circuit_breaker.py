@@ -0,0 +1,91 @@
+# circuit_breaker.py
+"""
+Per-source circuit breakers.
+
+A source that fails `failure_threshold` runs in a row is opened and skipped
+(reported as missing) until `reset_seconds` pass; then a single trial run is
+let through and its outcome closes or re-opens the breaker. Thresholds come
+from the "ingestion" section of data_sources.json.
+"""
+import os
+import time
+import threading
+from typing import Optional
+
+from source_config import load_ingestion_settings
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 3, reset_seconds: float = 300.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go out now. Moves an expired open breaker to half-open."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.last_error = None
+
+    def record_failure(self, error: Optional[str] = None):
+        with self._lock:
+            self.failures += 1
+            self.last_error = error
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            retry_in = 0.0
+            if self.state == OPEN:
+                retry_in = max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "last_error": self.last_error,
+                "retry_in_seconds": round(retry_in, 1),
+            }
+
+
+_breakers: dict = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Process-wide breaker for a source, created on first use."""
+    with _registry_lock:
+        if name not in _breakers:
+            settings = load_ingestion_settings()
+            _breakers[name] = CircuitBreaker(
+                name,
+                failure_threshold=int(settings.get("failure_threshold", 3)),
+                reset_seconds=float(settings.get("reset_seconds", 300)),
+            )
+        return _breakers[name]
+
+
+def ingestion_deadline() -> float:
+    """Overall ingestion budget in seconds (INGESTION_DEADLINE_SECONDS overrides the config)."""
+    return float(os.getenv("INGESTION_DEADLINE_SECONDS") or load_ingestion_settings().get("deadline_seconds", 20))
+
+
+def breaker_states() -> dict:
+    return {name: breaker.snapshot() for name, breaker in _breakers.items()}
@@ -0,0 +1,185 @@
+# coordination.py
+"""
+Coordination between API workers, instances and the ingestion worker.
+
+Caches are per process (result_cache, the analytics trend cache), so with
+several workers each one would keep serving what it saw last. Processes share
+state changes through Postgres LISTEN/NOTIFY on one channel:
+
+    report_saved     a daily report was stored -> db_config.report_saved_hooks
+    source_updated   a new payload was stored for a source -> result_cache.invalidate,
+                     data_sources.fold_stored_results / fold_stored_events (live score,
+                     hazard grid)
+
+Messages are JSON ({"event", "origin", ...}); a process ignores its own. After
+the listener reconnects, messages may have been missed, so every cache is
+invalidated once.
+
+Scheduled ingestion runs in one process only: the one holding a session-level
+advisory lock. The others retry every LEADER_RETRY_SECONDS and take over when
+the leader's connection goes away.
+
+    COORDINATION=0            no LISTEN/NOTIFY (single process)
+    COORDINATION_CHANNEL=collapse_monitor
+    SCHEDULER_LEADER_LOCK=0   start the ingestion scheduler without the lock
+    LEADER_RETRY_SECONDS=30
+"""
+import os
+import json
+import time
+import socket
+import asyncio
+import logging
+from typing import Callable, Optional
+
+from db_config import get_async_db_connection, listen as listen_channel, notify, report_saved_hooks, try_advisory_lock
+from result_cache import result_cache
+
+logger = logging.getLogger("coordination")
+
+CHANNEL = os.getenv("COORDINATION_CHANNEL", "collapse_monitor")
+ORIGIN = f"{socket.gethostname()}:{os.getpid()}"
+
+REPORT_SAVED = "report_saved"
+SOURCE_UPDATED = "source_updated"
+
+INGESTION_LOCK_KEY = 4_210_001  # app-wide advisory lock id for the ingestion scheduler
+LEADER_RETRY_SECONDS = float(os.getenv("LEADER_RETRY_SECONDS", "30"))
+LEADER_CHECK_SECONDS = 15
+RECONNECT_MAX_SECONDS = 60
+
+_handlers: dict = {}
+_pending: set = set()
+
+
+def _enabled(var: str) -> bool:
+    return os.getenv(var, "1").lower() not in ("0", "false", "no")
+
+
+def coordination_enabled() -> bool:
+    return _enabled("COORDINATION")
+
+
+def on(event: str, handler: Callable[[dict], None]):
+    """Run `handler(message)` when another process broadcasts `event`."""
+    _handlers.setdefault(event, []).append(handler)
+
+
+# ---------- broadcasting ----------
+def broadcast(event: str, **fields):
+    """NOTIFY every other process. Blocking; from coroutines use broadcast_background."""
+    if not coordination_enabled():
+        return
+    message = json.dumps({"event": event, "origin": ORIGIN, **fields}, default=str)
+    try:
+        notify(CHANNEL, message)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not broadcast {event}: {e}")
+
+
+def broadcast_background(event: str, **fields):
+    """broadcast() from a worker thread when a loop is running, so the caller never waits on Postgres."""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        broadcast(event, **fields)
+        return
+    task = loop.create_task(asyncio.to_thread(broadcast, event, **fields))
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+
+
+# ---------- listening ----------
+def dispatch(payload: str):
+    try:
+        message = json.loads(payload)
+    except ValueError:
+        logger.warning(f"⚠️ Ignoring malformed coordination message: {payload[:200]}")
+        return
+    if message.get("origin") == ORIGIN:
+        return
+    for handler in _handlers.get(message.get("event"), []):
+        try:
+            handler(message)
+        except Exception:
+            logger.exception(f"Coordination handler for {message.get('event')} failed")
+
+
+def resync():
+    """Invalidate everything, as if every event had been received (used after missed messages)."""
+    for event in (REPORT_SAVED, SOURCE_UPDATED):
+        dispatch(json.dumps({"event": event, "origin": "resync"}))
+
+
+async def listen():
+    """Apply other processes' broadcasts to this process' caches, reconnecting with backoff. Runs until cancelled."""
+    delay, connected_before = 1, False
+    while True:
+        try:
+            conn = await get_async_db_connection()
+            async with conn:
+                await listen_channel(conn, CHANNEL)
+                logger.info(f"Listening for cache invalidations on {CHANNEL}")
+                if connected_before:
+                    resync()
+                connected_before, delay = True, 1
+                async for note in conn.notifies():
+                    dispatch(note.payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ Coordination listener disconnected ({e}), retrying in {delay}s")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, RECONNECT_MAX_SECONDS)
+
+
+# ---------- ingestion leadership ----------
+async def lead(start: Callable[[], None], stop: Callable, key: int = INGESTION_LOCK_KEY,
+               retry_seconds: float = LEADER_RETRY_SECONDS):
+    """
+    Call start() while this process holds advisory lock `key`, and await stop()
+    when the lock's connection is lost. Runs until cancelled (stopping first).
+    """
+    while True:
+        leading = False
+        try:
+            conn = await get_async_db_connection()
+            async with conn:
+                if await try_advisory_lock(conn, key):
+                    leading = True
+                    logger.info(f"🔒 {ORIGIN} holds the ingestion lock, starting the scheduler")
+                    start()
+                    while True:
+                        await asyncio.sleep(LEADER_CHECK_SECONDS)
+                        await conn.execute("SELECT 1")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ Ingestion lock connection failed: {e}")
+        finally:
+            if leading:
+                await stop()
+                logger.info(f"{ORIGIN} released the ingestion lock")
+        await asyncio.sleep(retry_seconds)
+
+
+def start_scheduler(scheduler) -> Optional[asyncio.Task]:
+    """Start an IngestionScheduler under the leader lock; the returned task must be cancelled on shutdown."""
+    if not _enabled("SCHEDULER_LEADER_LOCK"):
+        scheduler.start()
+        return None
+    return asyncio.create_task(lead(scheduler.start, scheduler.stop), name="ingestion-leader")
+
+
+# ---------- default handlers ----------
+def _run_report_saved_hooks(message: dict):
+    for hook in report_saved_hooks:
+        hook()
+
+
+def _invalidate_source(message: dict):
+    result_cache.invalidate(message.get("source"), message.get("stored_at") or time.time())
+
+
+on(REPORT_SAVED, _run_report_saved_hooks)
+on(SOURCE_UPDATED, _invalidate_source)
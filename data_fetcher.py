@@ -1,11 +1,21 @@
 # data_fetcher.py
 import os
 import json
-import feedparser
 import requests
 from datetime import datetime
 from typing import Callable
+from concurrent.futures import ThreadPoolExecutor, wait
 from dotenv import load_dotenv
+from rate_limiter import get_scheduler, retry_after_seconds
+from source_config import load_sources, max_age_seconds
+from db_config import get_latest_raw_payloads
+from circuit_breaker import get_breaker, ingestion_deadline
+import reddit_collector
+import rss_stream
+import geo_stream
+from hazard_grid import hazard_grid
+import replay
+from result_cache import result_cache
 
 load_dotenv()
 
@@ -50,6 +60,8 @@ def fetch_x_tweets(query="collapse OR recession OR climate", max_results=50):
     headers = {"Authorization": f"Bearer {os.getenv('X_BEARER_TOKEN')}"}
     try:
         response = requests.get(url, headers=headers, timeout=10)
+        if response.status_code == 429:
+            get_scheduler().penalize("x", retry_after_seconds(response.headers))
         response.raise_for_status()
         return response.json()
     except Exception as e:
@@ -73,19 +85,21 @@ def parse_x_tweets(tweets, source_name="x_social"):
         "error": tweets.get("error")
     }
 
-def parse_reddit(url, source_name="reddit_social"):
+def parse_reddit(url, source_name="reddit_social", subreddits=None, listings=None, limit=None):
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        posts = reddit_collector.collect_posts_sync(subreddits, listings, limit, url_template=url)
         items = []
-        for post in data.get("data", []):
+        for post in posts:
             items.append({
                 "title": post.get("title"),
-                "link": None,
-                "published": datetime.utcfromtimestamp(post.get("created_utc")).isoformat(),
-                "content": post.get("selftext", ""),
-                "extra": {"subreddit": post.get("subreddit")}
+                "link": f"https://www.reddit.com{post['permalink']}" if post.get("permalink") else None,
+                "published": datetime.utcfromtimestamp(post.get("created_utc") or 0).isoformat(),
+                "content": post.get("selftext") or "",
+                "extra": {
+                    "subreddit": post.get("subreddit"),
+                    "score": post.get("score"),
+                    "num_comments": post.get("num_comments"),
+                }
             })
         return {
             "source": source_name,
@@ -123,8 +137,14 @@ def parse_generic_api(api_data, source_name, data_type="generic"):
         "error": api_data.get("error") if isinstance(api_data, dict) else None
     }
 
-def parse_usgs(url):
-    return parse_generic_api(fetch_generic_api(url), "environment_usgs", "environment")
+def parse_usgs(url, min_magnitude=None):
+    # Compact event records instead of the full GeoJSON document
+    try:
+        events = geo_stream.stream_usgs_events(url, min_magnitude)
+        hazard_grid.add(events)
+        return parse_generic_api(events, "environment_usgs", "environment")
+    except Exception as e:
+        return parse_generic_api({"error": str(e)}, "environment_usgs", "environment")
 
 def parse_env_noaa(url):
     return parse_generic_api(fetch_generic_api(url), "environment_noaa", "environment")
@@ -145,13 +165,23 @@ def fetch_source(source: dict):
     source_type = source.get("type", "api")
 
     try:
+        # Quota-limited providers are queued on the shared scheduler
+        # (the Reddit collector takes its own tokens per listing)
+        if parser_name != "parse_reddit":
+            get_scheduler().acquire_sync(source.get("provider"))
+
         if parser_name.startswith("parse_") and source_type == "rss":
-            feed = feedparser.parse(url)
+            # Streams only the entries parse_rss_articles keeps (feedparser for malformed feeds)
+            feed = rss_stream.parse_feed(url, limit=source.get("limit", rss_stream.DEFAULT_LIMIT))
             parser_func: Callable = globals()[parser_name]
             return parser_func(feed)
         elif parser_name == "fetch_x_tweets":
             tweets = fetch_x_tweets()
             return parse_x_tweets(tweets, name)
+        elif parser_name == "parse_reddit":
+            return parse_reddit(url, name, source.get("subreddits"), source.get("listings"), source.get("limit"))
+        elif parser_name == "parse_usgs":
+            return parse_usgs(url, source.get("min_magnitude"))
         elif parser_name.startswith("parse_") or parser_name.startswith("fetch_"):
             parser_func: Callable = globals().get(parser_name)
             if parser_func:
@@ -169,20 +199,99 @@ def fetch_source(source: dict):
             "error": str(e)
         }
 
+def fetch_source_cached(source: dict):
+    """fetch_source through the result cache (cache_ttl_seconds / stale_ttl_seconds)."""
+    return result_cache.get_or_fetch_sync(
+        source.get("name"), lambda: fetch_source(source), source, lambda record: not record.get("error")
+    )
+
 # ------------------------
 # Fetch all sources from config
 # ------------------------
-def fetch_all_sources(config_file="data_sources.json"):
+def replay_source(source: dict, payloads: dict, day):
+    name = source.get("name")
+    record = payloads.get(name)
+    if isinstance(record, dict) and "data_type" in record:
+        return record
+    return {
+        "source": name,
+        "timestamp": datetime.utcnow().isoformat(),
+        "data_type": source.get("type", "api"),
+        "data": [],
+        "error": f"No stored payload for replay on {day}"
+    }
+
+def load_ingested_records(sources):
+    """Fresh records written by the ingestion scheduler, keyed by source name."""
     try:
-        with open(config_file, "r", encoding="utf-8") as f:
-            sources = json.load(f)
+        stored = get_latest_raw_payloads([src.get("name") for src in sources])
     except Exception as e:
-        print(f"Failed to load {config_file}: {e}")
-        return []
+        print(f"Could not read pre-ingested data, fetching live: {e}")
+        return {}
+    now = datetime.utcnow()
+    fresh = {}
+    for src in sources:
+        row = stored.get(src.get("name"))
+        if row and (now - row["timestamp"]).total_seconds() <= max_age_seconds(src):
+            fresh[src.get("name")] = row["payload"]
+    return fresh
+
+def fetch_all_sources(config_file="data_sources.json", replay_date=None, archive=None, use_ingested=None, names=None):
+    sources = load_sources(config_file)
+    if names:
+        sources = [src for src in sources if src.get("name") in names]
+
+    # Offline replay: serve the stored records of a past day, no network
+    day = replay.resolve_replay_date(replay_date)
+    if day:
+        payloads = replay.load_day(day, archive)
+        return [replay_source(src, payloads, day) for src in sources]
+
+    # Pre-ingested records stand in for their sources; only stale ones are fetched
+    if use_ingested is None:
+        use_ingested = os.getenv("REPORT_FROM_INGESTED", "0").lower() in ("1", "true", "yes")
+    if use_ingested:
+        ingested = load_ingested_records(sources)
+        live = fetch_live_sources([src for src in sources if src.get("name") not in ingested])
+        return [ingested.get(src.get("name")) or live.pop(0) for src in sources]
+
+    return fetch_live_sources(sources)
+
+def fetch_live_sources(sources):
+    # Sources run concurrently under one deadline; open breakers and late
+    # sources come back as records whose "error" marks them missing
+    def missing_record(src, reason):
+        return {
+            "source": src.get("name"),
+            "timestamp": datetime.utcnow().isoformat(),
+            "data_type": src.get("type", "api"),
+            "data": [],
+            "error": reason
+        }
+
+    pool = ThreadPoolExecutor(max_workers=max(1, len(sources)))
+    futures = {}
+    for i, src in enumerate(sources):
+        if get_breaker(src.get("name")).allow():
+            futures[i] = pool.submit(fetch_source_cached, src)
+    wait(futures.values(), timeout=ingestion_deadline())
+    pool.shutdown(wait=False, cancel_futures=True)
 
     all_data = []
-    for src in sources:
-        data = fetch_source(src)
+    for i, src in enumerate(sources):
+        breaker = get_breaker(src.get("name"))
+        future = futures.get(i)
+        if future is None:
+            data = missing_record(src, "circuit open")
+        elif not future.done():
+            data = missing_record(src, "deadline exceeded")
+            breaker.record_failure(data["error"])
+        else:
+            data = future.result()
+            if data.get("error"):
+                breaker.record_failure(str(data["error"]))
+            else:
+                breaker.record_success()
         all_data.append(data)
     return all_data
 
@@ -1,33 +1,44 @@
 # data_sources.py
 import os
-import asyncpraw
+import time
 import asyncio
 import aiohttp
 from datetime import datetime, timedelta
+from typing import Optional
 from dotenv import load_dotenv
-from db_config import save_raw_data
+from db_config import save_raw_data, get_latest_raw_payloads, get_event_items, record_raw_error
+from source_config import source_settings, max_age_seconds
+from rate_limiter import get_scheduler, retry_after_seconds
+from circuit_breaker import get_breaker, ingestion_deadline
+import coordination
+import live_score
+from result_cache import result_cache
+import reddit_collector
+import geo_stream
+import market_data
+from hazard_grid import hazard_grid
+import replay
 
 load_dotenv()
 
-# Initialize Reddit client (async)
-reddit = asyncpraw.Reddit(
-    client_id=os.getenv("REDDIT_CLIENT_ID"),
-    client_secret=os.getenv("REDDIT_CLIENT_SECRET"),
-    user_agent=os.getenv("REDDIT_USER_AGENT", "CollapseRiskAnalysis/1.0"),
-)
-
 
 # ---------- Generic safe fetcher ----------
-async def safe_get_json(url: str, params: dict = None) -> dict:
+async def safe_get_json(url: str, params: dict = None, provider: str = None) -> dict:
     """
     Helper: safely fetch JSON from a URL with aiohttp.
     Always returns a dict (never None).
+    Calls to a quota-limited provider wait for a token from the shared scheduler.
     """
     try:
+        await get_scheduler().acquire(provider)
         async with aiohttp.ClientSession() as session:
             async with session.get(url, params=params, ssl=False, timeout=10) as resp:
                 if resp.status == 200:
                     return await resp.json()
+                elif resp.status == 429:
+                    get_scheduler().penalize(provider, retry_after_seconds(resp.headers))
+                    print(f"⚠️ Rate limited by {provider or url}")
+                    return {}
                 else:
                     print(f"⚠️ Error {resp.status} fetching {url}")
                     return {}
@@ -36,24 +47,60 @@ async def safe_get_json(url: str, params: dict = None) -> dict:
         return {}
 
 
+async def safe_stream(url: str, consume, params: dict = None, provider: str = None):
+    """
+    Like safe_get_json, but hands the open response to `consume` (a coroutine
+    function) so large bodies can be read incrementally. Returns None on failure.
+    """
+    try:
+        await get_scheduler().acquire(provider)
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url, params=params, ssl=False, timeout=10) as resp:
+                if resp.status == 200:
+                    return await consume(resp)
+                elif resp.status == 429:
+                    get_scheduler().penalize(provider, retry_after_seconds(resp.headers))
+                    print(f"⚠️ Rate limited by {provider or url}")
+                else:
+                    print(f"⚠️ Error {resp.status} fetching {url}")
+    except Exception as e:
+        print(f"⚠️ Exception fetching {url}: {e}")
+    return None
+
+
+async def store_payload(name: str, payload):
+    """
+    Save a collector's payload to raw_data (off the event loop: it is one
+    multi-statement transaction) and tell the other processes, whose result
+    caches, live score and hazard grid then follow it.
+    """
+    await asyncio.to_thread(save_raw_data, REPLAY_ADAPTERS[name][0], payload)
+    coordination.broadcast_background(coordination.SOURCE_UPDATED, source=name, stored_at=time.time())
+
+
 # ---------- Individual data sources ----------
+# Set on a collector's result when the fetch itself failed. An empty but successful
+# result (no posts, no open events) is not a failure; see is_failed_result.
+FETCH_ERROR_KEY = "fetch_error"
+
+
+def failed_result(result: dict, error) -> dict:
+    """A collector's empty result marked as a failed fetch."""
+    return {**result, FETCH_ERROR_KEY: str(error)}
+
+
 async def get_social_data():
-    """Fetch hot posts from r/collapse subreddit."""
-    posts_data = []
+    """
+    Fetch posts from the configured subreddits/listings concurrently
+    (REDDIT_SUBREDDITS, REDDIT_LISTINGS; defaults to r/collapse hot).
+    """
     try:
-        subreddit = await reddit.subreddit("collapse")
-        async for submission in subreddit.hot(limit=50):
-            posts_data.append({
-                "title": submission.title,
-                "score": submission.score,
-                "num_comments": submission.num_comments,
-            })
-        # Save without await (sync call)
-        save_raw_data("reddit", {"posts": posts_data})
+        posts_data = await reddit_collector.collect_posts()
+        await store_payload("social", {"posts": posts_data})
         return {"social_media_posts": posts_data}
     except Exception as e:
         print(f"⚠️ Error fetching social data: {e}")
-        return {"social_media_posts": []}
+        return failed_result({"social_media_posts": []}, e)
 
 
 async def get_environmental_data():
@@ -64,14 +111,24 @@ async def get_environmental_data():
     url = "https://eonet.gsfc.nasa.gov/api/v2.1/events"
     params = {"api_key": NASA_API_KEY, "status": "open", "source": "usgs", "start": start_date}
 
+    min_magnitude = source_settings("environmental").get("min_magnitude")
+
     try:
-        events = await safe_get_json(url, params)
-        count = len(events.get("events", []))
-        save_raw_data("nasa_eonet", {"events": count})
-        return {"natural_disaster_events": count}
+        # Streamed into compact records; the full event list is never held in memory
+        events = await safe_stream(
+            url, lambda resp: geo_stream.read_eonet_events(resp, min_magnitude), params, provider="nasa"
+        )
+        if events is None:
+            # The request failed; an empty list is a window with no open events
+            return failed_result({"natural_disaster_events": 0, "hazard_hotspots": []}, "EONET request failed")
+        count = len(events)
+        hazard_grid.add(events)
+        hotspots = hazard_grid.hotspots()
+        await store_payload("environmental", {"events": count, "items": events, "hotspots": hotspots})
+        return {"natural_disaster_events": count, "hazard_hotspots": hotspots}
     except Exception as e:
         print(f"⚠️ Error fetching NASA data: {e}")
-        return {"natural_disaster_events": 0}
+        return failed_result({"natural_disaster_events": 0, "hazard_hotspots": []}, e)
 
 
 async def get_economic_data():
@@ -81,34 +138,40 @@ async def get_economic_data():
     params = {"function": "OVERVIEW", "symbol": "IBM", "apikey": ALPHA_VANTAGE_API_KEY}
 
     try:
-        data = await safe_get_json(url, params)
-        save_raw_data("economic", data)
+        data = await safe_get_json(url, params, provider="alphavantage")
+        # safe_get_json returns {} on any failed call; a company overview is never empty
+        if not data:
+            return failed_result({"economic_data": {}}, "no payload from Alpha Vantage")
+        await store_payload("economic", data)
         return {"economic_data": data}
     except Exception as e:
         print(f"⚠️ Error fetching economic data: {e}")
-        return {"economic_data": {}}
+        return failed_result({"economic_data": {}}, e)
 
 
 async def get_financial_markets():
-    """Fetch or simulate major financial market data."""
+    """S&P 500 change and Nasdaq volatility level from cached SPY/QQQ daily series."""
     try:
-        data = {"sp500_change": "+1.2%", "nasdaq_volatility": "high"}
-        save_raw_data("financial_markets", data)
+        data = await market_data.market_signals()
+        # {} means no series could be loaded at all
+        if not data:
+            return failed_result({"financial_markets": {}}, "no market series available")
+        await store_payload("financial_markets", data)
         return {"financial_markets": data}
     except Exception as e:
         print(f"⚠️ Error fetching financial markets: {e}")
-        return {"financial_markets": {}}
+        return failed_result({"financial_markets": {}}, e)
 
 
 async def get_news_sentiment():
     """Fetch or simulate aggregated news sentiment."""
     try:
         data = {"overall_sentiment": "negative", "keywords": ["supply chain", "recession"]}
-        save_raw_data("news_sentiment", data)
+        await store_payload("news_sentiment", data)
         return {"news_sentiment": data}
     except Exception as e:
         print(f"⚠️ Error fetching news sentiment: {e}")
-        return {"news_sentiment": {}}
+        return failed_result({"news_sentiment": {}}, e)
 
 
 # ---------- Master fetch orchestrator ----------
@@ -121,22 +184,219 @@ DATA_SOURCES = {
 }
 
 
-async def fetch_all_data():
+# raw_data source_name each fetcher saves under, and how to rebuild its result
+REPLAY_ADAPTERS = {
+    "economic": ("economic", lambda p: {"economic_data": p}),
+    "social": ("reddit", lambda p: {"social_media_posts": p.get("posts", [])}),
+    "environmental": ("nasa_eonet", lambda p: {"natural_disaster_events": p.get("events", 0),
+                                               "hazard_hotspots": p.get("hotspots", [])}),
+    "financial_markets": ("financial_markets", lambda p: {"financial_markets": p}),
+    "news_sentiment": ("news_sentiment", lambda p: {"news_sentiment": p}),
+}
+
+
+async def replay_all_data(day, archive: str = None, sources=None):
+    """
+    Rebuild the fetch_all_data result for a past day from stored payloads.
+    No network calls and nothing is written back to raw_data.
+    """
+    payloads = await asyncio.to_thread(replay.load_day, day, archive)
+
+    combined_data = {"timestamp": datetime.utcnow().isoformat(), "replay_date": day.isoformat()}
+    missing = {}
+    for name in sources or DATA_SOURCES:
+        raw_name, rebuild = REPLAY_ADAPTERS[name]
+        payload = payloads.get(raw_name)
+        if payload is None:
+            print(f"⚠️ No stored payload for {name} on {day}")
+            combined_data[name] = {}
+            missing[name] = "not stored"
+            continue
+        combined_data.update(rebuild(payload))
+
+    combined_data["missing_sources"] = missing
+    return combined_data
+
+
+# ---------- Live state from stored payloads ----------
+_folding: set = set()  # keeps broadcast-triggered folds referenced until done
+_events_loaded_until: Optional[datetime] = None  # newest raw_items.fetched_at folded into the grid
+EVENT_OVERLAP_SECONDS = 120  # re-read margin for rows committed after a later fetched_at
+
+
+async def fold_stored_results(sources=None):
+    """
+    Fold the newest stored payload of each collector (all of DATA_SOURCES by default)
+    into this process' live score. Used at startup and when another process
+    broadcasts source_updated, so every worker serves the score the ingesting one
+    computed. Never alerts: the fetching process already did.
+    """
+    names = [name for name in sources or DATA_SOURCES if name in REPLAY_ADAPTERS]
+    raw_names = {REPLAY_ADAPTERS[name][0]: name for name in names}
+    try:
+        stored = await asyncio.to_thread(get_latest_raw_payloads, list(raw_names))
+    except Exception as e:
+        print(f"⚠️ Could not load stored payloads for the live score: {e}")
+        return
+    for raw_name, name in raw_names.items():
+        if raw_name in stored:
+            live_score.observe(REPLAY_ADAPTERS[name][1](stored[raw_name]["payload"]), alert=False)
+
+
+async def fold_stored_events():
+    """
+    Add hazard events stored since the last call (raw_items rows with coordinates,
+    from any source) to this process' hazard grid; the first call loads the grid's
+    whole window. Events already in the grid are skipped by id.
+    """
+    global _events_loaded_until
+    now = datetime.utcnow()
+    published_since = now - timedelta(seconds=hazard_grid.window_buckets * hazard_grid.bucket_seconds)
+    fetched_since = (_events_loaded_until - timedelta(seconds=EVENT_OVERLAP_SECONDS)
+                     if _events_loaded_until else datetime.min)
+    try:
+        rows = await asyncio.to_thread(get_event_items, fetched_since, published_since)
+    except Exception as e:
+        print(f"⚠️ Could not load stored hazard events: {e}")
+        return
+    if rows:
+        await asyncio.to_thread(hazard_grid.add, [item for _, item in rows])
+        _events_loaded_until = max(_events_loaded_until or rows[-1][0], rows[-1][0])
+    elif _events_loaded_until is None:
+        _events_loaded_until = now
+
+
+async def restore_live_state():
+    """Live score and hazard grid from what is stored; run once at startup."""
+    await fold_stored_events()
+    await fold_stored_results()
+
+
+def _on_source_updated(message: dict):
+    source = message.get("source")
+    loop = asyncio.get_running_loop()
+    # Called from the listener on the event loop; the DB reads run in tasks
+    folds = [fold_stored_events()]
+    if source is None or source in REPLAY_ADAPTERS:
+        folds.append(fold_stored_results([source] if source else None))
+    for fold in folds:
+        task = loop.create_task(fold)
+        _folding.add(task)
+        task.add_done_callback(_folding.discard)
+
+
+coordination.on(coordination.SOURCE_UPDATED, _on_source_updated)
+
+
+def report_from_ingested(flag=None) -> bool:
+    """Whether reports read pre-ingested payloads (REPORT_FROM_INGESTED) instead of fetching."""
+    if flag is None:
+        return os.getenv("REPORT_FROM_INGESTED", "0").lower() in ("1", "true", "yes")
+    return bool(flag)
+
+
+async def load_ingested_data(sources=None) -> dict:
+    """
+    Returns {name: result} for collectors whose newest stored payload is still
+    fresh (see source_config.max_age_seconds); stale ones are left out.
+    """
+    raw_names = {REPLAY_ADAPTERS[name][0]: name for name in sources or DATA_SOURCES}
+    stored = await asyncio.to_thread(get_latest_raw_payloads, list(raw_names))
+
+    now = datetime.utcnow()
+    fresh = {}
+    for raw_name, row in stored.items():
+        name = raw_names[raw_name]
+        if (now - row["timestamp"]).total_seconds() <= max_age_seconds(source_settings(name)):
+            fresh[name] = REPLAY_ADAPTERS[name][1](row["payload"])
+    return fresh
+
+
+def is_failed_result(result: Optional[dict]) -> bool:
+    """
+    Collectors swallow their errors and mark the result (FETCH_ERROR_KEY); those and
+    missing results are failures. Empty but correct results (no posts, no events) are not.
+    """
+    return not result or bool(result.get(FETCH_ERROR_KEY))
+
+
+def without_fetch_error(result: dict) -> dict:
+    return {key: value for key, value in result.items() if key != FETCH_ERROR_KEY}
+
+
+async def fetch_all_data(replay_date=None, archive: str = None, use_ingested=None, sources=None):
     """
     Asynchronously fetch data from all defined sources.
     Always returns a dict with keys for each source.
+    With replay_date (or REPLAY_DATE set) the stored payloads of that day are served instead.
+    With use_ingested (or REPORT_FROM_INGESTED set) fresh payloads written by the
+    ingestion scheduler are used and only stale sources are fetched live.
+    `sources` restricts the run to some DATA_SOURCES names (the pipeline fetches per source).
+
+    Sources whose circuit breaker is open are skipped, and whatever has not
+    arrived by the ingestion deadline is cancelled. Both end up in
+    "missing_sources" ({name: reason}) so the report can say what it lacked.
     """
-    tasks = {name: func() for name, func in DATA_SOURCES.items()}
-    results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+    day = replay.resolve_replay_date(replay_date)
+    if day:
+        return await replay_all_data(day, archive, sources)
 
     combined_data = {"timestamp": datetime.utcnow().isoformat()}
+    missing = {}
+    live_sources = {name: DATA_SOURCES[name] for name in sources or DATA_SOURCES}
 
-    for i, (name, _) in enumerate(tasks.items()):
-        result = results[i]
-        if isinstance(result, Exception):
-            print(f"⚠️ Error in task {name}: {result}")
-            combined_data[name] = {}
-        else:
+    if report_from_ingested(use_ingested):
+        try:
+            ingested = await load_ingested_data(list(live_sources))
+        except Exception as e:
+            print(f"⚠️ Could not read pre-ingested data, fetching live: {e}")
+            ingested = {}
+        for name, result in ingested.items():
             combined_data.update(result)
+            live_sources.pop(name)
+        combined_data["ingested_sources"] = sorted(ingested)
+
+    tasks = {}
+    for name, func in live_sources.items():
+        if get_breaker(name).allow():
+            # Fresh cached results return at once; stale ones are refreshed in the background
+            fetch = result_cache.get_or_fetch(name, func, source_settings(name), lambda r: not is_failed_result(r))
+            tasks[name] = asyncio.create_task(fetch)
+        else:
+            missing[name] = "circuit open"
+
+    if tasks:
+        _, pending = await asyncio.wait(tasks.values(), timeout=ingestion_deadline())
+        for task in pending:
+            task.cancel()
+
+    failed = []
+    for name, task in tasks.items():
+        breaker = get_breaker(name)
+        if not task.done() or task.cancelled():
+            reason = "deadline exceeded"
+        elif task.exception() is not None:
+            reason = f"error: {task.exception()}"
+        elif is_failed_result(task.result()):
+            reason = f"error: {(task.result() or {}).get(FETCH_ERROR_KEY) or 'no result'}"
+            combined_data.update(without_fetch_error(task.result() or {}))
+        else:
+            breaker.record_success()
+            combined_data.update(task.result())
+            live_score.observe(task.result())
+            continue
+        print(f"⚠️ Source {name} missing: {reason}")
+        breaker.record_failure(reason)
+        missing[name] = reason
+        failed.append(REPLAY_ADAPTERS[name][0])
+
+    for raw_name in failed:
+        try:
+            await asyncio.to_thread(record_raw_error, raw_name)
+        except Exception as e:
+            print(f"⚠️ Could not record the {raw_name} failure: {e}")
 
+    for name in missing:
+        combined_data.setdefault(name, {})
+    combined_data["missing_sources"] = missing
     return combined_data
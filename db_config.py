@@ -1,30 +1,48 @@
 # db_config.py
 import os
 import json
-from datetime import datetime
+import hashlib
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
 
 import psycopg  # psycopg v3
+from psycopg import sql
 from psycopg.rows import dict_row
 from psycopg.types.json import Json
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Callbacks run after a daily report is saved (e.g. cache invalidation)
+report_saved_hooks = []
 
-def get_db_connection():
-    """
-    psycopg v3 connection with dict_row so fetchone()/fetchall() return dicts.
-    """
-    return psycopg.connect(
+
+def _connection_params() -> dict:
+    return dict(
         host=os.getenv("DB_HOST", "localhost"),
         dbname=os.getenv("DB_NAME", "collapse_monitor"),
         user=os.getenv("DB_USER", "postgres"),
         password=os.getenv("DB_PASSWORD", "password"),
         port=int(os.getenv("DB_PORT", "5432")),
-        row_factory=dict_row,
     )
 
 
+def get_db_connection():
+    """
+    psycopg v3 connection with dict_row so fetchone()/fetchall() return dicts.
+    """
+    return psycopg.connect(**_connection_params(), row_factory=dict_row)
+
+
+async def get_async_db_connection():
+    """
+    Autocommit async connection, for LISTEN and session-level advisory locks
+    (both live as long as the connection).
+    """
+    return await psycopg.AsyncConnection.connect(**_connection_params(), autocommit=True, row_factory=dict_row)
+
+
 def setup_database():
     with get_db_connection() as conn, conn.cursor() as cur:
         # raw_data stores normalized JSON payloads from each source
@@ -37,6 +55,155 @@ def setup_database():
             );
         """)
 
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS raw_data_source_ts_idx
+            ON raw_data (source_name, timestamp DESC);
+        """)
+
+        # alert_state keeps debounce/cooldown per rule across restarts
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS alert_state (
+                rule_name TEXT PRIMARY KEY,
+                pending_since TIMESTAMP,
+                last_fired_at TIMESTAMP,
+                last_value DOUBLE PRECISION,
+                updated_at TIMESTAMP NOT NULL
+            );
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS alert_events (
+                id SERIAL PRIMARY KEY,
+                rule_name TEXT NOT NULL,
+                fired_at TIMESTAMP NOT NULL,
+                value DOUBLE PRECISION,
+                message TEXT NOT NULL
+            );
+        """)
+
+        # alert_samples: recent values of metrics with windowed (delta/spike) rules
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS alert_samples (
+                metric TEXT NOT NULL,
+                ts TIMESTAMP NOT NULL,
+                value DOUBLE PRECISION NOT NULL
+            );
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS alert_samples_metric_ts_idx
+            ON alert_samples (metric, ts);
+        """)
+
+        # provider_buckets: token buckets shared by every process (rate_limiter.py)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS provider_buckets (
+                provider TEXT PRIMARY KEY,
+                tokens DOUBLE PRECISION NOT NULL,
+                updated_at TIMESTAMPTZ NOT NULL
+            );
+        """)
+
+        # llm_calls profiles every model call (and analysis cache hits)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS llm_calls (
+                id SERIAL PRIMARY KEY,
+                called_at TIMESTAMP NOT NULL,
+                purpose TEXT NOT NULL,
+                backend TEXT NOT NULL,
+                attempt INTEGER NOT NULL,
+                prompt_bytes INTEGER NOT NULL,
+                prompt_tokens INTEGER NOT NULL,
+                prompt_sources JSONB NOT NULL,
+                output_tokens INTEGER,
+                latency_ms DOUBLE PRECISION,
+                outcome TEXT NOT NULL,
+                cache_hit BOOLEAN NOT NULL DEFAULT FALSE,
+                error TEXT
+            );
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS llm_calls_called_at_idx
+            ON llm_calls (called_at DESC);
+        """)
+
+        # raw_daily_rollups: per-source, per-day volume and health, kept current by save_raw_data
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS raw_daily_rollups (
+                source_name TEXT NOT NULL,
+                day DATE NOT NULL,
+                payloads INTEGER NOT NULL,
+                items INTEGER NOT NULL,
+                max_items INTEGER NOT NULL,
+                bytes BIGINT NOT NULL,
+                errors INTEGER NOT NULL,
+                first_at TIMESTAMP NOT NULL,
+                last_at TIMESTAMP NOT NULL,
+                metrics_last JSONB NOT NULL DEFAULT '{}',
+                metrics_min JSONB NOT NULL DEFAULT '{}',
+                metrics_max JSONB NOT NULL DEFAULT '{}',
+                PRIMARY KEY (source_name, day)
+            );
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS raw_daily_rollups_day_idx
+            ON raw_daily_rollups (day DESC);
+        """)
+        # First run on an existing database: seed counts from raw_data (metrics start empty)
+        cur.execute(f"""
+            INSERT INTO raw_daily_rollups (source_name, day, payloads, items, max_items, bytes, errors, first_at, last_at)
+            SELECT source_name, timestamp::date, COUNT(*), SUM(n_items), MAX(n_items),
+                   SUM(octet_length(payload_json::text)), SUM(is_error), MIN(timestamp), MAX(timestamp)
+            FROM (
+                SELECT source_name, timestamp, payload_json,
+                       {_SQL_ITEM_COUNT} AS n_items,
+                       CASE WHEN payload_json IN ('{{}}', '[]', 'null')
+                              OR COALESCE(payload_json->>'error', '') NOT IN ('', 'false') THEN 1 ELSE 0 END AS is_error
+                FROM raw_data
+            ) AS raw
+            WHERE NOT EXISTS (SELECT 1 FROM raw_daily_rollups)
+            GROUP BY source_name, timestamp::date
+        """)
+
+        # raw_items: one row per article/post/event exploded from raw payloads, full-text indexed
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS raw_items (
+                id BIGSERIAL PRIMARY KEY,
+                source_name TEXT NOT NULL,
+                item_key TEXT NOT NULL,
+                fetched_at TIMESTAMP NOT NULL,
+                published_at TIMESTAMP,
+                title TEXT,
+                url TEXT,
+                body TEXT,
+                item JSONB NOT NULL,
+                search tsvector GENERATED ALWAYS AS (
+                    setweight(to_tsvector('english', COALESCE(title, '')), 'A') ||
+                    setweight(to_tsvector('english', COALESCE(body, '')), 'B')
+                ) STORED,
+                UNIQUE (source_name, item_key)
+            );
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS raw_items_search_idx
+            ON raw_items USING GIN (search);
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS raw_items_published_idx
+            ON raw_items (COALESCE(published_at, fetched_at) DESC);
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS raw_items_fetched_idx
+            ON raw_items (fetched_at);
+        """)
+
+        # raw_items_backfill: how far backfill_raw_items got through raw_data (one row)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS raw_items_backfill (
+                singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+                last_raw_id BIGINT NOT NULL,
+                completed_at TIMESTAMP
+            );
+        """)
+
         # daily_reports matches the app’s report schema
         cur.execute("""
             CREATE TABLE IF NOT EXISTS daily_reports (
@@ -50,18 +217,259 @@ def setup_database():
         """)
         conn.commit()
 
+    # First run on an existing database: index the items already in raw_data
+    seeded = backfill_raw_items()
+    if seeded:
+        print(f"Indexed items from {seeded} existing raw_data payloads into raw_items.")
+
+
+# Payload keys holding the item list, in the order they are looked up
+ITEM_LIST_KEYS = ("data", "items", "posts")
+_SQL_ITEM_COUNT = "COALESCE(" + ", ".join(
+    f"jsonb_array_length(CASE jsonb_typeof(payload_json->'{key}') WHEN 'array' THEN payload_json->'{key}' END)"
+    for key in ITEM_LIST_KEYS
+) + ", 0)"
+MAX_ROLLUP_METRICS = 50
+MAX_ITEM_BODY_CHARS = 20000
+ITEM_METRIC_SKIP = ("lat", "lon")  # numeric item fields whose max means nothing
+
+
+def _item_list(data) -> list:
+    if not isinstance(data, dict):
+        return []
+    return next((data[key] for key in ITEM_LIST_KEYS if isinstance(data.get(key), list)), [])
+
+
+def _numeric_fields(value, prefix: str = "", depth: int = 3) -> dict:
+    """Dotted-path -> number for numeric leaves of nested dicts (lists are skipped)."""
+    fields = {}
+    if not isinstance(value, dict) or depth == 0:
+        return fields
+    for key, item in value.items():
+        path = f"{prefix}{key}"
+        if isinstance(item, bool):
+            continue
+        if isinstance(item, (int, float)):
+            fields[path] = item
+        elif isinstance(item, dict):
+            fields.update(_numeric_fields(item, f"{path}.", depth - 1))
+    return fields
+
+
+def payload_summary(data) -> dict:
+    """
+    What one raw payload adds to its day's rollup: item count (first list under
+    ITEM_LIST_KEYS), whether it is an error, and its numeric fields, including
+    the max of each numeric item field as "items.<field>".
+    """
+    items = _item_list(data)
+    metrics = _numeric_fields(data)
+    for item in items:
+        for key, value in _numeric_fields(item, depth=1).items():
+            if key in ITEM_METRIC_SKIP:
+                continue
+            path = f"items.{key}"
+            metrics[path] = max(value, metrics.get(path, value))
+    metrics = dict(sorted(metrics.items())[:MAX_ROLLUP_METRICS])
+    return {
+        "items": len(items),
+        "error": 1 if not data or (isinstance(data, dict) and data.get("error")) else 0,
+        "metrics": metrics,
+    }
+
+
+def _item_time(value) -> Optional[datetime]:
+    """Naive UTC datetime from an epoch, ISO 8601 or RFC 822 (RSS) timestamp."""
+    if value in (None, "") or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.utcfromtimestamp(value) if value > 0 else None
+    text = str(value)
+    try:
+        parsed = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            parsed = parsedate_to_datetime(text)
+        except (TypeError, ValueError):
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _clean_text(value) -> Optional[str]:
+    # COPY rejects NUL characters
+    return str(value).replace("\x00", "")[:MAX_ITEM_BODY_CHARS] if value not in (None, "") else None
+
+
+def explode_items(data) -> list:
+    """
+    (item_key, published_at, title, url, body, item JSON) for each item in a payload:
+    parse_rss_articles / parse_reddit / parse_x_tweets records ("data"), collector
+    posts (reddit "posts") and hazard events ("items"). Items with no text are skipped.
+    """
+    rows = []
+    for item in _item_list(data):
+        if not isinstance(item, dict):
+            continue
+        title = _clean_text(item.get("title"))
+        body = _clean_text(item.get("content") or item.get("text") or item.get("summary") or item.get("selftext"))
+        if not (title or body):
+            continue
+        url = item.get("link") or item.get("url")
+        if not url and str(item.get("permalink") or "").startswith("/"):
+            url = f"https://www.reddit.com{item['permalink']}"
+        published = _item_time(
+            item.get("published") or item.get("created_utc") or item.get("time") or item.get("date")
+        )
+        key = item.get("id") or url or hashlib.sha1(f"{title}\n{body}".encode("utf-8")).hexdigest()
+        rows.append((str(key), published, title, url, body, json.dumps(item, default=str)))
+    return rows
+
+
+def _copy_items(cur, source_name: str, fetched_at, rows: list):
+    """COPY rows into a staging table, then insert the ones raw_items does not have yet."""
+    cur.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS raw_items_stage (
+            item_key TEXT, published_at TIMESTAMP, title TEXT, url TEXT, body TEXT, item TEXT
+        ) ON COMMIT DROP
+    """)
+    with cur.copy("COPY raw_items_stage (item_key, published_at, title, url, body, item) FROM STDIN") as copy:
+        for row in rows:
+            copy.write_row(row)
+    cur.execute(
+        """
+        INSERT INTO raw_items (source_name, item_key, fetched_at, published_at, title, url, body, item)
+        SELECT DISTINCT ON (item_key) %s, item_key, %s, published_at, title, url, body, item::jsonb
+        FROM raw_items_stage
+        ON CONFLICT (source_name, item_key) DO NOTHING
+        """,
+        (source_name, fetched_at),
+    )
+    # Several payloads may be copied in one transaction (backfill_raw_items)
+    cur.execute("TRUNCATE raw_items_stage")
+
+
+def backfill_raw_items(batch_size: int = 200) -> int:
+    """
+    Explode raw_data payloads into raw_items, oldest first, until every payload
+    has been through it once. Progress (the last raw_data.id done) is committed with
+    each batch, so an interrupted backfill resumes where it stopped. Reads through
+    a server-side cursor, so memory stays at one batch of payloads. Returns payloads read.
+    """
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT last_raw_id, completed_at FROM raw_items_backfill")
+        progress = cur.fetchone()
+    if progress and progress["completed_at"] is not None:
+        return 0
+    last_id = progress["last_raw_id"] if progress else 0
+
+    done = 0
+    with get_db_connection() as read_conn, get_db_connection() as write_conn:
+        with read_conn.cursor(name="raw_items_backfill") as reader, write_conn.cursor() as writer:
+            reader.itersize = batch_size
+            reader.execute(
+                "SELECT id, source_name, timestamp, payload_json FROM raw_data WHERE id > %s ORDER BY id", (last_id,)
+            )
+            while True:
+                rows = reader.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    items = explode_items(row["payload_json"])
+                    if items:
+                        _copy_items(writer, row["source_name"], row["timestamp"], items)
+                _save_backfill_progress(writer, rows[-1]["id"])
+                write_conn.commit()
+                done += len(rows)
+            _save_backfill_progress(writer, None, completed_at=datetime.utcnow())
+            write_conn.commit()
+    return done
+
+
+def _save_backfill_progress(cur, last_raw_id, completed_at=None):
+    cur.execute(
+        """
+        INSERT INTO raw_items_backfill (last_raw_id, completed_at) VALUES (COALESCE(%(id)s, 0), %(done)s)
+        ON CONFLICT (singleton) DO UPDATE SET
+            last_raw_id = COALESCE(%(id)s, raw_items_backfill.last_raw_id),
+            completed_at = %(done)s
+        """,
+        {"id": last_raw_id, "done": completed_at},
+    )
+
+
+def _merge_metric(column: str, func: str) -> str:
+    """Per-key LEAST/GREATEST of the stored and incoming JSONB metrics."""
+    return f"""{column} = r.{column} || (
+        SELECT COALESCE(jsonb_object_agg(m.key, {func}(m.value::float8,
+                        COALESCE((r.{column}->>m.key)::float8, m.value::float8))), '{{}}')
+        FROM jsonb_each_text(EXCLUDED.{column}) AS m
+    )"""
+
 
 def save_raw_data(source_name: str, data):
     """
-    Save raw source payload; Json(...) ensures correct JSONB handling.
+    Save raw source payload, fold it into raw_daily_rollups and add its new items
+    to raw_items, all in one transaction.
     """
+    now = datetime.utcnow()
+    payload = json.dumps(data, default=str)
+    summary = payload_summary(data)
     with get_db_connection() as conn, conn.cursor() as cur:
         cur.execute(
             """
             INSERT INTO raw_data (source_name, timestamp, payload_json)
-            VALUES (%s, %s, %s)
+            VALUES (%s, %s, %s::jsonb)
+            """,
+            (source_name, now, payload),
+        )
+        cur.execute(
+            f"""
+            INSERT INTO raw_daily_rollups AS r
+                (source_name, day, payloads, items, max_items, bytes, errors, first_at, last_at,
+                 metrics_last, metrics_min, metrics_max)
+            VALUES (%(source)s, %(day)s, 1, %(items)s, %(items)s, %(bytes)s, %(error)s, %(ts)s, %(ts)s,
+                    %(metrics)s, %(metrics)s, %(metrics)s)
+            ON CONFLICT (source_name, day) DO UPDATE SET
+                payloads = r.payloads + 1,
+                items = r.items + EXCLUDED.items,
+                max_items = GREATEST(r.max_items, EXCLUDED.max_items),
+                bytes = r.bytes + EXCLUDED.bytes,
+                errors = r.errors + EXCLUDED.errors,
+                first_at = LEAST(r.first_at, EXCLUDED.first_at),
+                last_at = GREATEST(r.last_at, EXCLUDED.last_at),
+                metrics_last = r.metrics_last || EXCLUDED.metrics_last,
+                {_merge_metric("metrics_min", "LEAST")},
+                {_merge_metric("metrics_max", "GREATEST")}
+            """,
+            {
+                "source": source_name, "day": now.date(), "ts": now, "items": summary["items"],
+                "bytes": len(payload.encode("utf-8")), "error": summary["error"],
+                "metrics": Json(summary["metrics"]),
+            },
+        )
+        items = explode_items(data)
+        if items:
+            _copy_items(cur, source_name, now, items)
+        conn.commit()
+
+
+def record_raw_error(source_name: str):
+    """Count a failed fetch in its day's rollup; failures store no raw_data row."""
+    now = datetime.utcnow()
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO raw_daily_rollups AS r
+                (source_name, day, payloads, items, max_items, bytes, errors, first_at, last_at)
+            VALUES (%s, %s, 0, 0, 0, 0, 1, %s, %s)
+            ON CONFLICT (source_name, day) DO UPDATE SET
+                errors = r.errors + 1,
+                first_at = LEAST(r.first_at, EXCLUDED.first_at),
+                last_at = GREATEST(r.last_at, EXCLUDED.last_at)
             """,
-            (source_name, datetime.utcnow(), Json(data)),
+            (source_name, now.date(), now, now),
         )
         conn.commit()
 
@@ -86,6 +494,209 @@ def save_daily_report(report: dict):
             ),
         )
         conn.commit()
+    for hook in report_saved_hooks:
+        hook()
+
+
+# Cross-process coordination (coordination.py)
+def notify(channel: str, payload: str):
+    """NOTIFY `channel`; delivered to every listening connection once the transaction commits."""
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT pg_notify(%s, %s)", (channel, payload))
+        conn.commit()
+
+
+async def listen(conn, channel: str):
+    """Subscribe an async connection to `channel`; read messages with conn.notifies()."""
+    await conn.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+
+
+async def try_advisory_lock(conn, key: int) -> bool:
+    """Session-level advisory lock, held until released or the connection closes."""
+    cur = await conn.execute("SELECT pg_try_advisory_lock(%s) AS locked", (key,))
+    return bool((await cur.fetchone())["locked"])
+
+
+def get_alert_states() -> dict:
+    """Returns {rule_name: row} for every rule with stored debounce/cooldown state."""
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT * FROM alert_state")
+        return {row["rule_name"]: row for row in cur.fetchall()}
+
+
+_UPSERT_ALERT_STATE = """
+    INSERT INTO alert_state (rule_name, pending_since, last_fired_at, last_value, updated_at)
+    VALUES (%s, %s, %s, %s, %s)
+    ON CONFLICT (rule_name) DO UPDATE SET
+        pending_since = EXCLUDED.pending_since,
+        last_fired_at = EXCLUDED.last_fired_at,
+        last_value = EXCLUDED.last_value,
+        updated_at = EXCLUDED.updated_at
+"""
+
+# Serializes alert evaluation across workers and instances (transaction-level advisory lock)
+ALERT_LOCK_KEY = 4_210_002
+
+
+def save_alert_state(rule_name: str, pending_since, last_fired_at, last_value):
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute(_UPSERT_ALERT_STATE, (rule_name, pending_since, last_fired_at, last_value, datetime.utcnow()))
+        conn.commit()
+
+
+def update_alert_states(rule_names: list, update, last_value):
+    """
+    Read-modify-write of alert_state for `rule_names` while holding ALERT_LOCK_KEY, so
+    concurrent processes see each other's debounce/cooldown and an alert fires once.
+    `update(states)` gets {rule_name: {"pending_since", "last_fired_at"}} (every name
+    present), mutates it and returns (changed rule names, result); returns the result.
+    """
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (ALERT_LOCK_KEY,))
+        cur.execute(
+            "SELECT rule_name, pending_since, last_fired_at FROM alert_state WHERE rule_name = ANY(%s)",
+            (list(rule_names),),
+        )
+        stored = {row["rule_name"]: row for row in cur.fetchall()}
+        states = {
+            name: {"pending_since": (stored.get(name) or {}).get("pending_since"),
+                   "last_fired_at": (stored.get(name) or {}).get("last_fired_at")}
+            for name in rule_names
+        }
+        changed, result = update(states)
+        now = datetime.utcnow()
+        for name in changed:
+            cur.execute(_UPSERT_ALERT_STATE,
+                        (name, states[name]["pending_since"], states[name]["last_fired_at"], last_value, now))
+        conn.commit()
+    return result
+
+
+# Token buckets in one row per provider; the upsert's row lock serializes processes.
+# Time is the database clock, so hosts with skewed clocks share one refill.
+_BUCKET_SQL = """
+    INSERT INTO provider_buckets AS b (provider, tokens, updated_at)
+    VALUES (%(provider)s, {initial}, clock_timestamp())
+    ON CONFLICT (provider) DO UPDATE SET
+        tokens = {tokens},
+        updated_at = EXCLUDED.updated_at
+    RETURNING b.tokens
+"""
+_REFILLED = "LEAST(%(capacity)s, b.tokens + EXTRACT(EPOCH FROM EXCLUDED.updated_at - b.updated_at) * %(fill_rate)s)"
+
+
+def _bucket_update(initial_sql: str, tokens_sql: str, params: dict) -> float:
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute(_BUCKET_SQL.format(initial=initial_sql, tokens=tokens_sql), params)
+        tokens = cur.fetchone()["tokens"]
+        conn.commit()
+    return tokens
+
+
+def reserve_provider_token(provider: str, fill_rate: float, capacity: float) -> float:
+    """Take one token from the shared bucket; returns the tokens left (negative = queued)."""
+    return _bucket_update("%(capacity)s - 1", f"{_REFILLED} - 1",
+                          {"provider": provider, "fill_rate": fill_rate, "capacity": capacity})
+
+
+def penalize_provider(provider: str, fill_rate: float, capacity: float, retry_after: float) -> float:
+    """Hold the shared bucket for `retry_after` seconds (provider answered 429)."""
+    return _bucket_update("-%(retry_after)s * %(fill_rate)s",
+                          f"LEAST({_REFILLED}, -%(retry_after)s * %(fill_rate)s)",
+                          {"provider": provider, "fill_rate": fill_rate, "capacity": capacity,
+                           "retry_after": retry_after})
+
+
+def save_alert_event(rule_name: str, fired_at, value, message: str):
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO alert_events (rule_name, fired_at, value, message) VALUES (%s, %s, %s, %s)",
+            (rule_name, fired_at, value, message),
+        )
+        conn.commit()
+
+
+def save_alert_sample(metric: str, ts, value: float, keep_seconds: float):
+    """Record a metric value for windowed rules and drop that metric's samples older than `keep_seconds`."""
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("INSERT INTO alert_samples (metric, ts, value) VALUES (%s, %s, %s)", (metric, ts, value))
+        cur.execute("DELETE FROM alert_samples WHERE metric = %s AND ts < %s",
+                    (metric, ts - timedelta(seconds=keep_seconds)))
+        conn.commit()
+
+
+def get_alert_samples(metric: str, since) -> list:
+    """(ts, value) samples of `metric` since `since`, oldest first."""
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT ts, value FROM alert_samples WHERE metric = %s AND ts >= %s ORDER BY ts", (metric, since))
+        return [(row["ts"], row["value"]) for row in cur.fetchall()]
+
+
+def save_llm_call(call: dict):
+    """
+    call: purpose, backend, attempt, prompt_bytes, prompt_tokens,
+    prompt_sources ({key: {"bytes", "tokens"}}), output_tokens, latency_ms,
+    outcome, cache_hit, error.
+    """
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO llm_calls (called_at, purpose, backend, attempt, prompt_bytes, prompt_tokens,
+                                   prompt_sources, output_tokens, latency_ms, outcome, cache_hit, error)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            (
+                datetime.utcnow(), call["purpose"], call["backend"], call["attempt"],
+                call["prompt_bytes"], call["prompt_tokens"], Json(call.get("prompt_sources") or {}),
+                call.get("output_tokens"), call.get("latency_ms"), call["outcome"],
+                bool(call.get("cache_hit")), call.get("error"),
+            ),
+        )
+        conn.commit()
+
+
+def get_llm_call_stats(since) -> dict:
+    """Aggregates of llm_calls since `since`: per purpose/outcome, per attempt and per prompt source."""
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT purpose, outcome, COUNT(*) AS calls,
+                   SUM(CASE WHEN cache_hit THEN 1 ELSE 0 END) AS cache_hits,
+                   ROUND(AVG(latency_ms)::numeric, 1) AS avg_latency_ms,
+                   ROUND((PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY latency_ms))::numeric, 1) AS p95_latency_ms,
+                   ROUND(AVG(prompt_tokens)::numeric) AS avg_prompt_tokens,
+                   ROUND(AVG(output_tokens)::numeric) AS avg_output_tokens
+            FROM llm_calls WHERE called_at >= %s
+            GROUP BY purpose, outcome ORDER BY purpose, outcome
+            """,
+            (since,),
+        )
+        by_outcome = cur.fetchall()
+        cur.execute(
+            """
+            SELECT attempt, COUNT(*) AS calls,
+                   ROUND(AVG(latency_ms)::numeric, 1) AS avg_latency_ms,
+                   ROUND((PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY latency_ms))::numeric, 1) AS p95_latency_ms
+            FROM llm_calls WHERE called_at >= %s AND NOT cache_hit
+            GROUP BY attempt ORDER BY attempt
+            """,
+            (since,),
+        )
+        by_attempt = cur.fetchall()
+        cur.execute(
+            """
+            SELECT s.key AS source, COUNT(*) AS calls,
+                   ROUND(AVG((s.value->>'bytes')::numeric)) AS avg_bytes,
+                   ROUND(AVG((s.value->>'tokens')::numeric)) AS avg_tokens,
+                   MAX((s.value->>'bytes')::int) AS max_bytes
+            FROM llm_calls, jsonb_each(prompt_sources) AS s
+            WHERE called_at >= %s AND NOT cache_hit
+            GROUP BY s.key ORDER BY avg_bytes DESC
+            """,
+            (since,),
+        )
+        by_source = cur.fetchall()
+    return {"by_outcome": by_outcome, "by_attempt": by_attempt, "by_source": by_source}
 
 
 def get_latest_report():
@@ -99,13 +710,227 @@ def get_latest_report():
         return row or None
 
 
+def get_raw_payloads_for_day(day) -> dict:
+    """
+    Returns {source_name: payload} for a past UTC day, keeping the latest payload
+    per source across raw_data and raw_snapshots (the latter only if it exists).
+    """
+    queries = [
+        """
+        SELECT DISTINCT ON (source_name) source_name AS source, timestamp AS ts, payload_json AS payload
+        FROM raw_data
+        WHERE timestamp >= %s AND timestamp < %s
+        ORDER BY source_name, timestamp DESC
+        """,
+        """
+        SELECT DISTINCT ON (source) source, created_at AS ts, payload
+        FROM raw_snapshots
+        WHERE created_at >= %s AND created_at < %s
+        ORDER BY source, created_at DESC
+        """,
+    ]
+    start = datetime.combine(day, datetime.min.time())
+    end = start + timedelta(days=1)
+
+    latest = {}
+    for sql in queries:
+        try:
+            with get_db_connection() as conn, conn.cursor() as cur:
+                cur.execute(sql, (start, end))
+                rows = cur.fetchall()
+        except psycopg.errors.UndefinedTable:
+            continue
+        for row in rows:
+            current = latest.get(row["source"])
+            if current is None or row["ts"] > current["ts"]:
+                latest[row["source"]] = row
+    return {name: row["payload"] for name, row in latest.items()}
+
+
+# Raw payload tables and their (source, timestamp, payload) columns
+RAW_TABLES = {
+    "raw_data": ("source_name", "timestamp", "payload_json"),
+    "raw_snapshots": ("source", "created_at", "payload"),
+}
+
+
+def iter_raw_batches_before(table: str, cutoff, max_rows: int, max_bytes: int):
+    """
+    Batches of a raw table's rows stored before `cutoff`, oldest id first, as dicts
+    with id, source_name, timestamp and payload (JSON text, not parsed). Rows are
+    read through a server-side cursor; a batch ends at `max_rows` rows or once its
+    payloads reach `max_bytes`, so only one batch is held in memory. Rows of a
+    yielded batch may be deleted before the next one is requested.
+    """
+    source_col, ts_col, payload_col = RAW_TABLES[table]
+    with get_db_connection() as conn, conn.cursor(name=f"{table}_archive") as cur:
+        cur.itersize = 50
+        cur.execute(
+            f"""
+            SELECT id, {source_col} AS source_name, {ts_col} AS timestamp, {payload_col}::text AS payload
+            FROM {table}
+            WHERE {ts_col} < %s
+            ORDER BY id
+            """,
+            (cutoff,),
+        )
+        batch, size = [], 0
+        for row in cur:
+            batch.append(row)
+            size += len(row["payload"] or "")
+            if len(batch) >= max_rows or size >= max_bytes:
+                yield batch
+                batch, size = [], 0
+        if batch:
+            yield batch
+
+
+def delete_raw_rows(table: str, ids: list) -> int:
+    if table not in RAW_TABLES:
+        raise ValueError(f"Unknown raw table {table}")
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute(f"DELETE FROM {table} WHERE id = ANY(%s)", (list(ids),))
+        conn.commit()
+        return cur.rowcount
+
+
+def get_latest_raw_payloads(source_names=None) -> dict:
+    """
+    Returns {source_name: {"timestamp": ..., "payload": ...}} with the newest
+    raw_data row per source, optionally restricted to `source_names`.
+    """
+    sql = """
+        SELECT DISTINCT ON (source_name) source_name, timestamp, payload_json
+        FROM raw_data
+        {where}
+        ORDER BY source_name, timestamp DESC
+    """
+    with get_db_connection() as conn, conn.cursor() as cur:
+        if source_names:
+            cur.execute(sql.format(where="WHERE source_name = ANY(%s)"), (list(source_names),))
+        else:
+            cur.execute(sql.format(where=""))
+        return {
+            row["source_name"]: {"timestamp": row["timestamp"], "payload": row["payload_json"]}
+            for row in cur.fetchall()
+        }
+
+
+def get_event_items(fetched_since, published_since) -> list:
+    """
+    Hazard event items (raw_items rows with coordinates) stored after `fetched_since`
+    and published after `published_since`, as (fetched_at, item dict), oldest first.
+    """
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT fetched_at, item
+            FROM raw_items
+            WHERE fetched_at > %s
+              AND COALESCE(published_at, fetched_at) >= %s
+              AND item ? 'lat' AND item ? 'lon'
+            ORDER BY fetched_at
+            """,
+            (fetched_since, published_since),
+        )
+        return [(row["fetched_at"], row["item"]) for row in cur.fetchall()]
+
+
+def get_raw_daily_rollups(source_names=None, start=None, end=None, limit: int = 1000) -> list:
+    """raw_daily_rollups rows between optional dates, newest day first, optionally for some sources."""
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT source_name, day, payloads, items, max_items, bytes, errors,
+                   first_at, last_at, metrics_last, metrics_min, metrics_max
+            FROM raw_daily_rollups
+            WHERE (%(sources)s::text[] IS NULL OR source_name = ANY(%(sources)s))
+              AND (%(start)s::date IS NULL OR day >= %(start)s)
+              AND (%(end)s::date IS NULL OR day <= %(end)s)
+            ORDER BY day DESC, source_name
+            LIMIT %(limit)s
+            """,
+            {"sources": list(source_names) if source_names else None, "start": start, "end": end, "limit": limit},
+        )
+        return cur.fetchall()
+
+
+def search_raw_items(query: str, source_names=None, start=None, end=None, limit: int = 20, offset: int = 0):
+    """
+    Full-text search over raw_items (websearch syntax: "bank run" -crypto OR ...).
+    Returns (total matches, page of rows ranked by ts_rank_cd, newest first on ties).
+    start/end are inclusive dates on published_at (fetched_at when unknown).
+    """
+    where = """
+        FROM raw_items, websearch_to_tsquery('english', %(query)s) AS q
+        WHERE search @@ q
+          AND (%(sources)s::text[] IS NULL OR source_name = ANY(%(sources)s))
+          AND (%(start)s::date IS NULL OR COALESCE(published_at, fetched_at) >= %(start)s::date)
+          AND (%(end)s::date IS NULL OR COALESCE(published_at, fetched_at) < %(end)s::date + 1)
+    """
+    params = {
+        "query": query, "sources": list(source_names) if source_names else None,
+        "start": start, "end": end, "limit": limit, "offset": offset,
+    }
+    with get_db_connection() as conn, conn.cursor() as cur:
+        # Counted over all matches, so pages past the last one still report the total
+        cur.execute(f"SELECT COUNT(*) AS total {where}", params)
+        total = cur.fetchone()["total"]
+        cur.execute(
+            f"""
+            WITH matches AS (
+                SELECT id, source_name, fetched_at, published_at, title, url, body,
+                       COALESCE(published_at, fetched_at) AS ts,
+                       ts_rank_cd(search, q) AS rank
+                {where}
+                ORDER BY rank DESC, ts DESC, id DESC
+                LIMIT %(limit)s OFFSET %(offset)s
+            )
+            SELECT id, source_name, fetched_at, published_at, title, url,
+                   ROUND(rank::numeric, 4) AS rank,
+                   ts_headline('english', COALESCE(NULLIF(body, ''), title, ''),
+                               websearch_to_tsquery('english', %(query)s),
+                               'MaxWords=35, MinWords=15') AS snippet
+            FROM matches
+            ORDER BY rank DESC, ts DESC, id DESC
+            """,
+            params,
+        )
+        rows = cur.fetchall()
+    return total, rows
+
+
+def get_report_history(start=None, end=None, limit: int = 1000) -> list:
+    """
+    Full daily_reports rows (as dicts) between optional dates, oldest first.
+    With more rows than `limit`, the newest `limit` are returned.
+    """
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT * FROM (
+                SELECT report_date, score, drivers_json, narrative, created_at
+                FROM daily_reports
+                WHERE (%(start)s::date IS NULL OR report_date >= %(start)s)
+                  AND (%(end)s::date IS NULL OR report_date <= %(end)s)
+                ORDER BY report_date DESC, created_at DESC
+                LIMIT %(limit)s
+            ) AS newest
+            ORDER BY report_date ASC, created_at ASC
+            """,
+            {"start": start, "end": end, "limit": limit},
+        )
+        return cur.fetchall()
+
+
 def get_historical_reports():
     """
     Returns (report_date, score) over time.
     If your downstream code expects tuples, use a plain cursor (no dict_row) here.
     """
     with get_db_connection() as conn, conn.cursor(row_factory=None) as cur:
-        cur.execute("SELECT report_date, score FROM daily_reports ORDER BY report_date ASC")
+        # created_at breaks ties, so the last row of a day is its latest report
+        cur.execute("SELECT report_date, score FROM daily_reports ORDER BY report_date ASC, created_at ASC")
         return cur.fetchall()  # list of tuples
 
 
@@ -0,0 +1,211 @@
+# export_store.py
+"""
+Versioned, atomic writes under exports/.
+
+Every export (debug output, reports, raw fetches) is written as a new version
+
+    exports/history/<stem>/<YYYYMMDDTHHMMSSffffffZ>-<sha256[:12]><ext>
+
+and then copied to the fixed name (exports/latest_report.json, ...) that
+readers already use. Both files are written to a temp file in the target
+directory and renamed into place, so a reader never sees half a file and
+concurrent runs never interleave writes. Content identical to a name's newest
+version is not stored again.
+
+exports/index.json lists each name's versions (file, sha256, bytes,
+created_at). It is updated under a lock (threads and, where fcntl exists,
+processes), and old versions are rotated out by age and by total size:
+
+    EXPORT_DIR=exports
+    EXPORT_MAX_AGE_DAYS=14
+    EXPORT_MAX_VERSIONS=50        per name
+    EXPORT_MAX_BYTES=52428800     all history (the newest version of each name is always kept)
+
+Coroutines use write_async (thread pool) or write_background (fire and
+forget); write is the blocking call for threads and scripts.
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+logger = logging.getLogger("export_store")
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+MAX_AGE_DAYS = float(os.getenv("EXPORT_MAX_AGE_DAYS", "14"))
+MAX_VERSIONS = int(os.getenv("EXPORT_MAX_VERSIONS", "50"))
+MAX_BYTES = int(os.getenv("EXPORT_MAX_BYTES", str(50 * 1024 * 1024)))
+
+Content = Union[str, bytes, dict, list]
+
+
+def _encode(content: Content) -> bytes:
+    if isinstance(content, bytes):
+        return content
+    if isinstance(content, str):
+        return content.encode("utf-8")
+    return json.dumps(content, ensure_ascii=False, indent=2, default=str).encode("utf-8")
+
+
+def atomic_write(path: str, payload: bytes):
+    """Write to a unique temp file next to `path`, then rename it over `path`."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class ExportStore:
+    def __init__(self, root: str = EXPORT_DIR, max_age_days: float = MAX_AGE_DAYS,
+                 max_versions: int = MAX_VERSIONS, max_bytes: int = MAX_BYTES):
+        self.root = root
+        self.index_path = os.path.join(root, "index.json")
+        self.max_age_seconds = max_age_days * 86400
+        self.max_versions = max_versions
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="export")
+        self._pending: set = set()
+
+    # ---------- index ----------
+    def _load_index(self) -> dict:
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("exports", {})
+        except Exception as e:
+            logger.warning(f"⚠️ Rebuilding unreadable export index {self.index_path}: {e}")
+            return {}
+
+    def _save_index(self, exports: dict):
+        index = {"updated_at": datetime.utcnow().isoformat(), "exports": exports}
+        atomic_write(self.index_path, _encode(index))
+
+    @contextmanager
+    def _locked(self):
+        """Hold the thread lock and, where fcntl exists, an flock shared with other processes."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(self.root, exist_ok=True)
+            with open(self.index_path + ".lock", "a") as handle:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    # ---------- writes ----------
+    def write(self, name: str, content: Content) -> dict:
+        """Store a new version of `name` and update exports/<name>. Returns its index entry."""
+        payload = _encode(content)
+        digest = hashlib.sha256(payload).hexdigest()
+        stem, ext = os.path.splitext(name)
+        now = time.time()
+
+        with self._locked():
+            exports = self._load_index()
+            versions = exports.setdefault(name, [])
+            if versions and versions[-1]["sha256"] == digest \
+                    and os.path.exists(os.path.join(self.root, versions[-1]["file"])):
+                entry = versions[-1]
+            else:
+                stamp = datetime.utcfromtimestamp(now).strftime("%Y%m%dT%H%M%S%fZ")
+                relative = os.path.join("history", stem, f"{stamp}-{digest[:12]}{ext}")
+                atomic_write(os.path.join(self.root, relative), payload)
+                entry = {"file": relative, "sha256": digest, "bytes": len(payload), "created_at": now}
+                versions.append(entry)
+                self._rotate(exports, now)
+            atomic_write(os.path.join(self.root, name), payload)
+            self._save_index(exports)
+        return entry
+
+    async def write_async(self, name: str, content: Content) -> dict:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.write, name, content)
+
+    def _write_logged(self, name: str, content: Content):
+        try:
+            self.write(name, content)
+            logger.info(f"Saved export {self.root}/{name}")
+        except Exception:
+            logger.exception(f"Failed to write export {name}")
+
+    def write_background(self, name: str, content: Content):
+        """Queue a write without waiting for it; errors are logged. Blocks only when no loop is running."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write_logged(name, content)
+            return
+        future = loop.run_in_executor(self._executor, self._write_logged, name, content)
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+
+    # ---------- rotation ----------
+    def _remove(self, entry: dict):
+        try:
+            os.remove(os.path.join(self.root, entry["file"]))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"⚠️ Could not remove old export {entry['file']}: {e}")
+
+    def _rotate(self, exports: dict, now: float):
+        """Drop versions past the age or per-name count limit, then the oldest until under max_bytes."""
+        for name, versions in exports.items():
+            # The newest version of each name is always kept
+            keep = [v for v in versions[:-1] if now - v["created_at"] <= self.max_age_seconds]
+            keep = keep[max(0, len(keep) - (self.max_versions - 1)):] + versions[-1:]
+            for v in versions:
+                if v not in keep:
+                    self._remove(v)
+            exports[name] = keep
+
+        total = sum(v["bytes"] for versions in exports.values() for v in versions)
+        if total <= self.max_bytes:
+            return
+        candidates = sorted(
+            ((v["created_at"], name, v) for name, versions in exports.items() for v in versions[:-1]),
+            key=lambda item: item[0],
+        )
+        for _, name, v in candidates:
+            if total <= self.max_bytes:
+                break
+            self._remove(v)
+            exports[name].remove(v)
+            total -= v["bytes"]
+
+    # ---------- reads ----------
+    def versions(self, name: Optional[str] = None) -> dict:
+        """Index entries, for one name or all of them."""
+        with self._locked():
+            exports = self._load_index()
+        return {name: exports.get(name, [])} if name else exports
+
+
+export_store = ExportStore()
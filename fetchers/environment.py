@@ -1,8 +1,10 @@
 import os, aiohttp
+from rate_limiter import get_scheduler
 NASA_API_KEY = os.getenv("NASA_API_KEY")
 
 async def fetch_environment():
     try:
+        await get_scheduler().acquire("nasa")
         async with aiohttp.ClientSession() as session:
             url = f"https://api.nasa.gov/planetary/apod?api_key={NASA_API_KEY}"
             async with session.get(url, timeout=25) as resp:
@@ -1,34 +1,19 @@
 # fetchers/finance.py
-import os
-import aiohttp
-
-ALPHA_VANTAGE_API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY")
+import market_data
 
 async def fetch_financial_markets():
     """
     Return dict like:
     {
       "sp500_change": "+0.4%",
-      "nasdaq_volatility": "low"|"medium"|"high"
+      "nasdaq_volatility": "low"|"medium"|"high",
+      "symbols": {"SPY": {...}, "QQQ": {...}}
     }
+    Computed from locally cached daily series (see market_data.py), which only
+    call Alpha Vantage for days the cache is missing.
     """
     try:
-        # Example: call any finance API you use; this is a safe template
-        async with aiohttp.ClientSession() as session:
-            # Replace with your real endpoint(s)
-            url = f"https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol=SPY&apikey={ALPHA_VANTAGE_API_KEY}"
-            async with session.get(url, timeout=25) as resp:
-                if resp.status != 200:
-                    return {}
-
-                data = await resp.json()
-                # Map from vendor fields -> your normalized fields
-                # (Use a real calculation here)
-                change = data.get("Global Quote", {}).get("10. change percent", "")
-                return {
-                    "sp500_change": change or "",
-                    "nasdaq_volatility": "medium"  # stub: replace with real signal
-                }
+        return await market_data.market_signals()
     except Exception as e:
         print(f"Error fetching financial markets: {e}")
         return {}
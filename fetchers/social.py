@@ -0,0 +1,16 @@
+# fetchers/social.py
+import aiohttp
+
+async def fetch_social():
+    try:
+        async with aiohttp.ClientSession() as session:
+            # your social source
+            async with session.get("https://example.social/api", timeout=25) as resp:
+                if resp.status != 200:
+                    return {}
+                data = await resp.json()
+                posts = data.get("posts", [])
+                return {"social_media_posts": posts[:100]}
+    except Exception as e:
+        print(f"Error fetching social data: {e}")
+        return {}
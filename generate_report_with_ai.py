@@ -9,7 +9,8 @@ from data_fetcher import fetch_all_sources
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import smtplib
-import google.generativeai as genai
+from ai_analysis import generate_json
+from export_store import export_store
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -20,34 +21,6 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger("ai_analysis")
 
-# -------------------------
-# Configure Gemini/Generative Model
-# -------------------------
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
-
-generation_config = {
-    "temperature": 0.5,
-    "max_output_tokens": 1000,
-}
-
-safety_settings = [
-    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
-    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
-    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
-]
-
-try:
-    model = genai.GenerativeModel(
-        model_name=MODEL_NAME,
-        generation_config=generation_config,
-        safety_settings=safety_settings,
-    )
-except Exception:
-    model = None
-    logger.warning("Could not initialize AI model; will use fallback.")
-
 # -------------------------
 # Deterministic Fallback
 # -------------------------
@@ -140,21 +113,10 @@ Instructions:
 - Output valid JSON only.
 """
 
-    ai_error = None
-    report_data = None
-
-    if model:
-        try:
-            response = await model.generate_content_async(prompt)
-            raw_output = getattr(response, "text", None) or str(response)
-            # extract JSON part
-            start = raw_output.find("{")
-            end = raw_output.rfind("}") + 1
-            json_part = raw_output[start:end] if start != -1 and end != -1 else "{}"
-            report_data = json.loads(json_part)
-        except Exception as e:
-            ai_error = f"AI generation failed: {e}"
-            logger.warning(ai_error)
+    # Same retry, debug-output and llm_calls profiling path as the pipeline's analysis
+    report_data, ai_error = await generate_json(
+        prompt, "risk_score", sources={str(d.get("source")): d for d in all_data},
+    )
 
     # Fallback if AI fails
     if not report_data or not isinstance(report_data, dict):
@@ -170,15 +132,14 @@ Instructions:
         "narrative_summary": report_data.get("narrative_summary"),
         "timestamp": timestamp,
         "ai_error": ai_error,
+        "missing_sources": {d["source"]: d["error"] for d in all_data if d.get("error")},
     }
 
     sent_to = send_report_via_email(final_report, recipient_override)
     final_report["sent_to"] = sent_to
 
-    # Save report locally
-    os.makedirs("exports", exist_ok=True)
-    with open(os.path.join("exports", "latest_report.json"), "w", encoding="utf-8") as f:
-        json.dump(final_report, f, ensure_ascii=False, indent=2)
+    # Save report locally (versioned, written off the event loop)
+    await export_store.write_async("latest_report.json", final_report)
 
     return final_report
 
@@ -0,0 +1,107 @@
+# geo_stream.py
+"""
+Streaming extraction of hazard events from GeoJSON-style feeds.
+
+USGS (features[]) and NASA EONET (events[]) responses are walked item by item
+with ijson, so only one raw feature is in memory at a time. Each one is cut down
+to a compact record:
+
+    {"id", "title", "category", "magnitude", "time", "lon", "lat"}
+
+and dropped if it is below `min_magnitude`. Events without a magnitude
+(most EONET categories) are always kept. When ijson is not installed the
+response is parsed in full and run through the same compaction.
+"""
+import logging
+from datetime import datetime
+from typing import Optional
+
+import requests
+
+from providers import lazy_import
+
+logger = logging.getLogger("geo_stream")
+
+
+def _ijson():
+    try:
+        return lazy_import("ijson")
+    except ImportError:
+        return None
+
+
+def _coordinates(geometry: Optional[dict]):
+    """(lon, lat) of a Point geometry, else (None, None)."""
+    coords = (geometry or {}).get("coordinates") or []
+    if (geometry or {}).get("type") == "Point" and len(coords) >= 2:
+        return float(coords[0]), float(coords[1])
+    return None, None
+
+
+def compact_usgs_feature(feature: dict) -> dict:
+    props = feature.get("properties") or {}
+    lon, lat = _coordinates(feature.get("geometry"))
+    millis = props.get("time")
+    return {
+        "id": feature.get("id"),
+        "title": props.get("title") or props.get("place"),
+        "category": props.get("type", "earthquake"),
+        "magnitude": float(props["mag"]) if props.get("mag") is not None else None,
+        "time": datetime.utcfromtimestamp(millis / 1000).isoformat() if millis else None,
+        "lon": lon,
+        "lat": lat,
+    }
+
+
+def compact_eonet_event(event: dict) -> dict:
+    categories = event.get("categories") or [{}]
+    # The latest geometry is the event's current position
+    geometry = (event.get("geometries") or event.get("geometry") or [{}])[-1]
+    lon, lat = _coordinates(geometry)
+    magnitude = geometry.get("magnitudeValue")
+    return {
+        "id": event.get("id"),
+        "title": event.get("title"),
+        "category": categories[0].get("title") or categories[0].get("id"),
+        "magnitude": float(magnitude) if magnitude is not None else None,
+        "time": geometry.get("date"),
+        "lon": lon,
+        "lat": lat,
+    }
+
+
+def keep_event(record: dict, min_magnitude: Optional[float] = None) -> bool:
+    if min_magnitude is None or record.get("magnitude") is None:
+        return True
+    return record["magnitude"] >= float(min_magnitude)
+
+
+def stream_usgs_events(url: str, min_magnitude: Optional[float] = None, timeout: float = 10) -> list:
+    """Compact USGS features from a GeoJSON summary feed, filtered by magnitude."""
+    with requests.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        ijson = _ijson()
+        if ijson is None:
+            features = response.json().get("features", [])
+        else:
+            response.raw.decode_content = True
+            features = ijson.items(response.raw, "features.item", use_float=True)
+        records = (compact_usgs_feature(feature) for feature in features)
+        return [record for record in records if keep_event(record, min_magnitude)]
+
+
+async def read_eonet_events(resp, min_magnitude: Optional[float] = None) -> list:
+    """Compact EONET events from an open aiohttp response, filtered by magnitude."""
+    ijson = _ijson()
+    records = []
+    if ijson is None:
+        for event in (await resp.json(content_type=None)).get("events", []):
+            record = compact_eonet_event(event)
+            if keep_event(record, min_magnitude):
+                records.append(record)
+        return records
+    async for event in ijson.items(resp.content, "events.item", use_float=True):
+        record = compact_eonet_event(event)
+        if keep_event(record, min_magnitude):
+            records.append(record)
+    return records
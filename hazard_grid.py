@@ -0,0 +1,159 @@
+# hazard_grid.py
+"""
+Spatial index of hazard events.
+
+Compact event records (geo_stream: lat, lon, time, magnitude) are binned into
+fixed lat/lon cells and time buckets held in NumPy arrays:
+
+    counts[slot, lat_cell, lon_cell]        events per cell and bucket
+    max_severity[slot, lat_cell, lon_cell]  largest magnitude seen there
+
+Slots form a ring over the last `window_buckets` buckets, so adding events is
+incremental and old buckets are recycled in place. Region and hotspot queries
+reduce over the buckets inside the requested window, counted back from the wall
+clock (or an explicit `now`), so a feed outage ages hotspots out instead of
+freezing them.
+
+Each process fills its grid from its own fetches and from the event items other
+processes stored (data_sources.fold_stored_events, at startup and on every
+source_updated broadcast).
+"""
+import math
+import time
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+
+CELL_DEGREES = 5.0
+BUCKET_HOURS = 6
+WINDOW_BUCKETS = 28  # 7 days of 6h buckets
+
+# A cell is a hotspot when it has this many events in the window, or one this severe
+HOTSPOT_MIN_EVENTS = 5
+HOTSPOT_MIN_SEVERITY = 6.0
+
+
+def _epoch(value) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    # Naive timestamps in this repo are UTC (utcnow().isoformat()), not host-local time
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class HazardGrid:
+    def __init__(self, cell_degrees: float = CELL_DEGREES, bucket_hours: int = BUCKET_HOURS,
+                 window_buckets: int = WINDOW_BUCKETS):
+        self.cell_degrees = cell_degrees
+        self.bucket_seconds = bucket_hours * 3600
+        self.window_buckets = window_buckets
+        self.n_lat = math.ceil(180 / cell_degrees)
+        self.n_lon = math.ceil(360 / cell_degrees)
+        shape = (window_buckets, self.n_lat, self.n_lon)
+        self.counts = np.zeros(shape, dtype=np.int32)
+        self.max_severity = np.zeros(shape, dtype=np.float32)
+        self.slot_bucket = np.full(window_buckets, -1, dtype=np.int64)  # bucket number held by each slot
+        self.head = -1  # newest bucket number seen
+        self._seen: dict = {}  # event id -> bucket, so re-fetched events are not counted twice
+        self._lock = threading.Lock()
+
+    def _cells(self, lat: np.ndarray, lon: np.ndarray):
+        lat_i = np.clip(((lat + 90) // self.cell_degrees).astype(np.int64), 0, self.n_lat - 1)
+        lon_i = np.clip(((lon + 180) // self.cell_degrees).astype(np.int64), 0, self.n_lon - 1)
+        return lat_i, lon_i
+
+    def add(self, events: list, now: Optional[float] = None) -> int:
+        """Bin new events; ones without coordinates or already seen are skipped. Returns how many were added."""
+        default_ts = now or time.time()
+        rows = []
+        with self._lock:
+            for event in events or []:
+                if not isinstance(event, dict) or event.get("lat") is None or event.get("lon") is None:
+                    continue
+                ts = _epoch(event.get("time")) or default_ts
+                bucket = int(ts // self.bucket_seconds)
+                key = event.get("id")
+                if key is not None:
+                    if key in self._seen:
+                        continue
+                    self._seen[key] = bucket
+                rows.append((event["lat"], event["lon"], bucket, event.get("magnitude") or 0.0))
+            if not rows:
+                return 0
+
+            lat, lon, buckets, severity = (np.asarray(col) for col in zip(*rows))
+            self.head = max(self.head, int(buckets.max()), int(default_ts // self.bucket_seconds))
+            keep = buckets > self.head - self.window_buckets
+            lat, lon, buckets, severity = lat[keep], lon[keep], buckets[keep], severity[keep]
+
+            slots = buckets % self.window_buckets
+            for bucket in np.unique(buckets):
+                slot = bucket % self.window_buckets
+                if self.slot_bucket[slot] != bucket:
+                    # The slot still holds a bucket that fell out of the window
+                    self.counts[slot] = 0
+                    self.max_severity[slot] = 0
+                    self.slot_bucket[slot] = bucket
+
+            lat_i, lon_i = self._cells(lat.astype(np.float64), lon.astype(np.float64))
+            np.add.at(self.counts, (slots, lat_i, lon_i), 1)
+            np.maximum.at(self.max_severity, (slots, lat_i, lon_i), severity.astype(np.float32))
+
+            oldest = self.head - self.window_buckets
+            self._seen = {k: b for k, b in self._seen.items() if b > oldest}
+            return int(keep.sum())
+
+    def _window(self, hours: float, now: Optional[float] = None) -> np.ndarray:
+        """Slots whose bucket lies within `hours` before `now` (default: the wall clock)."""
+        n = max(1, math.ceil(hours * 3600 / self.bucket_seconds))
+        current = int((now or time.time()) // self.bucket_seconds)
+        return (self.slot_bucket >= 0) & (self.slot_bucket > current - n) & (self.slot_bucket <= current)
+
+    def cell_totals(self, hours: float = 24, now: Optional[float] = None):
+        """(counts, max_severity) per cell over the window, shape (n_lat, n_lon)."""
+        with self._lock:
+            mask = self._window(hours, now)
+            return self.counts[mask].sum(axis=0), self.max_severity[mask].max(axis=0, initial=0)
+
+    def region(self, lat_min: float, lat_max: float, lon_min: float, lon_max: float, hours: float = 24,
+               now: Optional[float] = None) -> dict:
+        """Event count and max severity inside a lat/lon box over the window."""
+        counts, severity = self.cell_totals(hours, now)
+        (la0, la1), (lo0, lo1) = self._cells(np.array([lat_min, lat_max]), np.array([lon_min, lon_max]))
+        counts, severity = counts[la0:la1 + 1, lo0:lo1 + 1], severity[la0:la1 + 1, lo0:lo1 + 1]
+        return {
+            "events": int(counts.sum()),
+            "max_severity": round(float(severity.max(initial=0)), 2),
+            "active_cells": int((counts > 0).sum()),
+            "hours": hours,
+        }
+
+    def hotspots(self, hours: float = 24, top: int = 10, min_events: int = HOTSPOT_MIN_EVENTS,
+                 min_severity: float = HOTSPOT_MIN_SEVERITY, now: Optional[float] = None) -> list:
+        """Cells over either threshold, busiest first."""
+        counts, severity = self.cell_totals(hours, now)
+        lat_i, lon_i = np.nonzero((counts >= min_events) | (severity >= min_severity))
+        order = np.lexsort((-severity[lat_i, lon_i], -counts[lat_i, lon_i]))[:top]
+        spots = []
+        for a, o in zip(lat_i[order], lon_i[order]):
+            lat0, lon0 = float(-90 + a * self.cell_degrees), float(-180 + o * self.cell_degrees)
+            spots.append({
+                "lat": lat0 + self.cell_degrees / 2,
+                "lon": lon0 + self.cell_degrees / 2,
+                "bounds": [lat0, lon0, lat0 + self.cell_degrees, lon0 + self.cell_degrees],
+                "events": int(counts[a, o]),
+                "max_severity": round(float(severity[a, o]), 2),
+            })
+        return spots
+
+
+hazard_grid = HazardGrid()
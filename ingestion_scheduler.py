@@ -0,0 +1,240 @@
+# ingestion_scheduler.py
+"""
+In-process ingestion scheduler.
+
+Runs every collector (data_sources.DATA_SOURCES) and config source
+(data_sources.json "sources") on its own cadence ("interval_seconds") and
+writes each result to raw_data, so reports can read pre-ingested payloads
+(REPORT_FROM_INGESTED=1) instead of fetching at report time.
+
+Cadences adapt to how often a source actually changes: successive payloads
+are hashed, unchanged ones stretch the interval towards max_interval_seconds
+and changed ones shrink it towards min_interval_seconds.
+
+Runs inside the API (INGESTION_SCHEDULER=1) or standalone:
+    python ingestion_scheduler.py
+Any number of processes may run it; only the holder of the advisory lock
+(coordination.py) ingests at a time.
+"""
+import json
+import asyncio
+import hashlib
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
+
+from dotenv import load_dotenv
+
+from circuit_breaker import get_breaker, ingestion_deadline
+import coordination
+from data_fetcher import fetch_source
+from data_sources import DATA_SOURCES, REPLAY_ADAPTERS, FETCH_ERROR_KEY, fold_stored_events, is_failed_result
+from db_config import record_raw_error, save_raw_data
+import live_score
+from result_cache import result_cache
+from source_config import load_collectors, load_sources
+
+load_dotenv()
+
+logger = logging.getLogger("ingestion")
+
+DEFAULT_INTERVAL_SECONDS = 900
+
+
+class AdaptiveCadence:
+    """
+    Polling interval driven by the observed change rate, kept within bounds.
+    Unchanged payloads back off by `backoff`; a change multiplies by `speedup`.
+    Without bounds configured the interval may move from half to 4x the base.
+    """
+
+    def __init__(self, interval: float, min_interval: Optional[float] = None, max_interval: Optional[float] = None,
+                 backoff: float = 1.5, speedup: float = 0.5):
+        self.interval = float(interval)
+        self.min_interval = float(min_interval or interval / 2)
+        self.max_interval = float(max_interval or interval * 4)
+        self.backoff = backoff
+        self.speedup = speedup
+        self.last_digest: Optional[str] = None
+        self.observations = 0
+        self.changes = 0
+
+    @staticmethod
+    def digest(payload) -> str:
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def observe(self, payload) -> bool:
+        """Record a successful payload and adjust the interval; returns whether it changed."""
+        digest = self.digest(payload)
+        changed = digest != self.last_digest
+        if self.last_digest is not None:
+            self.observations += 1
+            if changed:
+                self.changes += 1
+                self.interval = max(self.min_interval, self.interval * self.speedup)
+            else:
+                self.interval = min(self.max_interval, self.interval * self.backoff)
+        self.last_digest = digest
+        return changed
+
+    @property
+    def change_rate(self) -> Optional[float]:
+        return round(self.changes / self.observations, 3) if self.observations else None
+
+
+class IngestionJob:
+    """
+    One source on an adaptive cadence.
+    `run` returns (error, payload): an error string or None, and the payload to hash.
+    `source_name` is the raw_data / raw_daily_rollups name its payloads are stored under.
+    """
+
+    def __init__(self, name: str, settings: dict, run: Callable[[], Awaitable[tuple]],
+                 source_name: Optional[str] = None):
+        self.name = name
+        self.source_name = source_name or name
+        self.cadence = AdaptiveCadence(
+            settings.get("interval_seconds", DEFAULT_INTERVAL_SECONDS),
+            settings.get("min_interval_seconds"),
+            settings.get("max_interval_seconds"),
+        )
+        self.run = run
+        self.runs = 0
+        self.failures = 0
+        self.last_run: Optional[str] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def interval(self) -> float:
+        return self.cadence.interval
+
+    def status(self) -> dict:
+        return {
+            "interval_seconds": round(self.interval, 1),
+            "min_interval_seconds": self.cadence.min_interval,
+            "max_interval_seconds": self.cadence.max_interval,
+            "change_rate": self.cadence.change_rate,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_run": self.last_run,
+            "last_error": self.last_error,
+        }
+
+
+def _stored(name: str, stored_at):
+    """Tell other processes their cached result for `name` is older than this one."""
+    if stored_at is not None:
+        coordination.broadcast_background(coordination.SOURCE_UPDATED, source=name, stored_at=stored_at)
+
+
+def _collector_job(name: str, func, settings: dict) -> IngestionJob:
+    # Collectors save and broadcast their own raw payloads (data_sources.store_payload)
+    # and mark failed fetches on the result
+    async def run():
+        result = await func()
+        if is_failed_result(result):
+            return (result or {}).get(FETCH_ERROR_KEY) or "no result", result
+        live_score.observe(result)
+        result_cache.store(name, result, settings)
+        return None, result
+
+    return IngestionJob(name, settings, run, REPLAY_ADAPTERS[name][0])
+
+
+def _source_job(src: dict) -> IngestionJob:
+    async def run():
+        record = await asyncio.to_thread(fetch_source, src)
+        if record.get("error"):
+            return str(record["error"]), None
+        await asyncio.to_thread(save_raw_data, src.get("name"), record)
+        _stored(src.get("name"), result_cache.store(src.get("name"), record, src))
+        # The record timestamp changes every run; only the items tell us about change
+        return None, record.get("data")
+
+    return IngestionJob(src.get("name"), src, run)
+
+
+def build_jobs() -> list:
+    """One job per collector and per config source, with cadences from data_sources.json."""
+    collectors = load_collectors()
+    jobs = [_collector_job(name, func, collectors.get(name, {})) for name, func in DATA_SOURCES.items()]
+    jobs += [_source_job(src) for src in load_sources()]
+    return jobs
+
+
+class IngestionScheduler:
+    def __init__(self, jobs: list):
+        self.jobs = {job.name: job for job in jobs}
+        self._tasks: list = []
+
+    async def _run_once(self, job: IngestionJob):
+        breaker = get_breaker(job.name)
+        if not breaker.allow():
+            return
+        job.runs += 1
+        job.last_run = datetime.utcnow().isoformat()
+        try:
+            # A hung fetch would otherwise stop this source's loop for good
+            error, payload = await asyncio.wait_for(job.run(), ingestion_deadline())
+        except asyncio.TimeoutError:
+            error, payload = "deadline exceeded", None
+        except Exception as e:
+            error, payload = f"error: {e}", None
+        job.last_error = error
+        if error:
+            job.failures += 1
+            breaker.record_failure(error)
+            logger.warning(f"Ingestion of {job.name} failed: {error}")
+            try:
+                # Failed fetches store no payload; count them so source health shows them
+                await asyncio.to_thread(record_raw_error, job.source_name)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not record the {job.name} failure: {e}")
+        else:
+            breaker.record_success()
+            job.cadence.observe(payload)
+
+    async def _loop(self, job: IngestionJob):
+        while True:
+            await self._run_once(job)
+            await asyncio.sleep(job.interval)
+
+    def start(self):
+        """Start one loop per job on the running event loop."""
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._loop(job), name=f"ingest:{job.name}") for job in self.jobs.values()]
+        logger.info(f"Ingestion scheduler started with {len(self._tasks)} sources.")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def status(self) -> dict:
+        return {name: job.status() for name, job in self.jobs.items()}
+
+
+async def run_forever():
+    # Hotspots in scored results cover the whole window, not just events fetched since startup
+    await fold_stored_events()
+    scheduler = IngestionScheduler(build_jobs())
+    # Only the holder of the advisory lock ingests, so extra workers stand by
+    leader = coordination.start_scheduler(scheduler)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        if leader:
+            leader.cancel()
+            await asyncio.gather(leader, return_exceptions=True)
+        await scheduler.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    asyncio.run(run_forever())
@@ -0,0 +1,123 @@
+# live_score.py
+"""
+Rolling intraday risk score.
+
+Keeps the signals calculate_risk_score looks at (market volatility and change,
+disaster count and hotspots, social post volume, news sentiment) and updates them as new
+fetch results land, so each item costs O(1) and the score never needs a full
+recompute. Every signal comes from the newest result of its source, exactly as the
+daily report reads it, so both score the same inputs alike. Subscribers (the SSE
+endpoint) get every new score pushed to them.
+
+Processes that do not fetch (web workers next to the ingestion worker) rebuild
+the score from raw_data at startup and on every source_updated broadcast
+(data_sources.fold_stored_results).
+"""
+import asyncio
+from datetime import datetime
+from typing import Optional
+
+from ai_analysis import disaster_event_count, risk_score_from_signals
+import alerts
+
+SUBSCRIBER_QUEUE_SIZE = 16
+
+
+class RollingRiskScore:
+    def __init__(self):
+        self.nasdaq_volatility = None
+        self.sp500_change = ""
+        self.disaster_count = 0
+        self.hotspot_count = 0
+        # Posts in the latest social snapshot, like len(social_media_posts) in the report
+        self.post_count = 0
+        self.sentiment = None
+        self.score = risk_score_from_signals()
+        self.version = 0
+        self.updated_at: Optional[str] = None
+
+    def observe(self, result: dict) -> bool:
+        """
+        Fold one fetch result (e.g. {"social_media_posts": [...]}) into the signals.
+        Returns True if the score changed.
+        """
+        if "financial_markets" in result:
+            fm = result["financial_markets"] or {}
+            self.nasdaq_volatility = fm.get("nasdaq_volatility", self.nasdaq_volatility)
+            self.sp500_change = fm.get("sp500_change", self.sp500_change)
+        if "natural_disaster_events" in result:
+            self.disaster_count = disaster_event_count(result["natural_disaster_events"])
+        if "hazard_hotspots" in result:
+            self.hotspot_count = len(result["hazard_hotspots"] or [])
+        if "news_sentiment" in result:
+            self.sentiment = (result["news_sentiment"] or {}).get("overall_sentiment", self.sentiment)
+        if "social_media_posts" in result:
+            self.post_count = len(result["social_media_posts"] or [])
+
+        score = risk_score_from_signals(
+            nasdaq_volatility=self.nasdaq_volatility,
+            sp500_change=self.sp500_change,
+            disaster_count=self.disaster_count,
+            post_count=self.post_count,
+            sentiment=self.sentiment,
+            hotspot_count=self.hotspot_count,
+        )
+        self.updated_at = datetime.utcnow().isoformat()
+        changed = score != self.score
+        self.score = score
+        self.version += 1
+        return changed
+
+    def snapshot(self) -> dict:
+        return {
+            "risk_score": self.score,
+            "version": self.version,
+            "updated_at": self.updated_at,
+            "signals": {
+                "nasdaq_volatility": self.nasdaq_volatility,
+                "sp500_change": self.sp500_change,
+                "natural_disaster_events": self.disaster_count,
+                "hazard_hotspots": self.hotspot_count,
+                "social_posts": self.post_count,
+                "news_sentiment": self.sentiment,
+            },
+        }
+
+
+live_score = RollingRiskScore()
+_subscribers: set = set()
+
+
+def subscribe() -> asyncio.Queue:
+    queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    _subscribers.add(queue)
+    return queue
+
+
+def unsubscribe(queue: asyncio.Queue):
+    _subscribers.discard(queue)
+
+
+def publish(snapshot: dict):
+    for queue in list(_subscribers):
+        if queue.full():
+            # Slow consumer: drop its oldest update, it only needs the latest score
+            queue.get_nowait()
+        queue.put_nowait(snapshot)
+
+
+def observe(result: dict, alert: bool = True):
+    """
+    Fold a fetch result into the live score, push the new score to subscribers
+    and hand the score and raw signals to the alert rules. Results replayed from
+    another process' broadcast pass alert=False: the fetching process alerts.
+    """
+    if not isinstance(result, dict):
+        return
+    if live_score.observe(result):
+        publish(live_score.snapshot())
+    if not alert:
+        return
+    alerts.submit("risk_score", live_score.score)
+    if "natural_disaster_events" in result:
+        alerts.submit("natural_disaster_events", live_score.disaster_count)
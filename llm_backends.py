@@ -0,0 +1,231 @@
+# llm_backends.py
+"""
+Model backends for the report analysis.
+
+Every backend exposes `await generate(prompt) -> str` with a per-call timeout:
+
+    gemini   google-generativeai (providers.get_gemini_model)
+    stub     deterministic local output, no network (tests, benchmarks, offline runs)
+
+HedgedBackend wraps a primary backend: if it has not answered within the p95
+of its recent latencies, a second attempt (on LLM_HEDGE_BACKEND, or the same
+backend) is started, and whichever returns first wins; the other is cancelled.
+Each hedge attempt is profiled as its own llm_calls row (purpose "hedge").
+
+Configured from the environment:
+    LLM_BACKEND=gemini|stub        (default gemini)
+    LLM_TIMEOUT_SECONDS=30
+    LLM_HEDGE=1                    enable hedging
+    LLM_HEDGE_BACKEND=gemini|stub  backend for the hedge attempt (default: same)
+    LLM_HEDGE_AFTER_SECONDS=8      hedge delay until enough latencies are recorded
+    STUB_LLM_LATENCY_SECONDS=0     simulated stub latency
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import deque
+from typing import Optional
+
+import llm_profile
+import providers
+
+logger = logging.getLogger("llm_backends")
+
+DEFAULT_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+LATENCY_SAMPLES = 100
+MIN_HEDGE_SAMPLES = 20
+
+
+class BackendUnavailable(RuntimeError):
+    """The backend cannot be used at all (e.g. no model could be built); retrying won't help."""
+
+
+class LatencyTracker:
+    def __init__(self, samples: int = LATENCY_SAMPLES):
+        self.latencies = deque(maxlen=samples)
+
+    def record(self, seconds: float):
+        self.latencies.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def snapshot(self) -> dict:
+        p50, p95 = self.percentile(0.50), self.percentile(0.95)
+        return {
+            "samples": len(self.latencies),
+            "p50": round(p50, 3) if p50 is not None else None,
+            "p95": round(p95, 3) if p95 is not None else None,
+        }
+
+
+class LLMBackend:
+    name = "base"
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self.latency = LatencyTracker()
+
+    async def _generate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    async def generate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        """Model output text; raises asyncio.TimeoutError past the timeout."""
+        started = time.perf_counter()
+        text = await asyncio.wait_for(self._generate(prompt), timeout or self.timeout)
+        self.latency.record(time.perf_counter() - started)
+        return text
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "latency": self.latency.snapshot()}
+
+
+class GeminiBackend(LLMBackend):
+    name = "gemini"
+
+    async def _generate(self, prompt: str) -> str:
+        # Built on first call, not at import, to keep API cold start fast; built in a
+        # thread so a slow build stays inside the per-call timeout instead of blocking the loop
+        model = await asyncio.to_thread(providers.get_gemini_model)
+        if model is None:
+            raise BackendUnavailable("Generative model not initialized")
+        response = await model.generate_content_async(prompt)
+        return getattr(response, "text", None) or getattr(response, "output_text", None) or str(response)
+
+
+class StubBackend(LLMBackend):
+    """Same prompt, same answer: a valid report JSON derived from the prompt hash."""
+    name = "stub"
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT_SECONDS, latency_seconds: Optional[float] = None):
+        super().__init__(timeout)
+        self.latency_seconds = float(
+            latency_seconds if latency_seconds is not None else os.getenv("STUB_LLM_LATENCY_SECONDS", "0")
+        )
+
+    async def _generate(self, prompt: str) -> str:
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        return json.dumps({
+            "risk_score": int(digest[:8], 16) % 101,
+            "top_drivers": [f"Stub driver {i} ({digest[i * 4:i * 4 + 4]})" for i in range(1, 6)],
+            "narrative_summary": f"Stub analysis of a {len(prompt)}-character prompt.",
+            # Map-step keys (ai_analysis.summarize_group)
+            "summary": f"Stub summary ({digest[:8]}).",
+            "signals": [],
+            "concern": int(digest[8:10], 16) % 11,
+        })
+
+
+class HedgedBackend(LLMBackend):
+    def __init__(self, primary: LLMBackend, secondary: Optional[LLMBackend] = None,
+                 hedge_after: Optional[float] = None):
+        super().__init__(primary.timeout)
+        self.primary = primary
+        self.secondary = secondary or primary
+        self.default_hedge_after = float(
+            hedge_after if hedge_after is not None else os.getenv("LLM_HEDGE_AFTER_SECONDS", "8")
+        )
+        self.name = f"hedged({primary.name},{self.secondary.name})"
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def hedge_delay(self) -> float:
+        """p95 of the primary's recent latencies, once there are enough of them."""
+        if len(self.primary.latency.latencies) >= MIN_HEDGE_SAMPLES:
+            return self.primary.latency.percentile(0.95)
+        return self.default_hedge_after
+
+    async def generate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        started = time.perf_counter()
+        primary = asyncio.create_task(self.primary.generate(prompt, timeout))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay())
+            if done and primary.exception() is None:
+                self.latency.record(time.perf_counter() - started)
+                return primary.result()
+            # Slow (past p95) or already failed: start the hedge attempt
+            self.hedges += 1
+            logger.info(f"LLM call {'failed' if done else 'still running'} after "
+                        f"{time.perf_counter() - started:.1f}s, hedging on {self.secondary.name}")
+            tasks.add(asyncio.create_task(self._hedge_attempt(prompt, timeout)))
+
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        self.latency.record(time.perf_counter() - started)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _hedge_attempt(self, prompt: str, timeout: Optional[float]) -> str:
+        """The second attempt, profiled as its own llm_calls row (the caller's row covers the call as a whole)."""
+        output, outcome, error = None, "ok", None
+        started = time.perf_counter()
+        try:
+            output = await self.secondary.generate(prompt, timeout)
+            return output
+        except asyncio.CancelledError:
+            # Lost the race: its prompt was still sent
+            outcome = "cancelled"
+            raise
+        except asyncio.TimeoutError:
+            outcome, error = "timeout", "hedge attempt timed out"
+            raise
+        except Exception as exc:
+            outcome, error = "error", str(exc)
+            raise
+        finally:
+            llm_profile.record(llm_profile.build_call(
+                "hedge", self.secondary.name, 1, prompt, llm_profile.prompt_composition(prompt, None),
+                output, time.perf_counter() - started, outcome, error=error,
+            ))
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "hedge_after_seconds": round(self.hedge_delay(), 3),
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "primary": self.primary.stats(),
+            "secondary": self.secondary.stats() if self.secondary is not self.primary else None,
+        }
+
+
+BACKENDS = {"gemini": GeminiBackend, "stub": StubBackend}
+_backend: Optional[LLMBackend] = None
+
+
+def build_backend(name: str) -> LLMBackend:
+    try:
+        return BACKENDS[name.lower()]()
+    except KeyError:
+        raise ValueError(f"Unknown LLM backend {name!r}, expected one of {sorted(BACKENDS)}")
+
+
+def get_backend() -> LLMBackend:
+    """The configured backend (see module docstring), built once."""
+    global _backend
+    if _backend is None:
+        backend = build_backend(os.getenv("LLM_BACKEND", "gemini"))
+        if os.getenv("LLM_HEDGE", "0").lower() in ("1", "true", "yes"):
+            hedge_name = os.getenv("LLM_HEDGE_BACKEND")
+            secondary = build_backend(hedge_name) if hedge_name and hedge_name != backend.name else None
+            backend = HedgedBackend(backend, secondary)
+        _backend = backend
+    return _backend
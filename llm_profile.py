@@ -0,0 +1,107 @@
+# llm_profile.py
+"""
+Profiling of model calls.
+
+Every attempt made by ai_analysis.generate_json (and every analysis served
+from the pipeline's stage cache) becomes a row in llm_calls: prompt size in
+bytes and estimated tokens, split by the data key that contributed it, output
+tokens, latency, attempt number and outcome. Rows are written from a worker
+thread so the report never waits on the database. LLM_PROFILE=0 turns it off.
+
+Tokens are estimated at BYTES_PER_TOKEN bytes per token; that is close enough
+to compare sources and track prompt growth, not to reconcile billing.
+"""
+import os
+import json
+import asyncio
+import logging
+from typing import Optional
+
+from db_config import save_llm_call
+
+logger = logging.getLogger("llm_profile")
+
+BYTES_PER_TOKEN = 4
+TEMPLATE_KEY = "_template"  # instructions and framing around the data
+
+_pending: set = set()
+_warned = False
+
+
+def profiling_enabled() -> bool:
+    return os.getenv("LLM_PROFILE", "1").lower() not in ("0", "false", "no")
+
+
+def estimate_tokens(n_bytes: int) -> int:
+    return -(-n_bytes // BYTES_PER_TOKEN)
+
+
+def _size(text: Optional[str]) -> int:
+    return len(text.encode("utf-8")) if text else 0
+
+
+def prompt_composition(prompt: str, sources: Optional[dict], max_chars: Optional[int] = None) -> dict:
+    """
+    {key: {"bytes", "tokens"}} for each top-level key of the data in the prompt, plus the template.
+    With max_chars, the prompt carried json.dumps(sources)[:max_chars]; only the part of each
+    key's value that made it into the prompt is counted.
+    """
+    composition = {}
+    position = 1  # opening brace
+    for index, (key, value) in enumerate((sources or {}).items()):
+        text = json.dumps(value, ensure_ascii=False, default=str)
+        if max_chars is not None:
+            # ', ' between entries, then '"key": ' before the value
+            position += (2 if index else 0) + len(json.dumps(str(key), ensure_ascii=False)) + 2
+            sent = text[:max(0, max_chars - position)]
+            position += len(text)
+            text = sent
+        n_bytes = _size(text)
+        composition[str(key)] = {"bytes": n_bytes, "tokens": estimate_tokens(n_bytes)}
+    template = max(0, _size(prompt) - sum(part["bytes"] for part in composition.values()))
+    composition[TEMPLATE_KEY] = {"bytes": template, "tokens": estimate_tokens(template)}
+    return composition
+
+
+def build_call(purpose: str, backend: str, attempt: int, prompt: str, composition: dict,
+               output: Optional[str], latency_seconds: Optional[float], outcome: str,
+               cache_hit: bool = False, error: Optional[str] = None) -> dict:
+    prompt_bytes = _size(prompt)
+    return {
+        "purpose": purpose,
+        "backend": backend,
+        "attempt": attempt,
+        "prompt_bytes": prompt_bytes,
+        "prompt_tokens": estimate_tokens(prompt_bytes),
+        "prompt_sources": composition,
+        "output_tokens": estimate_tokens(_size(output)) if output is not None else None,
+        "latency_ms": round(latency_seconds * 1000, 1) if latency_seconds is not None else None,
+        "outcome": outcome,
+        "cache_hit": cache_hit,
+        "error": error,
+    }
+
+
+def _save(call: dict):
+    global _warned
+    try:
+        save_llm_call(call)
+    except Exception as e:
+        # The database is optional for local runs; say so once rather than per call
+        if not _warned:
+            logger.warning(f"⚠️ Could not record LLM call profile: {e}")
+            _warned = True
+
+
+def record(call: dict):
+    """Queue a row for llm_calls without blocking the caller."""
+    if not profiling_enabled():
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        _save(call)
+        return
+    task = loop.create_task(asyncio.to_thread(_save, call))
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
@@ -1,15 +1,36 @@
-from fastapi import FastAPI, Query, Response, HTTPException
-from fastapi.responses import PlainTextResponse
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, Query, Request, Response, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Optional
 from pydantic import BaseModel
-from datetime import datetime
-import io, csv, json
+from datetime import datetime, timedelta
+import io, csv, json, os
+import asyncio
 import logging
 
-from data_sources import fetch_all_data, reddit
-from ai_analysis import generate_report_with_ai
-from db_config import get_latest_report, get_db_connection  # psycopg v3 helpers
+from db_config import (  # psycopg v3 helpers
+    get_latest_report, get_db_connection, get_report_history, get_llm_call_stats, get_raw_daily_rollups,
+    search_raw_items,
+)
+from serialization import negotiated_response
+from rate_limiter import get_scheduler
+from circuit_breaker import breaker_states
+from result_cache import result_cache
+from hazard_grid import hazard_grid
+from ingestion_scheduler import IngestionScheduler, build_jobs
+import analytics
+import coordination
+import data_sources
+import live_score
+import pipeline
+import llm_backends
+import replay
+import providers  # heavy clients (Gemini, Reddit, feedparser, pandas) load on first use
+
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
 
 # ----- Logging -----
 logging.basicConfig(level=logging.INFO)
@@ -35,18 +56,38 @@ class DailyReport(BaseModel):
     top_drivers: list[str]
     narrative_summary: str
     timestamp: str
+    missing_sources: dict = {}
 
 # ----- Lifecycle -----
 @app.on_event("startup")
 async def startup_event():
-    logger.info("🚀 Collapse Monitor System starting up...")
+    app.state.ready_seconds = time.perf_counter() - _IMPORT_STARTED
+    logger.info(
+        f"🚀 Collapse Monitor System starting up... "
+        f"(imports {IMPORT_SECONDS * 1000:.0f} ms, ready {app.state.ready_seconds * 1000:.0f} ms)"
+    )
+    app.state.ingestion = None
+    # The live score and hazard grid start from what is stored, not from zero
+    app.state.coordination_tasks = [asyncio.create_task(data_sources.restore_live_state(), name="live-state")]
+    if coordination.coordination_enabled():
+        # Other workers' report saves and ingested results invalidate this worker's caches
+        app.state.coordination_tasks.append(asyncio.create_task(coordination.listen(), name="coordination"))
+    if os.getenv("INGESTION_SCHEDULER", "0").lower() in ("1", "true", "yes"):
+        app.state.ingestion = IngestionScheduler(build_jobs())
+        leader = coordination.start_scheduler(app.state.ingestion)
+        if leader:
+            app.state.coordination_tasks.append(leader)
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("🛑 Shutting down Collapse Monitor System...")
+    for task in app.state.coordination_tasks:
+        task.cancel()
+    await asyncio.gather(*app.state.coordination_tasks, return_exceptions=True)
+    if app.state.ingestion:
+        await app.state.ingestion.stop()
     try:
-        await reddit.close()
-        logger.info("✅ Reddit client session closed.")
+        await providers.close_all()
     except Exception as e:
         logger.warning(f"⚠️ Error closing Reddit client: {e}")
 
@@ -63,6 +104,54 @@ async def root_head():
 async def healthz():
     return {"ok": True}
 
+@app.get("/v1/metrics/startup")
+async def startup_metrics():
+    """Import/boot timings and the first-use init cost of each lazy provider."""
+    return {
+        "import_seconds": round(IMPORT_SECONDS, 4),
+        "ready_seconds": round(getattr(app.state, "ready_seconds", 0.0), 4),
+        "providers": providers.timings,
+    }
+
+@app.get("/v1/metrics/rate-limits")
+async def rate_limit_metrics():
+    """Per-provider token-bucket state and queueing delay (seconds)."""
+    return get_scheduler().stats()
+
+@app.get("/v1/metrics/breakers")
+async def breaker_metrics():
+    """Circuit breaker state per source."""
+    return breaker_states()
+
+@app.get("/v1/metrics/llm")
+def llm_metrics(hours: int = Query(24, ge=1, le=24 * 90)):
+    """
+    Model call profile over the last `hours`: latency/tokens per purpose and outcome,
+    latency per attempt, and prompt bytes/tokens per source key; plus live backend latencies.
+    """
+    since = datetime.utcnow() - timedelta(hours=hours)
+    try:
+        calls = get_llm_call_stats(since)
+    except Exception as e:
+        logger.error(f"/v1/metrics/llm error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to read LLM call stats")
+    return {"hours": hours, "calls": calls, "backend": llm_backends.get_backend().stats()}
+
+@app.get("/v1/metrics/result-cache")
+async def result_cache_metrics():
+    """Per-source result cache hits and entry ages."""
+    return result_cache.stats()
+
+@app.get("/v1/metrics/ingestion")
+async def ingestion_metrics():
+    """
+    Per-source cadence and last run of the in-process ingestion scheduler.
+    "leader" is whether this worker holds the ingestion lock and is the one ingesting.
+    """
+    if not app.state.ingestion:
+        return {"enabled": False, "leader": False, "sources": {}}
+    return {"enabled": True, "leader": app.state.ingestion.running, "sources": app.state.ingestion.status()}
+
 # ----- Write/Generate endpoint (kept as-is) -----
 @app.get("/daily-report", response_model=DailyReport)
 async def get_daily_report(
@@ -70,25 +159,103 @@ async def get_daily_report(
         None,
         alias="recipient_email",
         description="Override recipient email for the report"
+    ),
+    replay_date: Optional[str] = Query(
+        None,
+        description="Re-run the analysis on a past day's stored payloads (YYYY-MM-DD), no live fetch"
     )
 ):
     """
-    Generates the daily collapse risk report:
-      1) fetch data
-      2) analyze with AI
-      3) (optionally) email
-      4) return report JSON (and store in DB via your ai_analysis/db layer)
+    Generates the daily collapse risk report through the staged pipeline:
+      1) fetch every source concurrently
+      2) normalize, score and analyze with AI (cached per input hash)
+      3) persist to the DB and email in parallel
+      4) return report JSON
     """
-    raw_data = await fetch_all_data()
+    try:
+        replay.resolve_replay_date(replay_date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid replay_date format, use YYYY-MM-DD")
 
     final_recipient = recipient_email or "default from .env"
     logger.info(f"Recipient override: {recipient_email}, using: {final_recipient}")
 
-    report_data = await generate_report_with_ai(
-        raw_data,
+    return await pipeline.run_report(
+        pipeline.build_api_pipeline(replay_date=replay_date),
         recipient_override=recipient_email
     )
-    return report_data
+
+# ----- Hazard hotspots -----
+@app.get("/v1/hazards/hotspots")
+async def get_hazard_hotspots(
+    hours: float = Query(24, gt=0, le=168, description="Window back from now"),
+    top: int = Query(10, ge=1, le=100),
+):
+    """Grid cells with clustered or severe hazard events, busiest first."""
+    return {"hours": hours, "cell_degrees": hazard_grid.cell_degrees,
+            "hotspots": hazard_grid.hotspots(hours=hours, top=top)}
+
+@app.get("/v1/hazards/region")
+async def get_hazard_region(
+    lat_min: float = Query(..., ge=-90, le=90),
+    lat_max: float = Query(..., ge=-90, le=90),
+    lon_min: float = Query(..., ge=-180, le=180),
+    lon_max: float = Query(..., ge=-180, le=180),
+    hours: float = Query(24, gt=0, le=168),
+):
+    """Event count and max severity inside a lat/lon box."""
+    if lat_min > lat_max or lon_min > lon_max:
+        raise HTTPException(status_code=400, detail="lat_min/lon_min must not exceed lat_max/lon_max")
+    return hazard_grid.region(lat_min, lat_max, lon_min, lon_max, hours=hours)
+
+# ----- Live intraday score -----
+SSE_KEEPALIVE_SECONDS = 15
+
+@app.get("/v1/score/live")
+async def get_live_score():
+    """Current rolling risk score and the signals behind it."""
+    return live_score.live_score.snapshot()
+
+@app.get("/v1/score/stream")
+async def stream_live_score(request: Request):
+    """
+    Server-Sent Events: sends the current score, then a `score` event every time
+    it changes, with keep-alive comments in between.
+    """
+    async def events():
+        queue = live_score.subscribe()
+        try:
+            yield f"event: score\ndata: {json.dumps(live_score.live_score.snapshot())}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    snapshot = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: score\ndata: {json.dumps(snapshot)}\n\n"
+        finally:
+            live_score.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ----- Analytics -----
+@app.get("/v1/analytics/trend")
+async def get_analytics_trend(
+    request: Request,
+    window: int = Query(7, ge=1, le=365, description="Rolling mean / volatility window (days)"),
+    span: int = Query(7, ge=1, le=365, description="EWMA span (days)"),
+    band_window: int = Query(30, ge=1, le=3650, description="Window for the p10/p50/p90 bands (days)"),
+):
+    """
+    Ready-to-plot trend series over daily_reports (windows in calendar days),
+    cached until the next report is saved or TREND_CACHE_TTL_SECONDS pass.
+    """
+    trend = await asyncio.to_thread(analytics.get_trend, window, span, band_window)
+    return negotiated_response(request, trend, table=trend["series"])
 
 # ----- Read endpoints used by Streamlit -----
 def _row_to_report(row: dict) -> dict:
@@ -107,15 +274,80 @@ def _row_to_report(row: dict) -> dict:
         "message": "OK",
     }
 
+def _parse_date(value: Optional[str]):
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format, use YYYY-MM-DD")
+
 @app.get("/v1/report/latest")
-def get_report_latest():
+def get_report_latest(request: Request):
     row = get_latest_report()
     if not row:
         raise HTTPException(status_code=404, detail="No report found")
-    return _row_to_report(row)
+    report = _row_to_report(row)
+    return negotiated_response(request, report, table=[report])
+
+@app.get("/v1/reports/history")
+def get_reports_history(
+    request: Request,
+    start: Optional[str] = Query(None, description="First report date (YYYY-MM-DD)"),
+    end: Optional[str] = Query(None, description="Last report date (YYYY-MM-DD)"),
+    limit: int = Query(1000, ge=1, le=100000),
+):
+    """
+    Report history, oldest first (the newest `limit` reports). JSON by default; send
+    Accept: application/vnd.apache.arrow.stream or application/msgpack for binary.
+    """
+    rows = [_row_to_report(row) for row in get_report_history(_parse_date(start), _parse_date(end), limit)]
+    return negotiated_response(request, rows, table=rows)
+
+@app.get("/v1/sources/rollups")
+def get_source_rollups(
+    request: Request,
+    source: Optional[list[str]] = Query(None, description="Source name(s); all sources when omitted"),
+    start: Optional[str] = Query(None, description="First day (YYYY-MM-DD)"),
+    end: Optional[str] = Query(None, description="Last day (YYYY-MM-DD)"),
+    limit: int = Query(1000, ge=1, le=100000),
+):
+    """
+    Per-source, per-day ingestion rollups (payloads, items, bytes, errors and numeric
+    fields), newest day first. Read from raw_daily_rollups, never from raw_data.
+    """
+    try:
+        rows = get_raw_daily_rollups(source, _parse_date(start), _parse_date(end), limit)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"/v1/sources/rollups error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to read source rollups")
+    return negotiated_response(request, rows, table=rows)
+
+@app.get("/v1/search")
+def search_items(
+    request: Request,
+    q: str = Query(..., min_length=1, description='Web-search syntax, e.g. "bank run" -crypto'),
+    source: Optional[list[str]] = Query(None, description="Source name(s); all sources when omitted"),
+    start: Optional[str] = Query(None, description="Published on or after (YYYY-MM-DD)"),
+    end: Optional[str] = Query(None, description="Published on or before (YYYY-MM-DD)"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+):
+    """Ranked full-text search over ingested articles, posts and events (raw_items)."""
+    try:
+        total, rows = search_raw_items(q, source, _parse_date(start), _parse_date(end), limit, offset)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"/v1/search error: {e}")
+        raise HTTPException(status_code=500, detail="Search failed")
+    payload = {"query": q, "total": total, "limit": limit, "offset": offset, "results": rows}
+    return negotiated_response(request, payload, table=rows)
 
 @app.get("/v1/report/{date}")
-def get_report_by_date(date: str):
+def get_report_by_date(date: str, request: Request):
     """
     Fetch report for a specific date (YYYY-MM-DD).
     """
@@ -132,7 +364,8 @@ def get_report_by_date(date: str):
         row = cur.fetchone()
         if not row:
             raise HTTPException(status_code=404, detail="No report on that date")
-        return _row_to_report(row)
+        report = _row_to_report(row)
+        return negotiated_response(request, report, table=[report])
 
 @app.get("/v1/report/latest.csv")
 def get_report_latest_csv():
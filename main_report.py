@@ -1,31 +1,29 @@
 # main_report.py
 import asyncio
 import json
-from data_fetcher import fetch_all_sources
-from ai_analysis import generate_report_with_ai
+from datetime import datetime
+from source_config import load_sources
+import pipeline
+import replay
+from export_store import export_store
 
 CONFIG_FILE = "data_sources.json"
 
 async def main():
-    # Step 1: Fetch all live data
-    all_data = fetch_all_sources(CONFIG_FILE)
+    # Fetch (or replay when REPLAY_DATE is set), analyze, persist and email in one pipeline run
+    replay_day = replay.resolve_replay_date()
+    outputs = await pipeline.build_sources_pipeline(CONFIG_FILE).run(recipient_override=None)
+    names = [src.get("name") for src in load_sources(CONFIG_FILE)]
+    all_data = [outputs[f"fetch:{name}"] for name in names]
 
     # Optional: Save raw fetch for audit/debug
-    with open("exports/latest_raw_data.json", "w", encoding="utf-8") as f:
-        json.dump(all_data, f, ensure_ascii=False, indent=2)
+    await export_store.write_async("latest_raw_data.json", all_data)
 
-    # Step 2: Aggregate data for AI analysis
-    # Flatten or structure as needed by ai_analysis
-    structured_data = {}
-    for source in all_data:
-        structured_data[source["source"]] = source["data"]
+    # Archive today's records so this run can be replayed offline later
+    if not replay_day:
+        replay.save_archive(datetime.utcnow().date(), dict(zip(names, all_data)))
 
-    # Step 3: Generate report with AI (includes fallback)
-    report = await generate_report_with_ai(structured_data)
-
-    # Step 4: Save report for audit
-    with open("exports/latest_report.json", "w", encoding="utf-8") as f:
-        json.dump(report, f, ensure_ascii=False, indent=2)
+    report = pipeline.report_from_outputs(outputs)
 
     print("✅ Daily Collapse Monitor report generated and emailed (if configured).")
     print(json.dumps(report, indent=2, ensure_ascii=False))
@@ -0,0 +1,194 @@
+# market_data.py
+"""
+Market signals from locally cached daily price series.
+
+Each symbol's daily closes are kept in exports/market/<SYMBOL>.json
+(MARKET_DATA_DIR) and extended incrementally: Alpha Vantage is only called
+when the cache is missing the latest trading day, and the new closes are
+merged into what is already stored. Calls go through the shared "alphavantage"
+token bucket.
+
+From the series, vectorized rolling windows give realized volatility
+(annualized std of daily log returns) and drawdown from the rolling peak,
+which map to the "low" / "medium" / "high" levels calculate_risk_score reads:
+
+    SPY -> sp500_change        (last day's close-to-close change)
+    QQQ -> nasdaq_volatility
+"""
+import os
+import json
+import math
+import time
+import asyncio
+import logging
+from datetime import date, timedelta
+from typing import Optional
+
+import aiohttp
+import numpy as np
+
+from providers import pandas
+from rate_limiter import get_scheduler, retry_after_seconds
+
+logger = logging.getLogger("market_data")
+
+CACHE_DIR = os.getenv("MARKET_DATA_DIR", os.path.join("exports", "market"))
+API_URL = "https://www.alphavantage.co/query"
+
+SP500_SYMBOL = "SPY"
+NASDAQ_SYMBOL = "QQQ"
+
+VOLATILITY_WINDOW = 20   # trading days
+DRAWDOWN_WINDOW = 60
+# Don't re-ask for a day the provider had no data for (holidays) more often than this
+RECHECK_SECONDS = 6 * 3600
+
+# Annualized realized volatility bounds, and drawdowns that raise the level
+VOLATILITY_LEVELS = ((0.15, "low"), (0.25, "medium"))
+DRAWDOWN_MEDIUM = -0.05
+DRAWDOWN_HIGH = -0.10
+
+_locks: dict = {}
+
+
+def _path(symbol: str) -> str:
+    return os.path.join(CACHE_DIR, f"{symbol.upper()}.json")
+
+
+def load_series(symbol: str) -> dict:
+    """Cached {"series": {YYYY-MM-DD: close}, "checked_at": epoch} for a symbol."""
+    path = _path(symbol)
+    if not os.path.exists(path):
+        return {"series": {}, "checked_at": 0}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"⚠️ Ignoring unreadable price cache {path}: {e}")
+        return {"series": {}, "checked_at": 0}
+
+
+def save_series(symbol: str, cached: dict):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _path(symbol)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cached, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def last_trading_day(today: Optional[date] = None) -> date:
+    """Most recent weekday before today (today's close may not be published yet)."""
+    day = (today or date.today()) - timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+
+def needs_update(cached: dict, today: Optional[date] = None) -> bool:
+    series = cached.get("series") or {}
+    if series and max(series) >= last_trading_day(today).isoformat():
+        return False
+    # Failed and empty checks count too, so errors don't re-spend the daily quota on every call
+    return time.time() - cached.get("checked_at", 0) >= RECHECK_SECONDS
+
+
+async def fetch_daily_closes(symbol: str) -> dict:
+    """
+    The last ~100 daily closes from TIME_SERIES_DAILY (compact), {date: close}.
+    Raises on HTTP errors and on quota notes, which Alpha Vantage returns with status 200.
+    """
+    params = {"function": "TIME_SERIES_DAILY", "symbol": symbol, "outputsize": "compact",
+              "apikey": os.getenv("ALPHA_VANTAGE_API_KEY")}
+    await get_scheduler().acquire("alphavantage")
+    async with aiohttp.ClientSession() as session:
+        async with session.get(API_URL, params=params, timeout=25) as resp:
+            if resp.status == 429:
+                get_scheduler().penalize("alphavantage", retry_after_seconds(resp.headers))
+            resp.raise_for_status()
+            data = await resp.json(content_type=None)
+
+    daily = data.get("Time Series (Daily)")
+    if not daily:
+        if data.get("Note") or data.get("Information"):
+            get_scheduler().penalize("alphavantage", 60)
+        raise RuntimeError(data.get("Note") or data.get("Information") or data.get("Error Message") or "no series")
+    return {day: float(values["4. close"]) for day, values in daily.items()}
+
+
+async def update_series(symbol: str) -> dict:
+    """Cached series for `symbol`, extended with any days it is missing."""
+    lock = _locks.setdefault(symbol, asyncio.Lock())
+    async with lock:
+        cached = load_series(symbol)
+        if not needs_update(cached):
+            return cached["series"]
+        try:
+            new_closes = await fetch_daily_closes(symbol)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not extend {symbol} series, using cached closes: {e}")
+            save_series(symbol, {**cached, "symbol": symbol, "checked_at": time.time()})
+            return cached.get("series") or {}
+        series = {**cached.get("series", {}), **new_closes}
+        save_series(symbol, {"symbol": symbol, "checked_at": time.time(), "series": series})
+        return series
+
+
+def compute_metrics(series: dict) -> dict:
+    """Last change, realized volatility and drawdown from {date: close}."""
+    pd = pandas()
+    if len(series) < 2:
+        return {}
+    close = pd.Series(series, dtype="float64").sort_index()
+    returns = close.pct_change()
+    log_returns = np.log(close).diff()
+    volatility = log_returns.rolling(VOLATILITY_WINDOW, min_periods=5).std() * math.sqrt(252)
+    drawdown = close / close.rolling(DRAWDOWN_WINDOW, min_periods=1).max() - 1
+
+    last_volatility = volatility.iloc[-1]
+    return {
+        "as_of": close.index[-1],
+        "close": round(float(close.iloc[-1]), 2),
+        "change_pct": round(float(returns.iloc[-1]) * 100, 2),
+        "realized_volatility": None if pd.isna(last_volatility) else round(float(last_volatility), 4),
+        "drawdown": round(float(drawdown.iloc[-1]), 4),
+        "days": len(close),
+    }
+
+
+def volatility_level(metrics: dict) -> Optional[str]:
+    vol = metrics.get("realized_volatility")
+    if vol is None:
+        return None
+    level = "high"
+    for bound, name in VOLATILITY_LEVELS:
+        if vol < bound:
+            level = name
+            break
+    drawdown = metrics.get("drawdown", 0)
+    if drawdown <= DRAWDOWN_HIGH:
+        return "high"
+    if drawdown <= DRAWDOWN_MEDIUM and level == "low":
+        return "medium"
+    return level
+
+
+async def market_signals(symbols=(SP500_SYMBOL, NASDAQ_SYMBOL)) -> dict:
+    """
+    {"sp500_change", "nasdaq_volatility", "symbols": {symbol: metrics}}.
+    Signals whose series is unavailable are left out; {} when nothing is.
+    """
+    series = await asyncio.gather(*(update_series(symbol) for symbol in symbols))
+    metrics = {symbol: compute_metrics(s) for symbol, s in zip(symbols, series)}
+    metrics = {symbol: m for symbol, m in metrics.items() if m}
+    for symbol, m in metrics.items():
+        m["volatility_level"] = volatility_level(m)
+
+    signals = {}
+    if SP500_SYMBOL in metrics:
+        signals["sp500_change"] = f"{metrics[SP500_SYMBOL]['change_pct']:+.2f}%"
+    if NASDAQ_SYMBOL in metrics and metrics[NASDAQ_SYMBOL]["volatility_level"]:
+        signals["nasdaq_volatility"] = metrics[NASDAQ_SYMBOL]["volatility_level"]
+    if signals:
+        signals["symbols"] = metrics
+    return signals
@@ -0,0 +1,380 @@
+# pipeline.py
+"""
+Staged report pipeline.
+
+One DAG executor behind every entry point (main.py /daily-report,
+main_report.py, email_sender.py). Each builder only differs in its fetch
+stages and how they are normalized; the tail is shared:
+
+    fetch:<source> ... -> normalize -> score -> analyze -> persist
+                                                        \\-> deliver
+
+A stage starts as soon as its dependencies finish, so independent stages
+(all fetches, persist and deliver) run concurrently. Stages marked cacheable
+store their output under a hash of their inputs, so e.g. replaying the same
+day skips the model call (fallback reports are never cached). Replays skip
+persist and deliver, so a past day never overwrites today's report.
+
+With ANALYSIS_MODE=map_reduce the analyze stage is lazy: it takes the fetch
+stages as they complete, summarizes each source group as soon as its fetches
+are in, and reduces the summaries into the report. The lazy stage itself is
+not cacheable, so each group summary and the reduce step are cached instead.
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import inspect
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Optional
+
+from ai_analysis import (
+    MAP_PAYLOAD_MAX_CHARS, analyze_map_reduce, analyze_report, build_group_prompt, build_prompt,
+    build_reduce_prompt, calculate_risk_score, reduce_report, send_report_via_email, summarize_group,
+    write_report_export,
+)
+from data_fetcher import fetch_all_sources
+from data_sources import DATA_SOURCES, fetch_all_data
+from db_config import save_daily_report
+import coordination
+import llm_profile
+from fetchers.economic import fetch_economic
+from fetchers.environment import fetch_environment
+from fetchers.finance import fetch_financial_markets
+from fetchers.news import fetch_news_sentiment
+from fetchers.social import fetch_social
+from replay import resolve_replay_date
+from source_config import load_sources
+
+logger = logging.getLogger("pipeline")
+
+STAGE_CACHE_SIZE = 64
+
+
+class Stage:
+    """
+    A named step. `func` receives its dependencies' outputs as keyword
+    arguments; sync functions run in a worker thread.
+    `cache_key` maps those arguments to what the cache hash covers.
+    A `lazy` stage starts right away and gets its dependencies as awaitables
+    instead, to consume them as they complete (not cacheable itself).
+    `cache_if(output)` decides whether an output may be cached (default: always).
+    `on_cache_hit(output, **arguments)` is called when a cached output is served
+    and returns the output to use (e.g. restamped).
+    """
+
+    def __init__(self, name: str, func: Callable, deps=(), cache: bool = False,
+                 cache_key: Optional[Callable] = None, lazy: bool = False,
+                 cache_if: Optional[Callable] = None, on_cache_hit: Optional[Callable] = None):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.cache = cache and not lazy
+        self.cache_key = cache_key or (lambda **kwargs: kwargs)
+        self.lazy = lazy
+        self.cache_if = cache_if
+        self.on_cache_hit = on_cache_hit
+
+
+class StageCache:
+    """Small in-memory LRU of stage outputs keyed by (stage, input hash)."""
+
+    def __init__(self, max_entries: int = STAGE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    @staticmethod
+    def input_hash(stage: Stage, args: dict) -> str:
+        return StageCache.material_hash(stage.name, stage.cache_key(**args))
+
+    @staticmethod
+    def material_hash(name: str, material) -> str:
+        text = json.dumps(material, sort_keys=True, default=str)
+        return hashlib.sha256(f"{name}:{text}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return True, self.entries[key]
+        return False, None
+
+    def put(self, key: str, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+stage_cache = StageCache()
+
+
+class Pipeline:
+    def __init__(self, stages: list, cache: StageCache = stage_cache):
+        self.stages = {stage.name: stage for stage in stages}
+        self.cache = cache
+        self.timings: dict = {}
+
+    def _ordered(self, inputs: dict) -> list:
+        """Stages in dependency order; fails on unknown deps and cycles."""
+        ordered, done, visiting = [], set(inputs), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting or name not in self.stages:
+                raise ValueError(f"Pipeline stage {name} is unknown or part of a cycle")
+            visiting.add(name)
+            for dep in self.stages[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+            ordered.append(self.stages[name])
+
+        for name in self.stages:
+            visit(name)
+        return ordered
+
+    async def _run_stage(self, stage: Stage, tasks: dict):
+        if stage.lazy:
+            args = {dep: tasks[dep] for dep in stage.deps}
+        else:
+            args = {dep: await tasks[dep] for dep in stage.deps}
+        started = time.perf_counter()
+
+        key = None
+        if stage.cache:
+            key = self.cache.input_hash(stage, args)
+            hit, value = self.cache.get(key)
+            if hit:
+                self.timings[stage.name] = {"seconds": 0.0, "cached": True}
+                if stage.on_cache_hit:
+                    value = stage.on_cache_hit(value, **args)
+                return value
+
+        if inspect.iscoroutinefunction(stage.func):
+            value = await stage.func(**args)
+        else:
+            value = await asyncio.to_thread(stage.func, **args)
+
+        if key is not None and (stage.cache_if is None or stage.cache_if(value)):
+            self.cache.put(key, value)
+        self.timings[stage.name] = {"seconds": round(time.perf_counter() - started, 4), "cached": False}
+        return value
+
+    async def run(self, **inputs) -> dict:
+        """Run every stage; `inputs` are available to stages as already-finished deps."""
+        tasks = {}
+        for name, value in inputs.items():
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(value)
+            tasks[name] = future
+        for stage in self._ordered(inputs):
+            tasks[stage.name] = asyncio.create_task(self._run_stage(stage, tasks), name=f"stage:{stage.name}")
+        await asyncio.gather(*tasks.values())
+        logger.info(f"Pipeline stage timings: {self.timings}")
+        return {name: task.result() for name, task in tasks.items()}
+
+
+# -------------------------
+# Shared report tail
+# -------------------------
+def _without_timestamp(data: dict) -> dict:
+    return {"data": {k: v for k, v in data.items() if k != "timestamp"}}
+
+
+def persist_report(report: dict) -> dict:
+    write_report_export(report)
+    try:
+        save_daily_report(report)
+        # Other workers drop their report-derived caches too
+        coordination.broadcast(coordination.REPORT_SAVED)
+        return {"saved": True}
+    except Exception as e:
+        logger.warning(f"Could not save daily report: {e}")
+        return {"saved": False, "error": str(e)}
+
+
+async def cached_summarize_group(group: str, payload: dict) -> dict:
+    """summarize_group, served from stage_cache for an identical group payload (fallbacks are not cached)."""
+    key = StageCache.material_hash(f"map:{group}", payload)
+    hit, summary = stage_cache.get(key)
+    if hit:
+        prompt = build_group_prompt(group, payload)
+        llm_profile.record(llm_profile.build_call(
+            f"map:{group}", "stage_cache", 0, prompt,
+            llm_profile.prompt_composition(prompt, payload, MAP_PAYLOAD_MAX_CHARS), None, 0.0, "cached", cache_hit=True,
+        ))
+        return dict(summary)
+    summary = await summarize_group(group, payload)
+    if "error" not in summary:
+        stage_cache.put(key, summary)
+    return summary
+
+
+async def cached_reduce_report(summaries: list, data: dict, risk_score: Optional[int] = None) -> dict:
+    """reduce_report, served from stage_cache for identical summaries, score and missing sources."""
+    if risk_score is None:
+        risk_score = calculate_risk_score(data)
+    missing = data.get("missing_sources") or {}
+    key = StageCache.material_hash("reduce", {"summaries": summaries, "score": risk_score, "missing": missing})
+    hit, report = stage_cache.get(key)
+    if hit:
+        prompt = build_reduce_prompt(summaries, risk_score, missing)
+        sources = {"group_summaries": summaries, "missing_sources": missing}
+        llm_profile.record(llm_profile.build_call(
+            "reduce", "stage_cache", 0, prompt, llm_profile.prompt_composition(prompt, sources),
+            None, 0.0, "cached", cache_hit=True,
+        ))
+        return {**report, "timestamp": datetime.now().isoformat()}
+    report = await reduce_report(summaries, data, risk_score)
+    if report.get("analysis") != "fallback":
+        stage_cache.put(key, report)
+    return report
+
+
+def analysis_mode() -> str:
+    """ANALYSIS_MODE: "single" (one prompt over all data) or "map_reduce" (per source group)."""
+    return os.getenv("ANALYSIS_MODE", "single").lower()
+
+
+def report_stages(fetch_names: list, normalize: Callable, persist: bool = True) -> list:
+    """
+    normalize, score, analyze, persist and deliver over the given fetch stages.
+    With persist=False (replays) the report is neither saved, exported, broadcast nor emailed.
+    """
+    async def analyze(normalize, score):
+        return await analyze_report(normalize, score)
+
+    async def analyze_groups(**fetches):
+        # Summaries start as each source group's fetches land, overlapping the slower ones
+        return await analyze_map_reduce(fetches, normalize, summarize=cached_summarize_group,
+                                        reduce=cached_reduce_report)
+
+    def serve_cached_analysis(report, normalize, score):
+        prompt = build_prompt(normalize)
+        llm_profile.record(llm_profile.build_call(
+            "report", "stage_cache", 0, prompt, llm_profile.prompt_composition(prompt, normalize),
+            None, 0.0, "cached", cache_hit=True,
+        ))
+        return {**report, "timestamp": datetime.now().isoformat()}
+
+    if analysis_mode() == "map_reduce":
+        analyze_stage = Stage("analyze", analyze_groups, deps=fetch_names, lazy=True)
+    else:
+        analyze_stage = Stage("analyze", analyze, deps=["normalize", "score"], cache=True,
+                              cache_key=lambda normalize, score: {**_without_timestamp(normalize), "score": score},
+                              # A fallback must not pin these inputs: the next run retries the model
+                              cache_if=lambda report: report.get("analysis") != "fallback",
+                              on_cache_hit=serve_cached_analysis)
+
+    if persist:
+        persist_stage = Stage("persist", lambda analyze: persist_report(dict(analyze)), deps=["analyze"])
+        deliver_stage = Stage("deliver", lambda analyze, recipient_override: send_report_via_email(analyze, recipient_override),
+                              deps=["analyze", "recipient_override"])
+    else:
+        # A replayed day must not overwrite today's report, history or recipients' inbox
+        persist_stage = Stage("persist", lambda analyze: {"saved": False, "skipped": "replay"}, deps=["analyze"])
+        deliver_stage = Stage("deliver", lambda analyze: None, deps=["analyze"])
+
+    return [
+        # Fetch stage names ("fetch:<source>") are passed through **kwargs
+        Stage("normalize", lambda **results: normalize(results), deps=fetch_names),
+        Stage("score", lambda normalize: calculate_risk_score(normalize), deps=["normalize"], cache=True,
+              cache_key=lambda normalize: _without_timestamp(normalize)),
+        analyze_stage,
+        persist_stage,
+        deliver_stage,
+    ]
+
+
+def report_from_outputs(outputs: dict) -> dict:
+    report = dict(outputs["analyze"])
+    report["sent_to"] = outputs["deliver"]
+    return report
+
+
+async def run_report(pipeline: Pipeline, recipient_override: Optional[str] = None) -> dict:
+    return report_from_outputs(await pipeline.run(recipient_override=recipient_override))
+
+
+# -------------------------
+# Builders, one per entry point
+# -------------------------
+def build_api_pipeline(replay_date=None, use_ingested=None) -> Pipeline:
+    """data_sources collectors (main.py)."""
+    def fetch_stage(name):
+        async def fetch():
+            return await fetch_all_data(replay_date=replay_date, use_ingested=use_ingested, sources=[name])
+        return Stage(f"fetch:{name}", fetch)
+
+    def normalize(results: dict) -> dict:
+        combined = {"timestamp": datetime.utcnow().isoformat(), "missing_sources": {}}
+        ingested = []
+        for result in results.values():
+            result = dict(result)
+            result.pop("timestamp", None)
+            combined["missing_sources"].update(result.pop("missing_sources", {}))
+            ingested += result.pop("ingested_sources", [])
+            combined.update(result)
+        if ingested:
+            combined["ingested_sources"] = sorted(ingested)
+        return combined
+
+    fetches = [fetch_stage(name) for name in DATA_SOURCES]
+    return Pipeline(fetches + report_stages([s.name for s in fetches], normalize,
+                                            persist=resolve_replay_date(replay_date) is None))
+
+
+def build_sources_pipeline(config_file: str = "data_sources.json", replay_date=None) -> Pipeline:
+    """data_sources.json sources through data_fetcher (main_report.py)."""
+    names = [src.get("name") for src in load_sources(config_file)]
+
+    def fetch_stage(name):
+        def fetch():
+            records = fetch_all_sources(config_file, replay_date=replay_date, names=[name])
+            return records[0] if records else {"source": name, "data_type": "api", "data": [], "error": "not configured"}
+        return Stage(f"fetch:{name}", fetch)
+
+    def normalize(results: dict) -> dict:
+        structured = {"missing_sources": {}}
+        for stage_name, record in results.items():
+            structured[record["source"]] = record["data"]
+            if record.get("error"):
+                structured["missing_sources"][stage_name.split(":", 1)[1]] = str(record["error"])
+        return structured
+
+    fetches = [fetch_stage(name) for name in names]
+    return Pipeline(fetches + report_stages([s.name for s in fetches], normalize,
+                                            persist=resolve_replay_date(replay_date) is None))
+
+
+def build_fetchers_pipeline() -> Pipeline:
+    """fetchers/* package (email_sender.py)."""
+    fetchers = {
+        "finance": fetch_financial_markets,
+        "news": fetch_news_sentiment,
+        "environment": fetch_environment,
+        "social": fetch_social,
+        "economic": fetch_economic,
+    }
+
+    def normalize(results: dict) -> dict:
+        finance = results["fetch:finance"]
+        news = results["fetch:news"]
+        env = results["fetch:environment"]
+        social = results["fetch:social"]
+        econ = results["fetch:economic"]
+        return {
+            "financial_markets": finance or {},
+            "news_sentiment": news or {},
+            "natural_disaster_events": env.get("natural_disaster_events", []) if env else [],
+            "social_media_posts": social.get("social_media_posts", []) if social else [],
+            "economic_data": econ.get("economic_data", {}) if econ else {},
+            "missing_sources": {name: "no data" for name in fetchers if not results[f"fetch:{name}"]},
+        }
+
+    fetches = [Stage(f"fetch:{name}", func) for name, func in fetchers.items()]
+    return Pipeline(fetches + report_stages([s.name for s in fetches], normalize))
@@ -0,0 +1,108 @@
+# providers.py
+"""
+Lazy provider layer for heavy clients and imports.
+
+Nothing here runs at import time: google-generativeai, asyncpraw, feedparser and
+pandas are imported (and their clients built) on first use, so the API can bind
+its port before any of them load. Init timings are kept for /v1/metrics/startup.
+"""
+import os
+import time
+import logging
+import importlib
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("providers")
+
+# Reentrant: factories call lazy_import (e.g. _build_gemini_model), which takes it again
+_lock = threading.RLock()
+_instances: dict = {}
+timings: dict = {}  # provider name -> seconds spent on first init
+
+
+def _timed(name: str, factory):
+    """Build a provider once, recording how long the first build took."""
+    if name in _instances:
+        return _instances[name]
+    with _lock:
+        if name not in _instances:
+            started = time.perf_counter()
+            _instances[name] = factory()
+            timings[name] = round(time.perf_counter() - started, 4)
+            logger.info(f"Initialized {name} in {timings[name] * 1000:.1f} ms")
+    return _instances[name]
+
+
+def lazy_import(module_name: str):
+    """Import a module on first use and record its import time."""
+    return _timed(f"import:{module_name}", lambda: importlib.import_module(module_name))
+
+
+def feedparser():
+    return lazy_import("feedparser")
+
+
+def pandas():
+    return lazy_import("pandas")
+
+
+# ---------- Gemini ----------
+GENERATION_CONFIG = {
+    "temperature": 0.5,
+    "max_output_tokens": 1000,
+}
+
+SAFETY_SETTINGS = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+]
+
+MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+
+
+def _build_gemini_model():
+    genai = lazy_import("google.generativeai")
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    try:
+        return genai.GenerativeModel(
+            model_name=MODEL_NAME,
+            generation_config=GENERATION_CONFIG,
+            safety_settings=SAFETY_SETTINGS,
+        )
+    except Exception:
+        logger.warning("Could not initialize generative model. Calls will fallback.")
+        return None
+
+
+def get_gemini_model():
+    """Returns the shared Gemini GenerativeModel, or None if it could not be built."""
+    return _timed("gemini_model", _build_gemini_model)
+
+
+# ---------- Reddit ----------
+def _build_reddit():
+    asyncpraw = lazy_import("asyncpraw")
+    return asyncpraw.Reddit(
+        client_id=os.getenv("REDDIT_CLIENT_ID"),
+        client_secret=os.getenv("REDDIT_CLIENT_SECRET"),
+        user_agent=os.getenv("REDDIT_USER_AGENT", "CollapseRiskAnalysis/1.0"),
+    )
+
+
+def get_reddit():
+    """Returns the shared asyncpraw.Reddit client."""
+    return _timed("reddit", _build_reddit)
+
+
+async def close_all():
+    """Close clients that hold network sessions. Safe if they were never built."""
+    reddit = _instances.pop("reddit", None)
+    if reddit is not None:
+        await reddit.close()
+        logger.info("✅ Reddit client session closed.")
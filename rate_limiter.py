@@ -0,0 +1,186 @@
+# rate_limiter.py
+"""
+Shared per-provider token-bucket scheduler.
+
+Quotas are declared under "providers" in data_sources.json. Every fetch path
+(async fetchers, the sync data_fetcher pipeline, the Reddit collector) takes a
+token before calling a provider, so bursts are queued within quota instead of
+turning into 429s. Queueing delay is tracked per provider.
+
+Buckets live in Postgres (provider_buckets, one row per provider), so every API
+worker, the ingestion worker and other instances spend one quota between them.
+A process falls back to its own in-memory bucket while the database is
+unreachable, and uses only that with COORDINATION=0.
+"""
+import time
+import asyncio
+import logging
+import threading
+from typing import Optional
+
+from coordination import coordination_enabled
+from db_config import penalize_provider, reserve_provider_token
+from source_config import load_providers
+
+logger = logging.getLogger("rate_limiter")
+
+
+class TokenBucket:
+    """
+    Token bucket with reservations: a caller always gets a slot, and is told
+    how long to wait for it. Tokens may go negative, which queues later callers
+    behind earlier ones in arrival order.
+    """
+
+    shared = False
+
+    def __init__(self, rate: float, per_seconds: float = 1.0, burst: Optional[float] = None):
+        self.fill_rate = float(rate) / float(per_seconds)
+        self.capacity = float(burst if burst is not None else rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "queued": 0, "throttled": 0, "total_wait": 0.0, "max_wait": 0.0, "last_wait": 0.0}
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+        self.updated = now
+
+    def _record(self, wait: float):
+        self.stats["requests"] += 1
+        self.stats["last_wait"] = wait
+        if wait > 0:
+            self.stats["queued"] += 1
+            self.stats["total_wait"] += wait
+            self.stats["max_wait"] = max(self.stats["max_wait"], wait)
+
+    def reserve(self) -> float:
+        """Take one token; returns the seconds to wait before using it."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= 1
+            wait = 0.0 if self.tokens >= 0 else -self.tokens / self.fill_rate
+            self._record(wait)
+            return wait
+
+    def penalize(self, retry_after: float):
+        """Provider pushed back (429): hold all new reservations for retry_after seconds."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, -float(retry_after) * self.fill_rate)
+            self.stats["throttled"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._refill(time.monotonic())
+            stats = dict(self.stats)
+            stats["avg_wait"] = round(stats["total_wait"] / stats["queued"], 4) if stats["queued"] else 0.0
+            stats["tokens"] = round(self.tokens, 3)
+            stats["backlog_seconds"] = round(max(0.0, -self.tokens / self.fill_rate), 3)
+            return stats
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    TokenBucket whose tokens are kept in Postgres and shared by every process.
+    reserve/penalize block on the database; the local tokens are only used
+    while it is unreachable. Stats stay per process.
+    """
+
+    shared = True
+
+    def __init__(self, provider: str, rate: float, per_seconds: float = 1.0, burst: Optional[float] = None):
+        super().__init__(rate, per_seconds, burst)
+        self.provider = provider
+        self._db_ok = True
+
+    def _db_failed(self, e: Exception):
+        if self._db_ok:
+            logger.warning(f"⚠️ Shared {self.provider} bucket unavailable, limiting per process: {e}")
+        self._db_ok = False
+
+    def reserve(self) -> float:
+        try:
+            tokens = reserve_provider_token(self.provider, self.fill_rate, self.capacity)
+        except Exception as e:
+            self._db_failed(e)
+            return super().reserve()
+        self._db_ok = True
+        wait = 0.0 if tokens >= 0 else -tokens / self.fill_rate
+        with self._lock:
+            self.tokens = tokens
+            self.updated = time.monotonic()
+            self._record(wait)
+        return wait
+
+    def penalize(self, retry_after: float):
+        super().penalize(retry_after)
+        try:
+            penalize_provider(self.provider, self.fill_rate, self.capacity, float(retry_after))
+        except Exception as e:
+            self._db_failed(e)
+
+
+class ProviderScheduler:
+    """Token buckets keyed by provider name. Unknown providers are not limited."""
+
+    def __init__(self, limits: dict, shared: Optional[bool] = None):
+        shared = coordination_enabled() if shared is None else shared
+        self.buckets = {
+            name: (SharedTokenBucket(name, cfg["rate"], cfg.get("per_seconds", 1), cfg.get("burst")) if shared
+                   else TokenBucket(cfg["rate"], cfg.get("per_seconds", 1), cfg.get("burst")))
+            for name, cfg in limits.items()
+        }
+        self._pending: set = set()
+
+    async def acquire(self, provider: Optional[str]):
+        bucket = self.buckets.get(provider)
+        if bucket:
+            # Shared buckets round-trip to Postgres; keep that off the event loop
+            wait = await asyncio.to_thread(bucket.reserve) if bucket.shared else bucket.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+    def acquire_sync(self, provider: Optional[str]):
+        bucket = self.buckets.get(provider)
+        if bucket:
+            wait = bucket.reserve()
+            if wait > 0:
+                time.sleep(wait)
+
+    def penalize(self, provider: Optional[str], retry_after: float = 60.0):
+        """Called from coroutines too; a shared bucket is then updated from a worker thread."""
+        bucket = self.buckets.get(provider)
+        if not bucket:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None or not bucket.shared:
+            bucket.penalize(retry_after)
+            return
+        future = loop.run_in_executor(None, bucket.penalize, retry_after)
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+
+    def stats(self) -> dict:
+        return {name: bucket.snapshot() for name, bucket in self.buckets.items()}
+
+
+_scheduler: Optional[ProviderScheduler] = None
+
+
+def get_scheduler() -> ProviderScheduler:
+    """Process-wide scheduler, built from data_sources.json on first use."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = ProviderScheduler(load_providers())
+    return _scheduler
+
+
+def retry_after_seconds(headers, default: float = 60.0) -> float:
+    try:
+        return float(headers.get("Retry-After", default))
+    except (TypeError, ValueError):
+        return default
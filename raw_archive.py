@@ -0,0 +1,167 @@
+# raw_archive.py
+"""
+Compressed columnar archive for old raw payloads.
+
+Rows of raw_data / raw_snapshots older than the retention window are moved to
+zstd-compressed Parquet files partitioned by source and month:
+
+    archive/raw/source=<name>/month=<YYYY-MM>/<table>-<first id>-<last id>.parquet
+
+and deleted from Postgres, keeping the hot tables small. Archived rows stay
+readable: read_archived() prunes partitions by source/month and reads only the
+requested columns through memory-mapped files, and replay.load_day falls back
+to it for days no longer in the database.
+
+Replay is the only reader: get_latest_raw_payloads, the rollup seed and the
+raw_items backfill read Postgres only. raw_items and raw_daily_rollups rows
+written before a payload was archived are kept, so search and rollups still
+cover it.
+
+Run the retention job daily:
+    python raw_archive.py --days 30
+"""
+import os
+import json
+import argparse
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from db_config import RAW_TABLES, iter_raw_batches_before, delete_raw_rows
+from providers import lazy_import
+
+ARCHIVE_DIR = os.getenv("RAW_ARCHIVE_DIR", os.path.join("archive", "raw"))
+RETENTION_DAYS = int(os.getenv("RAW_RETENTION_DAYS", "30"))
+BATCH_ROWS = int(os.getenv("RAW_ARCHIVE_BATCH_ROWS", "1000"))
+BATCH_BYTES = int(os.getenv("RAW_ARCHIVE_BATCH_BYTES", str(64 * 1024 * 1024)))  # payload text per Parquet write
+COLUMNS = ("id", "source_name", "timestamp", "payload")
+
+
+def _pyarrow():
+    return lazy_import("pyarrow"), lazy_import("pyarrow.parquet"), lazy_import("pyarrow.compute")
+
+
+def _safe_name(source: str) -> str:
+    return "".join(ch if ch.isalnum() or ch in "-_." else "_" for ch in source)
+
+
+def partition_dir(source: str, month: str, archive_dir: str = ARCHIVE_DIR) -> str:
+    return os.path.join(archive_dir, f"source={_safe_name(source)}", f"month={month}")
+
+
+def _write_partition(table: str, source: str, month: str, rows: list, archive_dir: str) -> str:
+    pa, pq, _ = _pyarrow()
+    folder = partition_dir(source, month, archive_dir)
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"{table}-{rows[0]['id']}-{rows[-1]['id']}.parquet")
+
+    arrow_table = pa.table({
+        "id": pa.array([r["id"] for r in rows], pa.int64()),
+        "source_name": pa.array([r["source_name"] for r in rows], pa.string()),
+        "timestamp": pa.array([r["timestamp"] for r in rows], pa.timestamp("us")),
+        "payload": pa.array([r["payload"] for r in rows], pa.string()),
+    })
+    # Write then rename, so readers never see a half-written file
+    tmp_path = path + ".tmp"
+    pq.write_table(arrow_table, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+    return path
+
+
+def archive_old_payloads(days: int = RETENTION_DAYS, batch_size: int = BATCH_ROWS, archive_dir: str = ARCHIVE_DIR,
+                         batch_bytes: int = BATCH_BYTES) -> dict:
+    """
+    Move raw rows older than `days` into Parquet, then delete them from Postgres.
+    Rows are streamed in batches of at most `batch_size` rows or `batch_bytes` of
+    payload, so a few multi-MB payloads don't blow up memory.
+    Re-running after a crash rewrites the same rows, possibly into differently
+    bounded files (if the batch limits changed); read_archived drops the duplicates.
+    Returns {table: rows archived}.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    moved = {}
+    for table in RAW_TABLES:
+        moved[table] = 0
+        try:
+            for rows in iter_raw_batches_before(table, cutoff, batch_size, batch_bytes):
+                partitions = defaultdict(list)
+                for row in rows:
+                    partitions[(row["source_name"], row["timestamp"].strftime("%Y-%m"))].append(row)
+                for (source, month), part_rows in partitions.items():
+                    _write_partition(table, source, month, part_rows, archive_dir)
+
+                moved[table] += delete_raw_rows(table, [row["id"] for row in rows])
+        except Exception as e:
+            print(f"⚠️ Could not archive {table}: {e}")
+    return moved
+
+
+def _months(start: date, end: date) -> set:
+    months, current = set(), date(start.year, start.month, 1)
+    while current <= end:
+        months.add(current.strftime("%Y-%m"))
+        current = date(current.year + (current.month == 12), current.month % 12 + 1, 1)
+    return months
+
+
+def read_archived(source=None, start=None, end=None, columns=COLUMNS, archive_dir: str = ARCHIVE_DIR) -> list:
+    """
+    Archived rows as dicts, filtered by source and [start, end) datetimes.
+    Only partitions that can match are opened, and only `columns` are read.
+    A row archived twice (files from runs with different batch boundaries) is
+    returned once. The payload column is returned parsed.
+    """
+    if not os.path.isdir(archive_dir):
+        return []
+    pa, pq, pc = _pyarrow()
+
+    wanted_sources = {f"source={_safe_name(source)}"} if source else None
+    wanted_months = {f"month={m}" for m in _months(start.date(), end.date())} if start and end else None
+    read_columns = list(dict.fromkeys([*columns, "id", "timestamp"]))
+
+    rows, seen = [], set()
+    for source_dir in sorted(os.listdir(archive_dir)):
+        if wanted_sources and source_dir not in wanted_sources:
+            continue
+        for month_dir in sorted(os.listdir(os.path.join(archive_dir, source_dir))):
+            if wanted_months and month_dir not in wanted_months:
+                continue
+            folder = os.path.join(archive_dir, source_dir, month_dir)
+            for name in sorted(os.listdir(folder)):
+                if not name.endswith(".parquet"):
+                    continue
+                # <table>-<first id>-<last id>.parquet: ids are only unique within a table
+                raw_table = name.rsplit("-", 2)[0]
+                table = pq.read_table(os.path.join(folder, name), columns=read_columns, memory_map=True)
+                if start:
+                    table = table.filter(pc.greater_equal(table["timestamp"], pa.scalar(start, pa.timestamp("us"))))
+                if end:
+                    table = table.filter(pc.less(table["timestamp"], pa.scalar(end, pa.timestamp("us"))))
+                for row_id, row in zip(table["id"].to_pylist(), table.select(list(columns)).to_pylist()):
+                    if (raw_table, row_id) not in seen:
+                        seen.add((raw_table, row_id))
+                        rows.append(row)
+
+    if "payload" in columns:
+        for row in rows:
+            row["payload"] = json.loads(row["payload"])
+    return rows
+
+
+def payloads_for_day(day: date, archive_dir: str = ARCHIVE_DIR) -> dict:
+    """{source_name: latest payload} archived for `day`, mirroring db_config.get_raw_payloads_for_day."""
+    start = datetime.combine(day, datetime.min.time())
+    rows = read_archived(start=start, end=start + timedelta(days=1), columns=("source_name", "timestamp", "payload"),
+                         archive_dir=archive_dir)
+    latest = {}
+    for row in sorted(rows, key=lambda r: r["timestamp"]):
+        latest[row["source_name"]] = row["payload"]
+    return latest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive raw payloads older than N days to Parquet.")
+    parser.add_argument("--days", type=int, default=RETENTION_DAYS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_ROWS)
+    parser.add_argument("--batch-bytes", type=int, default=BATCH_BYTES)
+    args = parser.parse_args()
+    print(f"Archived rows: {archive_old_payloads(args.days, args.batch_size, batch_bytes=args.batch_bytes)}")
@@ -0,0 +1,219 @@
+# reddit_collector.py
+"""
+Concurrent multi-subreddit Reddit collector.
+
+Fetches every (subreddit, listing) pair concurrently on the shared asyncpraw
+client, pacing requests from Reddit's rate-limit headers, and returns compact
+post records. A sync variant over Reddit's public JSON listings serves the
+data_fetcher pipeline.
+"""
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import providers
+from rate_limiter import get_scheduler
+
+LISTINGS = ("hot", "new", "rising", "top", "controversial")
+SELFTEXT_MAX_CHARS = 2000  # post bodies are kept for the prompt and search, truncated
+
+
+def _env_list(name: str, default: str) -> list:
+    return [v.strip() for v in os.getenv(name, default).split(",") if v.strip()]
+
+
+def configured_subreddits() -> list:
+    return _env_list("REDDIT_SUBREDDITS", "collapse")
+
+
+def configured_listings() -> list:
+    return [l for l in _env_list("REDDIT_LISTINGS", "hot") if l in LISTINGS]
+
+
+def configured_limit() -> int:
+    return int(os.getenv("REDDIT_POST_LIMIT", "50"))
+
+
+# ---------- Rate-limit pacing ----------
+class RatePacer:
+    """
+    Adaptive pacing from Reddit's X-Ratelimit-Remaining / X-Ratelimit-Reset.
+    Requests go out back-to-back while the budget is healthy; once `remaining`
+    drops under `low_water` they are spread evenly over what is left of the window.
+    """
+
+    def __init__(self, low_water: int = 20, max_concurrency: int = 8):
+        self.low_water = low_water
+        self.max_concurrency = max_concurrency
+        self.remaining = None
+        self.reset_at = 0.0
+        self._lock = threading.Lock()
+
+    def update(self, remaining, reset_seconds):
+        if remaining is None:
+            return
+        with self._lock:
+            self.remaining = float(remaining)
+            self.reset_at = time.monotonic() + float(reset_seconds or 0)
+
+    def update_from_headers(self, headers):
+        remaining = headers.get("x-ratelimit-remaining")
+        if remaining is not None:
+            self.update(remaining, headers.get("x-ratelimit-reset"))
+
+    def update_from_client(self, reddit):
+        # asyncprawcore keeps the last seen headers on its rate limiter
+        limiter = getattr(getattr(reddit, "_core", None), "_rate_limiter", None)
+        remaining = getattr(limiter, "remaining", None)
+        reset_ts = getattr(limiter, "reset_timestamp", None)
+        if remaining is not None and reset_ts:
+            self.update(remaining, max(0.0, reset_ts - time.time()))
+
+    def _reserve(self) -> float:
+        """Claim one request from the budget and return how long to wait first."""
+        with self._lock:
+            if self.remaining is None:
+                return 0.0
+            window_left = self.reset_at - time.monotonic()
+            if window_left <= 0:
+                self.remaining = None
+                return 0.0
+            self.remaining -= 1
+            if self.remaining >= self.low_water:
+                return 0.0
+            if self.remaining <= 0:
+                return window_left
+            return window_left / (self.remaining + 1)
+
+    async def wait(self):
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def wait_sync(self):
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+
+pacer = RatePacer()
+
+
+# ---------- Compact records ----------
+def compact_post(submission, listing: str) -> dict:
+    return {
+        "id": submission.id,
+        "subreddit": str(submission.subreddit),
+        "listing": listing,
+        "title": submission.title,
+        "selftext": (submission.selftext or "")[:SELFTEXT_MAX_CHARS],
+        "score": submission.score,
+        "num_comments": submission.num_comments,
+        "created_utc": submission.created_utc,
+        "permalink": submission.permalink,
+    }
+
+
+def compact_post_json(post: dict, listing: str) -> dict:
+    return {
+        "id": post.get("id"),
+        "subreddit": post.get("subreddit"),
+        "listing": listing,
+        "title": post.get("title"),
+        "selftext": (post.get("selftext") or "")[:SELFTEXT_MAX_CHARS],
+        "score": post.get("score"),
+        "num_comments": post.get("num_comments"),
+        "created_utc": post.get("created_utc"),
+        "permalink": post.get("permalink"),
+    }
+
+
+def _dedupe(batches) -> list:
+    seen, posts = set(), []
+    for batch in batches:
+        for post in batch:
+            if post["id"] in seen:
+                continue
+            seen.add(post["id"])
+            posts.append(post)
+    return posts
+
+
+# ---------- Async collector (asyncpraw) ----------
+async def collect_posts(subreddits=None, listings=None, limit=None) -> list:
+    """
+    Fetch all (subreddit, listing) pairs concurrently on the shared client.
+    Failed listings are logged and skipped; posts are de-duplicated by id.
+    """
+    subreddits = subreddits or configured_subreddits()
+    listings = listings or configured_listings()
+    limit = limit or configured_limit()
+
+    reddit = providers.get_reddit()
+    semaphore = asyncio.Semaphore(pacer.max_concurrency)
+
+    async def fetch_listing(name, listing):
+        async with semaphore:
+            await get_scheduler().acquire("reddit")
+            await pacer.wait()
+            subreddit = await reddit.subreddit(name)
+            items = [compact_post(s, listing) async for s in getattr(subreddit, listing)(limit=limit)]
+            pacer.update_from_client(reddit)
+            return items
+
+    pairs = [(name, listing) for name in subreddits for listing in listings]
+    results = await asyncio.gather(*(fetch_listing(n, l) for n, l in pairs), return_exceptions=True)
+
+    batches = []
+    for (name, listing), result in zip(pairs, results):
+        if isinstance(result, Exception):
+            print(f"⚠️ Error fetching r/{name}/{listing}: {result}")
+            continue
+        batches.append(result)
+    if pairs and not batches:
+        raise RuntimeError("All Reddit listings failed")
+    return _dedupe(batches)
+
+
+# ---------- Sync collector (public JSON listings) ----------
+LISTING_URL = "https://www.reddit.com/r/{subreddit}/{listing}.json"
+
+
+def collect_posts_sync(subreddits=None, listings=None, limit=None, url_template: str = LISTING_URL) -> list:
+    """Thread-pooled equivalent of collect_posts for synchronous callers."""
+    subreddits = subreddits or configured_subreddits()
+    listings = listings or configured_listings()
+    limit = limit or configured_limit()
+    headers = {"User-Agent": os.getenv("REDDIT_USER_AGENT", "CollapseRiskAnalysis/1.0")}
+
+    def fetch_listing(pair):
+        name, listing = pair
+        get_scheduler().acquire_sync("reddit")
+        pacer.wait_sync()
+        response = requests.get(
+            url_template.format(subreddit=name, listing=listing),
+            params={"limit": limit, "raw_json": 1},
+            headers=headers,
+            timeout=10,
+        )
+        pacer.update_from_headers(response.headers)
+        response.raise_for_status()
+        children = response.json().get("data", {}).get("children", [])
+        return [compact_post_json(c.get("data", {}), listing) for c in children]
+
+    pairs = [(name, listing) for name in subreddits for listing in listings]
+    batches = []
+    with ThreadPoolExecutor(max_workers=pacer.max_concurrency) as pool:
+        futures = [pool.submit(fetch_listing, pair) for pair in pairs]
+        for (name, listing), future in zip(pairs, futures):
+            try:
+                batches.append(future.result())
+            except Exception as e:
+                print(f"⚠️ Error fetching r/{name}/{listing}: {e}")
+    if pairs and not batches:
+        raise RuntimeError("All Reddit listings failed")
+    return _dedupe(batches)
@@ -0,0 +1,111 @@
+# replay.py
+"""
+Offline replay backend.
+
+Serves a past day's stored payloads (raw_data / raw_snapshots, or an exported
+archive under exports/replay/) so the analysis can be re-run without network.
+Switch it on per call (replay_date=...) or globally with REPLAY_DATE=YYYY-MM-DD.
+"""
+import os
+import json
+import argparse
+from datetime import date, datetime
+from typing import Optional
+
+from db_config import get_raw_payloads_for_day
+import raw_archive
+
+REPLAY_ENV = "REPLAY_DATE"
+ARCHIVE_DIR = os.path.join("exports", "replay")
+
+# Past days are immutable, so keep them in memory for repeated runs (never today)
+_day_cache: dict = {}
+
+
+def resolve_replay_date(value=None) -> Optional[date]:
+    """
+    Returns the day to replay from an explicit value or REPLAY_DATE,
+    or None when the pipeline should run live.
+    """
+    value = value or os.getenv(REPLAY_ENV)
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value), "%Y-%m-%d").date()
+
+
+def archive_path(day: date, archive_dir: str = ARCHIVE_DIR) -> str:
+    return os.path.join(archive_dir, f"{day.isoformat()}.json")
+
+
+def load_day_from_archive(day: date, path: Optional[str] = None) -> dict:
+    """Read {source_name: payload} for `day` from an exported archive file."""
+    path = path or archive_path(day)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        archive = json.load(f)
+    return archive.get("sources", {})
+
+
+def save_archive(day: date, sources: dict, path: Optional[str] = None) -> str:
+    """
+    Merge {source_name: payload} into the archive file for `day`.
+    Existing sources are overwritten with the newer payload.
+    """
+    path = path or archive_path(day)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    merged = load_day_from_archive(day, path)
+    merged.update(sources)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"date": day.isoformat(), "sources": merged}, f, ensure_ascii=False, default=str)
+    _day_cache.pop(day, None)
+    return path
+
+
+def export_day_archive(day: date, path: Optional[str] = None) -> str:
+    """Dump a day's stored payloads from the database into its archive file."""
+    return save_archive(day, get_raw_payloads_for_day(day), path)
+
+
+def load_day(day: date, archive: Optional[str] = None) -> dict:
+    """
+    Returns {source_name: payload} for `day`.
+    An explicit archive wins; otherwise the exported archive is tried first,
+    then the database, then the Parquet archive of rows past retention.
+    """
+    if archive:
+        return load_day_from_archive(day, archive)
+    if day in _day_cache:
+        return _day_cache[day]
+
+    payloads = load_day_from_archive(day)
+    complete = True
+    try:
+        stored = get_raw_payloads_for_day(day)
+    except Exception as e:
+        print(f"⚠️ Replay could not read the database for {day}: {e}")
+        stored, complete = {}, False
+    try:
+        archived = raw_archive.payloads_for_day(day)
+    except Exception as e:
+        print(f"⚠️ Replay could not read the Parquet archive for {day}: {e}")
+        archived, complete = {}, False
+    payloads = {**archived, **stored, **payloads}
+
+    # Only finished days are immutable; today keeps receiving ingested rows, and
+    # a failed read must be retried rather than remembered as missing data
+    if complete and day < datetime.utcnow().date():
+        _day_cache[day] = payloads
+    return payloads
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a day's raw payloads for offline replay.")
+    parser.add_argument("date", help="Day to export (YYYY-MM-DD)")
+    parser.add_argument("--out", help="Archive path (default: exports/replay/<date>.json)")
+    args = parser.parse_args()
+    print(f"Archive written to {export_day_archive(resolve_replay_date(args.date), args.out)}")
@@ -0,0 +1,203 @@
+# result_cache.py
+"""
+Cache of normalized per-source results.
+
+Keyed by source name (a DATA_SOURCES collector or a data_sources.json source)
+and kept in memory plus one JSON file per source under exports/cache/, so a
+restarted process still has the last results. Per-source settings:
+
+    cache_ttl_seconds    a result younger than this is served without fetching
+    stale_ttl_seconds    past the TTL, a result is still served for this long
+                         while one background refresh replaces it
+                         (stale-while-revalidate; 0 turns it off)
+
+Sources without cache_ttl_seconds are not cached. Only results the caller
+deems valid (no error, not empty) are stored. Set RESULT_CACHE=0 to bypass.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+logger = logging.getLogger("result_cache")
+
+CACHE_DIR = os.getenv("RESULT_CACHE_DIR", os.path.join("exports", "cache"))
+
+FRESH, STALE, MISS = "fresh", "stale", "miss"
+
+
+def cache_enabled() -> bool:
+    return os.getenv("RESULT_CACHE", "1").lower() not in ("0", "false", "no")
+
+
+class ResultCache:
+    def __init__(self, cache_dir: str = CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.entries: dict = {}  # name -> (stored_at epoch, value)
+        self.hits = {FRESH: 0, STALE: 0, MISS: 0}
+        self._refreshing: set = set()
+        self._invalid_before: dict = {}  # name (None = every source) -> epoch; older entries are misses
+        self._background: set = set()  # keeps refresh tasks referenced until done
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _path(self, name: str) -> str:
+        safe = "".join(ch if ch.isalnum() or ch in "-_." else "_" for ch in name)
+        return os.path.join(self.cache_dir, f"{safe}.json")
+
+    def _load(self, name: str):
+        path = self._path(name)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            return stored["stored_at"], stored["value"]
+        except Exception as e:
+            logger.warning(f"⚠️ Ignoring unreadable cache file {path}: {e}")
+            return None
+
+    def lookup(self, name: str, settings: dict):
+        """Returns (FRESH | STALE | MISS, value or None)."""
+        ttl = float(settings.get("cache_ttl_seconds", 0))
+        if ttl <= 0 or not cache_enabled():
+            return MISS, None
+        with self._lock:
+            entry = self.entries.get(name)
+        if entry is None:
+            entry = self._load(name)
+            if entry is not None:
+                with self._lock:
+                    self.entries.setdefault(name, entry)
+
+        with self._lock:
+            cutoff = max(self._invalid_before.get(name, 0), self._invalid_before.get(None, 0))
+        if entry is not None and entry[0] < cutoff:
+            entry = None
+
+        state, value = MISS, None
+        if entry is not None:
+            age = time.time() - entry[0]
+            if age < ttl:
+                state, value = FRESH, entry[1]
+            elif age < ttl + float(settings.get("stale_ttl_seconds", 0)):
+                state, value = STALE, entry[1]
+        with self._lock:
+            self.hits[state] += 1
+        return state, value
+
+    def store(self, name: str, value, settings: Optional[dict] = None) -> Optional[float]:
+        """Remember `value` for `name` and return its stored_at; skipped (None) for sources that are not cached."""
+        if settings is not None and float(settings.get("cache_ttl_seconds", 0)) <= 0:
+            return None
+        stored_at = time.time()
+        with self._lock:
+            self.entries[name] = (stored_at, value)
+        path = self._path(name)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Write then rename, so a concurrent reader never sees half a file
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"stored_at": stored_at, "value": value}, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not persist cache for {name}: {e}")
+        return stored_at
+
+    def invalidate(self, name: Optional[str] = None, older_than: Optional[float] = None):
+        """
+        Treat entries for `name` (every source when None) stored before `older_than`
+        (default now) as misses, in memory and on disk. Used when another process
+        has stored a newer result (coordination.py).
+        """
+        cutoff = older_than or time.time()
+        with self._lock:
+            self._invalid_before[name] = max(self._invalid_before.get(name, 0), cutoff)
+            for key in ([name] if name else list(self.entries)):
+                entry = self.entries.get(key)
+                if entry is not None and entry[0] < cutoff:
+                    del self.entries[key]
+
+    def _claim_refresh(self, name: str) -> bool:
+        with self._lock:
+            if name in self._refreshing:
+                return False
+            self._refreshing.add(name)
+            return True
+
+    def _release_refresh(self, name: str):
+        with self._lock:
+            self._refreshing.discard(name)
+
+    # ---------- async (data_sources collectors) ----------
+    async def get_or_fetch(self, name: str, fetch: Callable, settings: dict, is_valid: Callable):
+        """
+        Cached result of `await fetch()`. A stale hit is returned at once and
+        refreshed in the background; a miss fetches inline.
+        """
+        state, value = self.lookup(name, settings)
+        if state == FRESH:
+            return value
+        if state == STALE:
+            if self._claim_refresh(name):
+                task = asyncio.create_task(self._refresh(name, fetch, settings, is_valid))
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+            return value
+        result = await fetch()
+        if is_valid(result):
+            self.store(name, result, settings)
+        return result
+
+    async def _refresh(self, name: str, fetch: Callable, settings: dict, is_valid: Callable):
+        try:
+            result = await fetch()
+            if is_valid(result):
+                self.store(name, result, settings)
+        except Exception as e:
+            logger.warning(f"⚠️ Background refresh of {name} failed: {e}")
+        finally:
+            self._release_refresh(name)
+
+    # ---------- sync (data_fetcher sources) ----------
+    def get_or_fetch_sync(self, name: str, fetch: Callable, settings: dict, is_valid: Callable):
+        state, value = self.lookup(name, settings)
+        if state == FRESH:
+            return value
+        if state == STALE:
+            if self._claim_refresh(name):
+                with self._lock:
+                    if self._pool is None:
+                        self._pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-refresh")
+                self._pool.submit(self._refresh_sync, name, fetch, settings, is_valid)
+            return value
+        result = fetch()
+        if is_valid(result):
+            self.store(name, result, settings)
+        return result
+
+    def _refresh_sync(self, name: str, fetch: Callable, settings: dict, is_valid: Callable):
+        try:
+            result = fetch()
+            if is_valid(result):
+                self.store(name, result, settings)
+        except Exception as e:
+            logger.warning(f"⚠️ Background refresh of {name} failed: {e}")
+        finally:
+            self._release_refresh(name)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": dict(self.hits),
+                "age_seconds": {name: round(time.time() - stored_at, 1) for name, (stored_at, _) in self.entries.items()},
+                "refreshing": sorted(self._refreshing),
+            }
+
+
+result_cache = ResultCache()
@@ -0,0 +1,120 @@
+# serialization.py
+"""
+Content negotiation for report/history responses.
+
+  Accept: application/json (default)               orjson when installed
+  Accept: application/vnd.apache.arrow.stream      Arrow IPC stream, for DataFrame consumers
+  Accept: application/msgpack                      MessagePack
+
+Bodies over COMPRESS_MIN_BYTES are compressed with brotli or gzip, whichever
+the client accepts (brotli preferred when installed).
+"""
+import os
+import gzip
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from fastapi import HTTPException, Request, Response
+
+from providers import lazy_import
+
+JSON = "application/json"
+ARROW = "application/vnd.apache.arrow.stream"
+MSGPACK = "application/msgpack"
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+
+
+def _optional(module_name: str):
+    try:
+        return lazy_import(module_name)
+    except ImportError:
+        return None
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def negotiate_format(accept: str) -> str:
+    """Pick the first supported media type in Accept order (q-values ignored)."""
+    for part in (accept or "").split(","):
+        media = part.split(";")[0].strip().lower()
+        if media in (ARROW, MSGPACK, JSON):
+            return media
+        if media in ("application/x-msgpack", "application/vnd.msgpack"):
+            return MSGPACK
+    return JSON
+
+
+def encode_json(payload) -> bytes:
+    orjson = _optional("orjson")
+    if orjson:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def encode_msgpack(payload) -> bytes:
+    msgpack = _optional("msgpack")
+    if msgpack is None:
+        raise HTTPException(status_code=406, detail="MessagePack is not available on this server")
+    return msgpack.packb(payload, default=_default, use_bin_type=True)
+
+
+def encode_arrow(table) -> bytes:
+    """table: list of row dicts or a dict of equal-length columns."""
+    pa = _optional("pyarrow")
+    if pa is None:
+        raise HTTPException(status_code=406, detail="Arrow is not available on this server")
+    ipc = lazy_import("pyarrow.ipc")
+    if isinstance(table, dict):
+        arrow_table = pa.table(table)
+    else:
+        # Nested values (e.g. drivers lists) go over as JSON text to keep a flat schema
+        rows = [
+            {k: json.dumps(v, default=_default) if isinstance(v, (dict, list)) else v for k, v in row.items()}
+            for row in table
+        ]
+        arrow_table = pa.Table.from_pylist(rows)
+    sink = pa.BufferOutputStream()
+    with ipc.new_stream(sink, arrow_table.schema) as writer:
+        writer.write_table(arrow_table)
+    return sink.getvalue().to_pybytes()
+
+
+def compress(body: bytes, accept_encoding: str):
+    """Returns (body, content-encoding or None)."""
+    if len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    accepted = {part.split(";")[0].strip().lower() for part in (accept_encoding or "").split(",")}
+    if "br" in accepted:
+        brotli = _optional("brotli")
+        if brotli:
+            return brotli.compress(body, quality=5), "br"
+    if "gzip" in accepted:
+        return gzip.compress(body, compresslevel=6), "gzip"
+    return body, None
+
+
+def negotiated_response(request: Request, payload, table=None) -> Response:
+    """
+    Encode `payload` in the format the client asked for. Arrow needs a tabular
+    view (`table`); without one the response falls back to JSON.
+    """
+    media = negotiate_format(request.headers.get("accept"))
+    if media == ARROW and table is not None:
+        body = encode_arrow(table)
+    elif media == MSGPACK:
+        body = encode_msgpack(payload)
+    else:
+        media, body = JSON, encode_json(payload)
+
+    body, encoding = compress(body, request.headers.get("accept-encoding"))
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=media, headers=headers)
@@ -0,0 +1,63 @@
+# source_config.py
+"""
+Loader for data_sources.json.
+
+The file holds the source list plus the settings declared alongside it
+(ingestion deadline and breaker thresholds, per-provider quotas, ...).
+The older bare-list layout is still accepted.
+"""
+import json
+
+CONFIG_FILE = "data_sources.json"
+
+
+def load_config(config_file: str = CONFIG_FILE) -> dict:
+    """Returns the config as a dict with at least a "sources" list."""
+    try:
+        with open(config_file, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    except Exception as e:
+        print(f"Failed to load {config_file}: {e}")
+        return {"sources": []}
+    if isinstance(config, list):
+        return {"sources": config}
+    config.setdefault("sources", [])
+    return config
+
+
+def load_sources(config_file: str = CONFIG_FILE) -> list:
+    return load_config(config_file)["sources"]
+
+
+def load_providers(config_file: str = CONFIG_FILE) -> dict:
+    return load_config(config_file).get("providers", {})
+
+
+def load_ingestion_settings(config_file: str = CONFIG_FILE) -> dict:
+    return load_config(config_file).get("ingestion", {})
+
+
+def load_collectors(config_file: str = CONFIG_FILE) -> dict:
+    """Settings for the data_sources.DATA_SOURCES collectors, keyed by name."""
+    return load_config(config_file).get("collectors", {})
+
+
+def source_settings(name: str, config_file: str = CONFIG_FILE) -> dict:
+    """Settings for one collector or config source, whichever declares `name`."""
+    config = load_config(config_file)
+    if name in config.get("collectors", {}):
+        return config["collectors"][name]
+    for src in config["sources"]:
+        if src.get("name") == name:
+            return src
+    return {}
+
+
+def max_age_seconds(settings: dict) -> float:
+    """How old a pre-ingested payload may be before a report refetches it live."""
+    if "max_age_seconds" in settings:
+        return float(settings["max_age_seconds"])
+    # Adaptive cadence may stretch polling up to max_interval_seconds, but no further:
+    # a payload older than one full (slowest) interval is a missed run, not a slow source
+    interval = float(settings.get("interval_seconds", 3600))
+    return max(interval, float(settings.get("max_interval_seconds", interval)))
@@ -4,6 +4,7 @@ import datetime
 import json
 import requests
 import pandas as pd
+import pyarrow as pa
 import streamlit as st
 from dotenv import load_dotenv
 
@@ -29,6 +30,16 @@ def api_get(path: str, params: dict | None = None, timeout: int = 60):
     except Exception:
         return r.text
 
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+def api_get_frame(path: str, params: dict | None = None, timeout: int = 60) -> pd.DataFrame:
+    """GET an endpoint as Arrow IPC and load it straight into a DataFrame."""
+    r = requests.get(f"{API_BASE}{path}", params=params, headers={"Accept": ARROW_STREAM}, timeout=timeout)
+    r.raise_for_status()
+    if r.headers.get("content-type", "").startswith(ARROW_STREAM):
+        return pa.ipc.open_stream(r.content).read_pandas()
+    return pd.DataFrame(r.json())
+
 def fetch_latest_report():
     # read-only endpoint for display
     return api_get("/v1/report/latest", timeout=30)
@@ -104,7 +115,11 @@ st.header("Historical Data")
 selected_date = st.date_input("Select a date to view a past report:", datetime.date.today())
 
 st.subheader("Risk Score Trend Over Time")
-historical_data = get_historical_reports()
+try:
+    history = api_get_frame("/v1/reports/history", timeout=30)
+    historical_data = list(zip(history["date"], history["risk_score"])) if not history.empty else []
+except (requests.exceptions.RequestException, KeyError):
+    historical_data = get_historical_reports()
 if historical_data:
     df = pd.DataFrame(historical_data, columns=["Date", "Risk Score"])
     df["Date"] = pd.to_datetime(df["Date"])
@@ -113,6 +128,17 @@ if historical_data:
 else:
     st.caption("This chart will update once historical data is present in the database.")
 
+st.subheader("Hazard Hotspots (last 24h)")
+try:
+    hotspots = api_get("/v1/hazards/hotspots", timeout=30).get("hotspots", [])
+except requests.exceptions.RequestException:
+    hotspots = []
+if hotspots:
+    st.map(pd.DataFrame(hotspots)[["lat", "lon"]])
+    st.dataframe(pd.DataFrame(hotspots)[["lat", "lon", "events", "max_severity"]], hide_index=True)
+else:
+    st.caption("No regional hotspots in the current window.")
+
 # ------------ Sidebar ------------
 st.sidebar.title("Project Overview")
 st.sidebar.markdown("""
@@ -0,0 +1,107 @@
+import db_config
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+        self.itersize = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.db.queries.append((sql, params))
+        self.rows = list(self.db.respond(sql, params))
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self, name=None):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        self.db.commits += 1
+
+
+class FakeDB:
+    def __init__(self, respond):
+        self.respond = respond
+        self.queries = []
+        self.commits = 0
+
+    def connect(self):
+        return FakeConnection(self)
+
+
+def test_search_total_counts_all_matches_past_the_last_page(monkeypatch):
+    def respond(sql, params):
+        # 7 matches in all; the requested page is past the last one
+        return [{"total": 7}] if "COUNT(*) AS total" in sql else []
+
+    db = FakeDB(respond)
+    monkeypatch.setattr(db_config, "get_db_connection", db.connect)
+
+    total, rows = db_config.search_raw_items("bank run", limit=20, offset=40)
+
+    assert (total, rows) == (7, [])
+
+
+def test_backfill_resumes_after_last_raw_id(monkeypatch):
+    raw_data = [
+        {"id": i, "source_name": "news_sentiment", "timestamp": None,
+         "payload_json": {"data": [{"id": f"item-{i}", "title": f"Headline {i}"}]}}
+        for i in range(1, 6)
+    ]
+    progress = []
+
+    def respond(sql, params):
+        if "FROM raw_items_backfill" in sql:
+            return [{"last_raw_id": 2, "completed_at": None}]
+        if "FROM raw_data" in sql:
+            return [row for row in raw_data if row["id"] > params[0]]
+        if "INSERT INTO raw_items_backfill" in sql:
+            progress.append(params)
+        return []
+
+    copied = []
+    db = FakeDB(respond)
+    monkeypatch.setattr(db_config, "get_db_connection", db.connect)
+    monkeypatch.setattr(db_config, "_copy_items", lambda cur, source, fetched_at, rows: copied.extend(r[0] for r in rows))
+
+    assert db_config.backfill_raw_items(batch_size=2) == 3
+    assert copied == ["item-3", "item-4", "item-5"]
+    assert [p["id"] for p in progress] == [4, 5, None]
+    assert progress[-1]["done"] is not None
+
+
+def test_completed_backfill_reads_nothing(monkeypatch):
+    def respond(sql, params):
+        assert "FROM raw_data" not in sql
+        return [{"last_raw_id": 5, "completed_at": "2026-01-01"}] if "FROM raw_items_backfill" in sql else []
+
+    db = FakeDB(respond)
+    monkeypatch.setattr(db_config, "get_db_connection", db.connect)
+
+    assert db_config.backfill_raw_items() == 0
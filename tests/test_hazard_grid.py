@@ -0,0 +1,37 @@
+import time
+
+import pytest
+
+from hazard_grid import HazardGrid, _epoch
+
+
+@pytest.fixture
+def non_utc_host(monkeypatch):
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_naive_timestamps_are_read_as_utc(non_utc_host):
+    assert _epoch("2026-01-01T00:00:00") == _epoch("2026-01-01T00:00:00Z") == 1767225600.0
+
+
+def test_naive_event_lands_in_its_utc_bucket(non_utc_host):
+    grid = HazardGrid()
+    now = _epoch("2026-01-01T11:30:00Z")
+    # Read as New York time it would be 16:00 UTC, in a bucket after `now`
+    grid.add([{"id": "quake", "lat": 10.0, "lon": 20.0, "time": "2026-01-01T11:00:00", "magnitude": 5.0}], now=now)
+
+    assert grid.region(0, 20, 10, 30, hours=6, now=now)["events"] == 1
+
+
+def test_window_counts_back_from_the_wall_clock():
+    grid = HazardGrid()
+    now = _epoch("2026-01-01T12:00:00Z")
+    grid.add([{"id": "quake", "lat": 10.0, "lon": 20.0, "time": now - 3600, "magnitude": 7.0}], now=now)
+
+    assert len(grid.hotspots(hours=24, now=now)) == 1
+    # No newer events arrived (e.g. a feed outage): the hotspot still ages out
+    assert grid.hotspots(hours=24, now=now + 2 * 86400) == []
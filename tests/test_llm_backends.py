@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+import pytest
+
+import llm_backends
+from llm_backends import HedgedBackend, StubBackend
+
+
+@pytest.fixture(autouse=True)
+def no_profiling(monkeypatch):
+    # Profile rows would be queued as background tasks against a database
+    monkeypatch.setenv("LLM_PROFILE", "0")
+
+
+def test_slow_primary_loses_to_hedge():
+    backend = HedgedBackend(StubBackend(latency_seconds=2), StubBackend(latency_seconds=0), hedge_after=0.05)
+
+    async def run():
+        started = time.perf_counter()
+        text = await backend.generate("prompt")
+        return text, time.perf_counter() - started
+
+    text, elapsed = asyncio.run(run())
+
+    assert text == asyncio.run(StubBackend(latency_seconds=0).generate("prompt"))
+    assert elapsed < 1
+    assert backend.hedges == 1
+    assert backend.hedge_wins == 1
+
+
+def test_fast_failure_falls_through_to_hedge():
+    failing = StubBackend(timeout=0.01, latency_seconds=1)
+    backend = HedgedBackend(failing, StubBackend(latency_seconds=0), hedge_after=5)
+
+    async def run():
+        started = time.perf_counter()
+        text = await backend.generate("prompt")
+        return text, time.perf_counter() - started
+
+    text, elapsed = asyncio.run(run())
+
+    assert '"risk_score"' in text
+    # Hedged as soon as the primary failed, not after hedge_after
+    assert elapsed < 1
+    assert backend.hedges == 1
+    assert backend.hedge_wins == 1
+
+
+def test_both_attempts_failing_reraises_without_pending_tasks():
+    backend = HedgedBackend(StubBackend(timeout=0.01, latency_seconds=1),
+                            StubBackend(timeout=0.02, latency_seconds=1), hedge_after=0.05)
+
+    async def run():
+        with pytest.raises(asyncio.TimeoutError):
+            await backend.generate("prompt")
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    assert asyncio.run(run()) == []
+    assert backend.hedges == 1
+    assert backend.hedge_wins == 0
+
+
+def test_hedge_attempt_is_profiled(monkeypatch):
+    monkeypatch.setenv("LLM_PROFILE", "1")
+    recorded = []
+    monkeypatch.setattr(llm_backends.llm_profile, "_save", recorded.append)
+    backend = HedgedBackend(StubBackend(timeout=0.01, latency_seconds=1), StubBackend(latency_seconds=0),
+                            hedge_after=5)
+
+    async def run():
+        await backend.generate("prompt")
+        await asyncio.gather(*llm_backends.llm_profile._pending)
+
+    asyncio.run(run())
+
+    assert [(call["purpose"], call["outcome"]) for call in recorded] == [("hedge", "ok")]
@@ -0,0 +1,18 @@
+import threading
+
+import providers
+
+
+def test_nested_lazy_import_does_not_deadlock():
+    result = {}
+
+    def build():
+        result["value"] = providers._timed("test:nested", lambda: providers.lazy_import("csv"))
+
+    worker = threading.Thread(target=build, daemon=True)
+    worker.start()
+    worker.join(timeout=5)
+
+    assert not worker.is_alive(), "nested lazy_import deadlocked"
+    assert result["value"].__name__ == "csv"
+    assert "import:csv" in providers.timings